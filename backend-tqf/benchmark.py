@@ -0,0 +1,233 @@
+"""
+Benchmarks for the fast extraction pipeline
+Runs fast_extract_study_plan, validate_and_clean_courses,
+generate_study_plan_graph and generate_csv on synthetic TQF documents
+(see tqf_synth.py) from 8 semesters / 40 courses up to 16 semesters / 1000
+courses, in DOCX and PDF, and reports each stage's time (best of --repeat
+runs) and peak traced memory.
+
+    python benchmark.py                              # report only
+    python benchmark.py --save-baseline              # write BENCHMARK_BASELINE
+    python benchmark.py --baseline benchmark_baseline.json --threshold 1.5
+    python benchmark.py --ci                         # compare with BENCHMARK_BASELINE, which must exist
+
+With a baseline, exits with status 1 when a stage takes more than threshold
+times its baseline time or memory, or when its growth from the second largest
+to the largest size is more than threshold times the baseline's growth.
+Growth depends much less on the machine than absolute timings: the layered
+graph layout is superlinear (5.6x the time for 2.5x the courses from 12x400
+to 16x1000 in benchmark_baseline.json), and a layout change that makes it
+worse fails the check anywhere. Absolute timings do depend on the machine, so
+record the baseline on the machine (and with the GRAPH_LAYOUT / DOCX_READER
+settings) that runs the comparison. --ci exits with status 2 when there is no
+baseline to compare with.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Repeated runs must not be served from the PDF page cache
+os.environ.setdefault("PDF_PAGE_CACHE_MAX_BYTES", "0")
+
+from tqf_synth import generate_plan, build_docx, build_pdf
+from fast_extract import fast_extract_study_plan
+from csv_utils import validate_and_clean_courses, generate_study_plan_graph, generate_csv, GRAPH_VERSION
+from document_model import DOCX_READER
+
+# (semesters, courses) of the generated plans
+SIZES = [(8, 40), (10, 150), (12, 400), (16, 1000)]
+FORMATS = ["docx", "pdf"]
+STAGES = ["extract", "validate", "graph", "csv"]
+
+BENCHMARK_BASELINE = os.getenv("BENCHMARK_BASELINE", "benchmark_baseline.json")
+# Differences below these are noise, whatever the ratio
+MIN_REGRESSION_SECONDS = 0.002
+MIN_REGRESSION_BYTES = 64 * 1024
+# Growth between sizes is only compared for stages taking at least this long at the larger size
+MIN_GROWTH_SECONDS = 0.02
+
+
+def _time_best(func: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _peak_memory(func: Callable[[], object]) -> int:
+    """Peak bytes allocated by Python while func runs"""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_size(kind: str, semesters: int, courses: int, repeat: int) -> Dict[str, Dict[str, float]]:
+    """Time and peak memory of every stage on one generated document"""
+    plan = generate_plan(semesters, courses)
+    source = build_docx(plan) if kind == "docx" else build_pdf(plan)
+    filename = f"synthetic.{kind}"
+
+    parsed = fast_extract_study_plan(source, filename)
+    if len(parsed.courses) != plan.course_count:
+        # A benchmark that silently extracts less would only look faster
+        raise RuntimeError(
+            f"{kind} {semesters}x{courses}: extracted {len(parsed.courses)} of {plan.course_count} courses"
+        )
+    courses_list = parsed.courses
+    validate_and_clean_courses(courses_list)
+
+    stages: Dict[str, Callable[[], object]] = {
+        "extract": lambda: fast_extract_study_plan(source, filename),
+        "validate": lambda: validate_and_clean_courses([c.model_copy() for c in courses_list]),
+        "graph": lambda: generate_study_plan_graph(courses_list),
+        "csv": lambda: generate_csv(courses_list),
+    }
+    return {
+        stage: {"seconds": _time_best(func, repeat), "peak_bytes": _peak_memory(func)}
+        for stage, func in stages.items()
+    }
+
+
+def run_benchmarks(sizes: List[Tuple[int, int]], formats: List[str], repeat: int) -> Dict:
+    results = {}
+    growth = {}
+    sizes = sorted(sizes, key=lambda size: size[1])
+    for kind in formats:
+        by_size = []
+        for semesters, courses in sizes:
+            measured_stages = run_size(kind, semesters, courses, repeat)
+            by_size.append(((semesters, courses), measured_stages))
+            for stage, measured in measured_stages.items():
+                results[f"{kind}/{semesters}x{courses}/{stage}"] = measured
+        if len(by_size) >= 2:
+            growth.update(size_growth(kind, by_size[-2], by_size[-1]))
+    return {"config": {"graph": GRAPH_VERSION, "docx_reader": DOCX_READER}, "results": results, "growth": growth}
+
+
+def size_growth(kind: str, smaller: Tuple, larger: Tuple) -> Dict[str, Dict[str, float]]:
+    """
+    Time ratio of each stage between two sizes, next to the ratio of their
+    course counts (equal ratios mean linear growth) and the larger size's time
+    """
+    (small_size, small_stages), (large_size, large_stages) = smaller, larger
+    growth = {}
+    for stage, measured in large_stages.items():
+        base_seconds = small_stages[stage]["seconds"]
+        growth[f"{kind}/{small_size[0]}x{small_size[1]}->{large_size[0]}x{large_size[1]}/{stage}"] = {
+            "time_ratio": measured["seconds"] / base_seconds if base_seconds else 0.0,
+            "course_ratio": large_size[1] / small_size[1],
+            "seconds": measured["seconds"],
+        }
+    return growth
+
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Stages that regressed beyond threshold times their baseline"""
+    if baseline.get("config") != current["config"]:
+        print(f"Warning: baseline was recorded with {baseline.get('config')}, running with {current['config']}")
+    regressions = []
+    for name, measured in current["results"].items():
+        reference = baseline.get("results", {}).get(name)
+        if reference is None:
+            continue
+        seconds, base_seconds = measured["seconds"], reference["seconds"]
+        if seconds > base_seconds * threshold and seconds - base_seconds > MIN_REGRESSION_SECONDS:
+            regressions.append(f"{name}: {seconds * 1000:.1f} ms vs {base_seconds * 1000:.1f} ms baseline")
+        peak, base_peak = measured["peak_bytes"], reference["peak_bytes"]
+        if peak > base_peak * threshold and peak - base_peak > MIN_REGRESSION_BYTES:
+            regressions.append(f"{name}: {peak / 1024:.0f} KiB peak vs {base_peak / 1024:.0f} KiB baseline")
+    for name, measured in current.get("growth", {}).items():
+        reference = baseline.get("growth", {}).get(name)
+        if reference is None:
+            continue
+        # Ratios of stages that take almost no time are noise
+        if measured["seconds"] < MIN_GROWTH_SECONDS:
+            continue
+        ratio, base_ratio = measured["time_ratio"], reference["time_ratio"]
+        if ratio > base_ratio * threshold:
+            regressions.append(f"{name}: grows {ratio:.1f}x vs {base_ratio:.1f}x baseline "
+                               f"for {measured['course_ratio']:.1f}x the courses")
+    return regressions
+
+
+def print_report(current: Dict, baseline: Optional[Dict]) -> None:
+    base_results = (baseline or {}).get("results", {})
+    print(f"{'benchmark':<28}{'time (ms)':>12}{'peak (KiB)':>12}{'vs baseline':>14}")
+    for name, measured in current["results"].items():
+        reference = base_results.get(name)
+        ratio = f"{measured['seconds'] / reference['seconds']:.2f}x" if reference and reference["seconds"] else ""
+        print(f"{name:<28}{measured['seconds'] * 1000:>12.2f}{measured['peak_bytes'] / 1024:>12.0f}{ratio:>14}")
+
+    base_growth = (baseline or {}).get("growth", {})
+    if current.get("growth"):
+        print(f"\n{'growth':<36}{'courses':>10}{'time':>10}{'baseline':>10}")
+    for name, measured in current.get("growth", {}).items():
+        reference = base_growth.get(name)
+        base_ratio = f"{reference['time_ratio']:.2f}x" if reference else ""
+        print(f"{name:<36}{measured['course_ratio']:>9.2f}x{measured['time_ratio']:>9.2f}x{base_ratio:>10}")
+
+
+def parse_sizes(text: str) -> List[Tuple[int, int]]:
+    """"8x40,16x1000" -> [(8, 40), (16, 1000)]"""
+    sizes = []
+    for item in text.split(","):
+        semesters, courses = item.lower().split("x")
+        sizes.append((int(semesters), int(courses)))
+    return sizes
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the fast extraction pipeline on synthetic TQF documents")
+    parser.add_argument("--sizes", type=parse_sizes, default=SIZES, help="semesters x courses, e.g. 8x40,16x1000")
+    parser.add_argument("--formats", default=",".join(FORMATS), help="docx, pdf or both")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per stage, the best time is kept")
+    parser.add_argument("--baseline", default=None, help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=1.5, help="allowed slowdown / memory growth factor")
+    parser.add_argument("--save-baseline", action="store_true", help=f"write results to {BENCHMARK_BASELINE}")
+    parser.add_argument("--ci", action="store_true",
+                        help=f"compare with --baseline or {BENCHMARK_BASELINE}, exit 2 if it does not exist")
+    args = parser.parse_args(argv)
+
+    if args.ci:
+        args.baseline = args.baseline or BENCHMARK_BASELINE
+        if not os.path.exists(args.baseline):
+            # Without a baseline every run would pass; a check that cannot fail must not look green
+            print(f"no baseline: {args.baseline} does not exist, record one with --save-baseline")
+            return 2
+
+    current = run_benchmarks(args.sizes, [f.strip() for f in args.formats.split(",")], args.repeat)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(current, baseline)
+
+    if args.save_baseline:
+        with open(BENCHMARK_BASELINE, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+        print(f"Baseline written to {BENCHMARK_BASELINE}")
+
+    if baseline is not None:
+        regressions = compare(current, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.threshold}x:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"No regressions beyond {args.threshold}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+"""
+Compact in-memory form of stored parse results
+A session's courses, nodes and edges are kept as integer columns (array.array)
+that index into the session's string table, instead of as pydantic objects or
+JSON text. Course codes, titles and node types come from a StringPool shared
+by every session in the store, so the ones that recur across uploads of a
+curriculum (and between a plan's courses and its graph nodes) are held once
+per process. Prerequisite text, which is rarely the same in two plans, is
+held by the session itself rather than paying for a pool entry.
+Edges refer to nodes by index. ParseResponse objects are rebuilt only when a
+session is read for a response.
+"""
+import sys
+from array import array
+from typing import Dict, List, Optional, Tuple
+from models import ParseResponse
+
+# Slots in the pool's two dicts per distinct pooled string (measured at 40-70 bytes)
+STRING_ENTRY_OVERHEAD = 64
+
+COURSE_INTS = 3  # year, semester, credits
+COURSE_STRINGS = 4  # course_code, course_title, prerequisite, or_flag
+NODE_INTS = 5  # year, semester, credits, x, y
+NODE_STRINGS = 5  # id, code, title, type, or_group (stored +1, 0 = None)
+
+
+class StringPool:
+    """Reference-counted strings shared by the sessions of one store (not thread-safe, callers lock)"""
+
+    def __init__(self):
+        self._strings: Dict[str, str] = {}
+        self._counts: Dict[str, int] = {}
+        self.bytes = 0
+
+    def intern(self, text: str) -> str:
+        shared = self._strings.get(text)
+        if shared is None:
+            shared = self._strings[text] = text
+            self._counts[text] = 0
+            self.bytes += sys.getsizeof(text) + STRING_ENTRY_OVERHEAD
+        self._counts[shared] += 1
+        return shared
+
+    def release(self, text: str) -> None:
+        count = self._counts[text] - 1
+        if count:
+            self._counts[text] = count
+        else:
+            del self._counts[text]
+            del self._strings[text]
+            self.bytes -= sys.getsizeof(text) + STRING_ENTRY_OVERHEAD
+
+    def __len__(self) -> int:
+        return len(self._strings)
+
+
+class _StringTable:
+    """
+    Builds one session's string table: each distinct string once. Strings that
+    recur across uploads of a curriculum (codes, titles, node types) are pooled;
+    per-plan text such as prerequisite lines is owned by the session
+    """
+
+    def __init__(self, pool: StringPool):
+        self.pool = pool
+        self.index: Dict[str, int] = {}
+        self.strings: List[str] = []
+        self.shared: List[str] = []
+        self.owned_bytes = 0
+
+    def add(self, text: str, shared: bool = True) -> int:
+        position = self.index.get(text)
+        if position is None:
+            position = self.index[text] = len(self.strings)
+            if shared:
+                text = self.pool.intern(text)
+                self.shared.append(text)
+            else:
+                self.owned_bytes += sys.getsizeof(text)
+            self.strings.append(text)
+        return position
+
+    def add_optional(self, text: Optional[str]) -> int:
+        return 0 if text is None else self.add(text) + 1
+
+
+def _index_array(values: List[int], size: int) -> array:
+    """Smallest unsigned array that holds indexes below size"""
+    return array("H" if size < 1 << 16 else "I", values)
+
+
+def _int_array(values: List[int]) -> array:
+    """Signed 16-bit array unless a value (a large layout coordinate) needs 32 bits"""
+    fits = not values or (-1 << 15 <= min(values) and max(values) < 1 << 15)
+    return array("h" if fits else "i", values)
+
+
+class CompactParseResponse:
+    """A ParseResponse as integer columns over a pooled string table"""
+
+    __slots__ = (
+        "session_id", "program_info", "strings", "shared", "owned_bytes",
+        "course_ints", "course_strings",
+        "has_graph", "node_ints", "node_strings", "positions",
+        "edge_from", "edge_to", "edge_source_counts", "edge_sources",
+    )
+
+    def __init__(self):
+        self.session_id: Optional[str] = None
+        self.program_info: Tuple[int, int, int] = (0, 0, 0)  # code, title (string indexes), total credits
+        self.strings: Tuple[str, ...] = ()
+        self.shared: Tuple[str, ...] = ()  # the pooled entries of strings, released with the session
+        self.owned_bytes = 0  # strings only this session holds
+        self.course_ints = array("h")
+        self.course_strings = array("H")
+        self.has_graph = False
+        self.node_ints = array("h")
+        self.node_strings = array("H")
+        self.positions: Optional[Dict[int, Optional[dict]]] = None  # nodes whose position is not {x, y} ints
+        self.edge_from = array("H")  # node index, or len(nodes) + i for the i-th id not in the plan
+        self.edge_to = array("H")
+        self.edge_source_counts = array("h")  # -1 when the edge has no sources list
+        self.edge_sources = array("H")
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by this session itself, with its own strings (pooled ones are counted by the pool)"""
+        arrays = (
+            self.course_ints, self.course_strings, self.node_ints, self.node_strings,
+            self.edge_from, self.edge_to, self.edge_source_counts, self.edge_sources,
+        )
+        size = sys.getsizeof(self) + sys.getsizeof(self.strings) + sys.getsizeof(self.shared)
+        size += sys.getsizeof(self.program_info) + self.owned_bytes
+        size += sum(sys.getsizeof(column) for column in arrays)
+        if self.session_id is not None:
+            size += sys.getsizeof(self.session_id)
+        if self.positions:
+            size += sys.getsizeof(self.positions) + 200 * len(self.positions)
+        return size
+
+
+def compact_parse_response(parse_response: ParseResponse, pool: StringPool) -> CompactParseResponse:
+    """Encode a parse result; its strings are interned in pool until release_compact"""
+    table = _StringTable(pool)
+    compact = CompactParseResponse()
+    compact.session_id = parse_response.session_id
+    info = parse_response.program_info
+    compact.program_info = (table.add(info.program_code), table.add(info.program_title), info.total_credits)
+
+    course_ints: List[int] = []
+    course_strings: List[int] = []
+    for course in parse_response.courses:
+        course_ints += (course.year, course.semester, course.credits)
+        course_strings += (
+            table.add(course.course_code), table.add(course.course_title),
+            table.add(course.prerequisite, shared=False), table.add(course.or_flag),
+        )
+    compact.course_ints = _int_array(course_ints)
+
+    graph = parse_response.graph
+    node_strings: List[int] = []
+    if graph is not None:
+        compact.has_graph = True
+        node_ints: List[int] = []
+        positions: Dict[int, Optional[dict]] = {}
+        node_index: Dict[str, int] = {}
+        for i, node in enumerate(graph.nodes):
+            position = node.position
+            if (isinstance(position, dict) and position.keys() == {"x", "y"}
+                    and type(position["x"]) is int and type(position["y"]) is int):
+                x, y = position["x"], position["y"]
+            else:
+                x = y = 0
+                positions[i] = position
+            node_ints += (node.year, node.semester, node.credits, x, y)
+            node_strings += (
+                table.add(node.id), table.add(node.code), table.add(node.title),
+                table.add(node.type), table.add_optional(node.or_group),
+            )
+            node_index.setdefault(node.id, i)
+        compact.node_ints = _int_array(node_ints)
+        compact.positions = positions or None
+
+        # Edge endpoints are node indexes; ids that are not nodes get a string after them
+        node_count = len(graph.nodes)
+        dangling: List[int] = []
+
+        def endpoint(node_id: str) -> int:
+            i = node_index.get(node_id)
+            if i is None:
+                i = node_index[node_id] = node_count + len(dangling)
+                dangling.append(table.add(node_id, shared=False))
+            return i
+
+        edge_from: List[int] = []
+        edge_to: List[int] = []
+        source_counts: List[int] = []
+        sources: List[int] = []
+        for edge in graph.edges:
+            edge_from.append(endpoint(edge.from_id))
+            edge_to.append(endpoint(edge.to_id))
+            if edge.sources is None:
+                source_counts.append(-1)
+            else:
+                source_counts.append(len(edge.sources))
+                sources.extend(endpoint(source) for source in edge.sources)
+        # Dangling ids ride along at the end of the node string column
+        node_strings += dangling
+        limit = node_count + len(dangling)
+        compact.edge_from = _index_array(edge_from, limit)
+        compact.edge_to = _index_array(edge_to, limit)
+        compact.edge_source_counts = _int_array(source_counts)
+        compact.edge_sources = _index_array(sources, limit)
+
+    size = len(table.strings) + 1
+    compact.course_strings = _index_array(course_strings, size)
+    compact.node_strings = _index_array(node_strings, size)
+    compact.strings = tuple(table.strings)
+    compact.shared = tuple(table.shared)
+    compact.owned_bytes = table.owned_bytes
+    return compact
+
+
+def expand_parse_response(compact: CompactParseResponse) -> ParseResponse:
+    """Rebuild the ParseResponse (one model_validate over plain dicts)"""
+    strings = compact.strings
+    code, title, total_credits = compact.program_info
+    ints, text = compact.course_ints, compact.course_strings
+    courses = [
+        {
+            "year": ints[i], "semester": ints[i + 1], "credits": ints[i + 2],
+            "course_code": strings[text[j]], "course_title": strings[text[j + 1]],
+            "prerequisite": strings[text[j + 2]], "or_flag": strings[text[j + 3]],
+        }
+        for i, j in zip(range(0, len(ints), COURSE_INTS), range(0, len(text), COURSE_STRINGS))
+    ]
+
+    graph = None
+    if compact.has_graph:
+        ints, text = compact.node_ints, compact.node_strings
+        positions = compact.positions or {}
+        node_count = len(ints) // NODE_INTS
+        nodes = [
+            {
+                "id": strings[text[j]], "code": strings[text[j + 1]], "title": strings[text[j + 2]],
+                "type": strings[text[j + 3]], "or_group": strings[text[j + 4] - 1] if text[j + 4] else None,
+                "year": ints[i], "semester": ints[i + 1], "credits": ints[i + 2],
+                "position": positions[n] if n in positions else {"x": ints[i + 3], "y": ints[i + 4]},
+            }
+            for n, i, j in zip(range(node_count), range(0, len(ints), NODE_INTS), range(0, len(text), NODE_STRINGS))
+        ]
+
+        ids = [node["id"] for node in nodes] + [strings[i] for i in text[node_count * NODE_STRINGS:]]
+        edges = []
+        offset = 0
+        for from_index, to_index, count in zip(compact.edge_from, compact.edge_to, compact.edge_source_counts):
+            sources = None
+            if count >= 0:
+                sources = [ids[i] for i in compact.edge_sources[offset:offset + count]]
+                offset += count
+            edges.append({"from_id": ids[from_index], "to_id": ids[to_index], "sources": sources})
+        graph = {"nodes": nodes, "edges": edges}
+
+    return ParseResponse.model_validate({
+        "program_info": {"program_code": strings[code], "program_title": strings[title], "total_credits": total_credits},
+        "courses": courses, "session_id": compact.session_id, "graph": graph,
+    })
+
+
+def release_compact(compact: CompactParseResponse, pool: StringPool) -> None:
+    """
+    Give a removed session's strings back to the pool. The compact object stays
+    readable, a reader that fetched it before the removal can still expand it
+    """
+    for text in compact.shared:
+        pool.release(text)
@@ -0,0 +1,40 @@
+"""
+Course-code index of a study plan
+Prerequisite filtering, validation and graph building all need to ask "is
+this code a course in the plan, and under which id?". CourseIndex answers in
+O(1) on canonical codes (whitespace removed, as in rules.normalize_code), so it
+is built once per plan and passed between the stages instead of each stage
+rebuilding its own set or map.
+"""
+from typing import Dict, Iterable, Optional
+from models import Course
+from extraction_rules import ExtractionRules, DEFAULT_RULES
+
+
+class CourseIndex:
+    """Canonical course code -> course code as written in the plan (the graph node id)"""
+
+    def __init__(self, courses: Iterable[Course] = (), rules: ExtractionRules = DEFAULT_RULES):
+        self.rules = rules
+        self._node_ids: Dict[str, str] = {}
+        self.add_courses(courses)
+
+    def add_courses(self, courses: Iterable[Course]) -> None:
+        """Index more courses (electives without a code are skipped)"""
+        for course in courses:
+            if course.course_code:
+                # "CSX 3001" and "CSX3001" are the same course; the first spelling is its id
+                self._node_ids.setdefault(self.rules.normalize_code(course.course_code), course.course_code)
+
+    def canonical(self, code: str) -> str:
+        return self.rules.normalize_code(code)
+
+    def __contains__(self, code: str) -> bool:
+        return self.rules.normalize_code(code) in self._node_ids
+
+    def __len__(self) -> int:
+        return len(self._node_ids)
+
+    def node_id(self, code: str) -> Optional[str]:
+        """Graph node id of a course code in any spelling, None if it is not in the plan"""
+        return self._node_ids.get(self.rules.normalize_code(code))
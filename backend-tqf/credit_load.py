@@ -0,0 +1,24 @@
+"""
+Credit load of a study plan
+Shared by extraction (extracted vs stated credits) and graph analysis
+(per-semester load); kept free of other backend imports so either can use it.
+"""
+from typing import Iterable, Tuple
+
+
+def plan_credits(items: Iterable[Tuple[int, bool]]) -> int:
+    """
+    Credits a student takes from (credits, is an OR alternative) in plan order:
+    a run of consecutive OR alternatives is one group and counts its largest credits once
+    """
+    total = 0
+    or_group_credits = None
+    for credits, alternative in items:
+        if alternative:
+            or_group_credits = max(or_group_credits or 0, credits)
+            continue
+        if or_group_credits is not None:
+            total += or_group_credits
+            or_group_credits = None
+        total += credits
+    return total + (or_group_credits or 0)
@@ -1,13 +1,27 @@
 import csv
 import io
-from typing import List, Dict, Tuple
+from typing import Iterator, List, Dict, Optional, Tuple
 from models import Course, StudyPlanNode, StudyPlanEdge, StudyPlanGraph
+from extraction_rules import ExtractionRules, DEFAULT_RULES
+from course_index import CourseIndex
+from graph_layout import GRAPH_LAYOUT, apply_layered_layout
+
+# Bump whenever graph output (nodes, edges or layout) changes so cached parse results are invalidated
+GRAPH_VERSION = f"{GRAPH_LAYOUT}/1"
 
 
 def generate_csv(courses: List[Course]) -> str:
     """
     Generate formatted CSV content from courses list with year grouping and better spacing
     """
+    return ''.join(iter_csv_chunks(courses))
+
+
+def iter_csv_chunks(courses: List[Course], rows_per_chunk: int = 256) -> Iterator[str]:
+    """
+    Same CSV as generate_csv, yielded in chunks of rows_per_chunk rows
+    so large exports can be streamed without building one big string
+    """
     output = io.StringIO()
     
     # Sort courses by year, semester for consistent output
@@ -20,6 +34,7 @@ def generate_csv(courses: List[Course]) -> str:
     
     # Group courses by year for better organization
     current_year = None
+    rows = 0
     
     for course in sorted_courses:
         # Add year separator if this is a new year
@@ -43,49 +58,39 @@ def generate_csv(courses: List[Course]) -> str:
             prerequisite,
             or_flag
         ])
-    
-    return output.getvalue()
+        
+        rows += 1
+        if rows >= rows_per_chunk:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+            rows = 0
+    
+    if output.tell():
+        yield output.getvalue()
 
 
-def generate_study_plan_graph(courses: List[Course]) -> StudyPlanGraph:
+def semester_nodes(courses: List[Course], semesters_per_year: int,
+                   rules: ExtractionRules = DEFAULT_RULES) -> List[StudyPlanNode]:
     """
-    Generate a graph structure for study plan visualization
+    Nodes for the courses of one semester, in order, with grid positions
+    Elective ids are numbered within the semester, so one semester's nodes
+    can be rebuilt without touching the rest of the graph
     """
-    
-    # Sort courses by year, semester for consistent layout
-    sorted_courses = sorted(courses, key=lambda x: (x.year, x.semester))
-    
-    # Create nodes
     nodes = []
-    course_code_to_id = {}  # Map for prerequisite matching
-    or_group_counter = {}  # Track OR groups per (year, semester)
-    
-    # Track vertical position within each semester
-    semester_positions = {}  # (year, semester) -> current_row
+    elective_counter = 0
     
-    for course in sorted_courses:
+    for row, course in enumerate(courses):
         # Determine node type (check for partial match to handle variations)
-        title_lower = course.course_title.lower() if course.course_title else ""
-        if "major elective" in title_lower:
-            node_type = "major_elective"
-        elif "free elective" in title_lower:
-            node_type = "free_elective"
-        else:
-            node_type = "course"
+        node_type = rules.elective_type(course.course_title or "") or "course"
         
         # Generate node ID
         if course.course_code:
             node_id = course.course_code
-            # Store both with and without space for lookup
-            course_code_to_id[course.course_code] = node_id
-            course_code_to_id[course.course_code.replace(" ", "")] = node_id
         else:
             # Generate ID for electives
-            semester_key = (course.year, course.semester)
-            if semester_key not in or_group_counter:
-                or_group_counter[semester_key] = 0
-            or_group_counter[semester_key] += 1
-            node_id = f"Y{course.year}S{course.semester}-{node_type.upper()}-{or_group_counter[semester_key]}"
+            elective_counter += 1
+            node_id = f"Y{course.year}S{course.semester}-{node_type.upper()}-{elective_counter}"
         
         # Handle OR-group assignment
         or_group = None
@@ -93,16 +98,9 @@ def generate_study_plan_graph(courses: List[Course]) -> StudyPlanGraph:
             or_group = f"Y{course.year}S{course.semester}-OR"
         
         # Calculate position (grid layout)
-        semester_index = (course.year - 1) * 2 + course.semester  # 1-8
-        semester_key = (course.year, course.semester)
-        
-        if semester_key not in semester_positions:
-            semester_positions[semester_key] = 0
-        
-        row = semester_positions[semester_key]
+        semester_index = (course.year - 1) * semesters_per_year + course.semester
         x = semester_index * 300  # Horizontal spacing
         y = row * 150  # Vertical spacing
-        semester_positions[semester_key] += 1
         
         node = StudyPlanNode(
             id=node_id,
@@ -117,93 +115,118 @@ def generate_study_plan_graph(courses: List[Course]) -> StudyPlanGraph:
         )
         nodes.append(node)
     
-    # Create edges from prerequisites with branching support
-    edges = []
-    
+    return nodes
+
+
+def prerequisite_edge(course: Course, index: CourseIndex) -> Optional[StudyPlanEdge]:
+    """Edge from a course's in-plan prerequisites to the course, branching when there are several"""
+    if not course.course_code or not course.prerequisite or course.prerequisite in ["", "-"]:
+        return None
     
-    # Group prerequisites by target course for branching
-    course_prerequisites = {}  # target_course -> [source_courses]
+    # Parse prerequisite string (comma-separated)
+    prereq_list = [p.strip() for p in course.prerequisite.split(",")]
+    valid_prereqs = []
     
-    for course in sorted_courses:
-        if not course.course_code or not course.prerequisite or course.prerequisite in ["", "-"]:
+    for prereq in prereq_list:
+        if not prereq:
             continue
         
+        # Extract course code (handle both "CSX 3001" and "CSX3001" formats)
+        prereq_code = index.rules.match_code_start(prereq) or prereq
         
-        # Parse prerequisite string (comma-separated)
-        prereq_list = [p.strip() for p in course.prerequisite.split(",")]
-        valid_prereqs = []
-        
-        for prereq in prereq_list:
-            if not prereq:
-                continue
-            
-            # Extract course code (handle both "CSX 3001" and "CSX3001" formats)
-            # Pattern: 2-4 letters followed by optional space and 4 digits
-            import re
-            code_match = re.match(r'^([A-Z]{2,4}\s*\d{4})', prereq)
-            if code_match:
-                prereq_code = code_match.group(1).replace(" ", "")
-            else:
-                prereq_code = prereq.replace(" ", "")
-            
-            
-            # Only include if prerequisite exists in our nodes
-            if prereq_code in course_code_to_id:
-                valid_prereqs.append(prereq_code)
-        
-        if valid_prereqs:
-            course_prerequisites[course.course_code] = valid_prereqs
-    
-    # Create branching edges for courses with multiple prerequisites
-    for target_course, source_courses in course_prerequisites.items():
-        if len(source_courses) == 1:
-            # Single prerequisite - create regular edge
-            edge = StudyPlanEdge(
-                from_id=course_code_to_id[source_courses[0]],
-                to_id=course_code_to_id[target_course]
-            )
-            edges.append(edge)
-        else:
-            # Multiple prerequisites - create branching edge
-            # Keep first prerequisite as from_id for compatibility
-            edge = StudyPlanEdge(
-                from_id=course_code_to_id[source_courses[0]],  # First prerequisite
-                to_id=course_code_to_id[target_course],
-                sources=[course_code_to_id[prereq] for prereq in source_courses]  # All prerequisites
-            )
-            edges.append(edge)
+        # Only include if prerequisite exists in our nodes
+        prereq_id = index.node_id(prereq_code)
+        if prereq_id is not None:
+            valid_prereqs.append(prereq_id)
+    
+    if not valid_prereqs:
+        return None
+    if len(valid_prereqs) == 1:
+        # Single prerequisite - create regular edge
+        return StudyPlanEdge(from_id=valid_prereqs[0], to_id=course.course_code)
+    # Multiple prerequisites - create branching edge
+    # Keep first prerequisite as from_id for compatibility
+    return StudyPlanEdge(
+        from_id=valid_prereqs[0],  # First prerequisite
+        to_id=course.course_code,
+        sources=valid_prereqs  # All prerequisites
+    )
+
+
+def semesters_per_year_of(courses: List[Course]) -> int:
+    """Semesters per year (2, or 3 when the plan has summer sessions)"""
+    return max([2] + [course.semester for course in courses])
+
+
+def generate_study_plan_graph(courses: List[Course], rules: ExtractionRules = DEFAULT_RULES,
+                              index: Optional[CourseIndex] = None) -> StudyPlanGraph:
+    """
+    Generate a graph structure for study plan visualization
+    Pass the plan's CourseIndex to reuse it for prerequisite matching
+    """
+    if index is None:
+        index = CourseIndex(courses, rules)
+    
+    # Sort courses by year, semester for consistent layout
+    sorted_courses = sorted(courses, key=lambda x: (x.year, x.semester))
+    semesters_per_year = semesters_per_year_of(sorted_courses)
+    
+    # Create nodes, one semester at a time
+    semesters: Dict[Tuple[int, int], List[Course]] = {}
+    for course in sorted_courses:
+        semesters.setdefault((course.year, course.semester), []).append(course)
+    nodes = []
+    for semester_courses in semesters.values():
+        nodes.extend(semester_nodes(semester_courses, semesters_per_year, rules))
+    
+    # Create edges from prerequisites with branching support, one per target course
+    course_edges: Dict[str, StudyPlanEdge] = {}
+    for course in sorted_courses:
+        edge = prerequisite_edge(course, index)
+        if edge is not None:
+            course_edges[course.course_code] = edge
+    edges = list(course_edges.values())
+    
+    # Replace the grid positions with a crossing-minimized layered layout
+    if GRAPH_LAYOUT == "layered":
+        apply_layered_layout(nodes, edges, semesters_per_year)
     
     return StudyPlanGraph(nodes=nodes, edges=edges)
 
 
-def validate_and_clean_courses(courses: List[Course]) -> List[Course]:
+def clean_prerequisite(prerequisite: str, index: CourseIndex) -> str:
+    """Keep only the comma-separated prerequisites that start with an in-plan course code"""
+    # Split by comma and clean each prerequisite
+    prereq_list = [p.strip() for p in prerequisite.split(",")]
+    valid_prereqs = []
+    
+    for prereq in prereq_list:
+        if prereq:
+            # Extract course code (pattern: 2-4 letters + optional space + 4 digits)
+            prereq_code = index.rules.match_code_start(prereq)
+            # Spacing does not matter, the index compares canonical codes
+            if prereq_code and prereq_code in index:
+                valid_prereqs.append(prereq)
+    
+    return ", ".join(valid_prereqs)
+
+
+def validate_and_clean_courses(courses: List[Course], rules: ExtractionRules = DEFAULT_RULES,
+                               index: Optional[CourseIndex] = None) -> List[Course]:
     """
     Validate courses and clean prerequisites to only include in-plan courses
+    Pass the plan's CourseIndex to reuse it instead of building one
     """
-    # Get all valid course codes from the plan
-    valid_codes = {course.course_code for course in courses if course.course_code}
+    # All valid course codes from the plan, in canonical form
+    if index is None:
+        index = CourseIndex(courses, rules)
     
     cleaned_courses = []
     
     for course in courses:
         # Clean prerequisites
         if course.prerequisite and course.prerequisite not in ["", "-"]:
-            # Split by comma and clean each prerequisite
-            prereq_list = [p.strip() for p in course.prerequisite.split(",")]
-            valid_prereqs = []
-            
-            for prereq in prereq_list:
-                if prereq:
-                    # Extract course code (pattern: 2-4 letters + optional space + 4 digits)
-                    import re
-                    code_match = re.match(r'^([A-Z]{2,4}\s*\d{4})', prereq)
-                    if code_match:
-                        prereq_code = code_match.group(1).replace(" ", "")
-                        # Check both with and without space
-                        if prereq_code in valid_codes or prereq_code.replace(" ", "") in {c.replace(" ", "") for c in valid_codes}:
-                            valid_prereqs.append(prereq)
-            
-            course.prerequisite = ", ".join(valid_prereqs)
+            course.prerequisite = clean_prerequisite(course.prerequisite, index)
         
         cleaned_courses.append(course)
     
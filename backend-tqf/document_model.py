@@ -0,0 +1,168 @@
+"""
+Shared document model
+Opens an uploaded DOCX/PDF once and keeps the paragraphs, table rows and
+page text that both the fast (regex) and Gemini pipelines consume.
+"""
+import os
+from typing import List, Optional
+import docx
+from docx_stream import read_docx_stream
+from extraction_rules import ExtractionRules, DEFAULT_RULES
+from pdf_pages import read_pdf_pages
+from uploads import UploadSource, open_source
+from metrics import span
+
+# DOCX backend: "stream" (iterparse of word/document.xml) or "python-docx"
+DOCX_READER = os.getenv("DOCX_READER", "stream")
+
+
+class DocumentModel:
+    """
+    Intermediate representation of an uploaded document.
+    DOCX uploads fill paragraphs/tables, PDF uploads fill pages.
+    """
+
+    def __init__(self, paragraphs: Optional[List[str]] = None,
+                 tables: Optional[List[List[List[str]]]] = None,
+                 pages: Optional[List[str]] = None):
+        self.paragraphs = paragraphs or []  # stripped text, empty paragraphs kept
+        self.tables = tables or []  # table -> row -> stripped cell text (merged cells repeated)
+        self.pages = pages  # text of the PDF pages read (see pdf_pages.py), None for DOCX
+        self._fast_text: Optional[str] = None
+        self._gemini_text: Optional[str] = None
+
+    @property
+    def is_pdf(self) -> bool:
+        return self.pages is not None
+
+    @property
+    def fast_text(self) -> str:
+        """Text layout used by the regex extractor (stacked cell lines are unstacked)"""
+        if self._fast_text is None:
+            if self.is_pdf:
+                self._fast_text = '\n'.join(page for page in self.pages if page)
+            else:
+                self._fast_text = '\n'.join(self._fast_lines())
+        return self._fast_text
+
+    @property
+    def gemini_text(self) -> str:
+        """Text layout sent to Gemini (cells joined with | and year/semester rows marked)"""
+        if self._gemini_text is None:
+            if self.is_pdf:
+                self._gemini_text = ''.join(page + '\n' for page in self.pages)
+            else:
+                self._gemini_text = '\n'.join(self._gemini_lines())
+        return self._gemini_text
+
+    def _fast_lines(self) -> List[str]:
+        text_content = [p for p in self.paragraphs if p]
+
+        # Handle cells with multiple lines (courses stacked in same cell)
+        for table in self.tables:
+            for cells in table:
+                # Check if any cell has newlines (multiple items stacked)
+                max_lines = max(len(c.split('\n')) for c in cells) if cells else 1
+
+                if max_lines > 1:
+                    # Split each cell by newlines and combine corresponding lines
+                    split_cells = [c.split('\n') for c in cells]
+                    for line_idx in range(max_lines):
+                        line_parts = []
+                        for cell_lines in split_cells:
+                            if line_idx < len(cell_lines):
+                                line_parts.append(cell_lines[line_idx].strip())
+                            else:
+                                line_parts.append('')
+                        combined = ' '.join(p for p in line_parts if p)
+                        if combined:
+                            text_content.append(combined)
+                else:
+                    # Single line per cell - join normally
+                    row_text = ' '.join(c for c in cells if c)
+                    if row_text:
+                        text_content.append(row_text)
+
+        return text_content
+
+    def _gemini_lines(self) -> List[str]:
+        text_parts = [p for p in self.paragraphs if p]
+
+        for table in self.tables:
+            for cells in table:
+                row_text = [c for c in cells if c]
+                if not row_text:
+                    continue
+
+                row_content = " | ".join(row_text)
+
+                # Check if this is a year/semester header row
+                first_cell = row_text[0].lower()
+                if any(pattern in first_cell for pattern in ['year', 'semester']):
+                    # Add special formatting for year/semester headers
+                    text_parts.append(f"\n=== {row_content} ===\n")
+                else:
+                    # Regular course row
+                    text_parts.append(row_content)
+
+        return text_parts
+
+
+def load_docx(source: UploadSource) -> DocumentModel:
+    """Open a DOCX once and capture paragraph and table text"""
+    if DOCX_READER == "python-docx":
+        return load_docx_object_model(source)
+    paragraphs, tables = read_docx_stream(source)
+    return DocumentModel(paragraphs=paragraphs, tables=tables)
+
+
+def load_docx_object_model(source: UploadSource) -> DocumentModel:
+    """load_docx through python-docx's object model (same text, more memory)"""
+    with open_source(source) as stream:
+        doc = docx.Document(stream)
+
+    paragraphs = [p.text.strip() for p in doc.paragraphs]
+
+    tables = []
+    for table in doc.tables:
+        # row.cells rebuilds the whole cell grid on every call, so build it
+        # once per table and slice it into rows the way python-docx does
+        grid = table._cells
+        column_count = table._column_count
+        cell_text = {}  # merged cells repeat the same _Cell, read its text once
+        rows = []
+        for row_idx in range(len(table.rows)):
+            cells = grid[row_idx * column_count:(row_idx + 1) * column_count]
+            row = []
+            for cell in cells:
+                text = cell_text.get(id(cell))
+                if text is None:
+                    text = cell.text.strip()
+                    cell_text[id(cell)] = text
+                row.append(text)
+            rows.append(row)
+        tables.append(rows)
+
+    return DocumentModel(paragraphs=paragraphs, tables=tables)
+
+
+def load_pdf(source: UploadSource, rules: ExtractionRules = DEFAULT_RULES, all_pages: bool = False,
+             digest: Optional[str] = None) -> DocumentModel:
+    """
+    Open a PDF once and capture the text of its study-plan pages
+    (every page when all_pages is set or no Year/Semester header is found)
+    """
+    return DocumentModel(pages=read_pdf_pages(source, rules, all_pages, digest))
+
+
+def load_document(source: UploadSource, filename: str, rules: ExtractionRules = DEFAULT_RULES,
+                  all_pages: bool = False, digest: Optional[str] = None) -> DocumentModel:
+    """
+    Build the document model for an upload based on its file type
+    source is the upload's bytes or the path of its spooled temp file; digest
+    is its content hash when the caller already has it (see read_pdf_pages)
+    """
+    with span("read"):
+        if filename.lower().endswith('.docx'):
+            return load_docx(source)
+        return load_pdf(source, rules, all_pages, digest)
@@ -0,0 +1,219 @@
+"""
+Streaming DOCX reader
+Reads word/document.xml straight out of the ZIP with an incremental parser
+instead of building python-docx's object model. Each top-level paragraph and
+table row is turned into text as soon as it has been parsed and then dropped
+from the tree, so memory stays flat however long the document is.
+
+The text matches python-docx exactly: Paragraph.text for top-level paragraphs,
+and Table._cells sliced into rows for top-level tables, where a merged cell
+repeats the same text (read once) in every grid slot it covers.
+"""
+import posixpath
+import zipfile
+from typing import Iterator, List, Optional, Tuple
+from lxml import etree
+from uploads import UploadSource, open_source
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+BODY = W + "body"
+P = W + "p"
+R = W + "r"
+HYPERLINK = W + "hyperlink"
+TBL = W + "tbl"
+TBL_GRID = W + "tblGrid"
+GRID_COL = W + "gridCol"
+TR = W + "tr"
+TC = W + "tc"
+TC_PR = W + "tcPr"
+GRID_SPAN = W + "gridSpan"
+V_MERGE = W + "vMerge"
+VAL = W + "val"
+TYPE = W + "type"
+
+# Run children python-docx turns into text, and their text
+T = W + "t"
+BR = W + "br"
+RUN_TEXT = {
+    W + "tab": "\t",
+    W + "ptab": "\t",
+    W + "cr": "\n",
+    W + "noBreakHyphen": "-",
+}
+
+OFFICE_DOCUMENT_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+PACKAGE_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}Relationship"
+
+
+def _run_text(run) -> str:
+    parts = []
+    for child in run:
+        tag = child.tag
+        if tag == T:
+            parts.append(child.text or "")
+        elif tag == BR:
+            # Only line breaks are text, column and page breaks are not
+            if child.get(TYPE, "textWrapping") == "textWrapping":
+                parts.append("\n")
+        else:
+            text = RUN_TEXT.get(tag)
+            if text:
+                parts.append(text)
+    return "".join(parts)
+
+
+def _paragraph_text(paragraph) -> str:
+    parts = []
+    for child in paragraph:
+        if child.tag == R:
+            parts.append(_run_text(child))
+        elif child.tag == HYPERLINK:
+            parts.extend(_run_text(run) for run in child if run.tag == R)
+    return "".join(parts)
+
+
+def _cell_text(cell) -> str:
+    return "\n".join(_paragraph_text(p) for p in cell if p.tag == P).strip()
+
+
+def _cell_spans(cell) -> Tuple[int, bool]:
+    """(grid span, whether the cell continues a vertical merge)"""
+    properties = cell.find(TC_PR)
+    if properties is None:
+        return 1, False
+    span = properties.find(GRID_SPAN)
+    merge = properties.find(V_MERGE)
+    grid_span = int(span.get(VAL)) if span is not None and span.get(VAL) else 1
+    # <w:vMerge/> without a val continues the merge above
+    continues = merge is not None and merge.get(VAL, "continue") == "continue"
+    return grid_span, continues
+
+
+def _main_document_path(archive: zipfile.ZipFile) -> str:
+    """Part name of the main document from the package relationships"""
+    try:
+        rels = etree.fromstring(archive.read("_rels/.rels"))
+    except (KeyError, etree.XMLSyntaxError):
+        return "word/document.xml"
+    for rel in rels.iter(PACKAGE_REL):
+        if rel.get("Type") == OFFICE_DOCUMENT_REL:
+            return posixpath.normpath(rel.get("Target", "word/document.xml").lstrip("/"))
+    return "word/document.xml"
+
+
+class _TableGrid:
+    """
+    Cell grid of one table, built the way python-docx's Table._cells builds it
+    and cut into rows of column_count slots as they fill up. A table without
+    grid columns (no or an empty w:tblGrid) takes its width from its first row
+    """
+
+    def __init__(self, column_count: int):
+        self.column_count = column_count
+        self.grid: List[str] = []
+        self.rows_seen = 0
+        self.rows_emitted = 0
+
+    def add_row(self, row) -> Iterator[List[str]]:
+        self.rows_seen += 1
+        cells = [(cell, _cell_spans(cell)) for cell in row if cell.tag == TC]
+        if not self.column_count:
+            self.column_count = max(1, sum(grid_span for _, (grid_span, _) in cells))
+        for cell, (grid_span, continues) in cells:
+            for span_idx in range(grid_span):
+                if continues and len(self.grid) >= self.column_count:
+                    self.grid.append(self.grid[-self.column_count])
+                elif span_idx > 0:
+                    self.grid.append(self.grid[-1])
+                elif continues:
+                    self.grid.append("")  # continues a merge with nothing above it
+                else:
+                    self.grid.append(_cell_text(cell))
+        # Rows are slices of the grid, so a row is complete once the grid reaches its end
+        while (self.rows_emitted < self.rows_seen
+               and len(self.grid) >= (self.rows_emitted + 1) * self.column_count):
+            yield self._slice(self.rows_emitted)
+            self.rows_emitted += 1
+
+    def finish(self) -> Iterator[List[str]]:
+        while self.rows_emitted < self.rows_seen:
+            yield self._slice(self.rows_emitted)
+            self.rows_emitted += 1
+
+    def _slice(self, row_idx: int) -> List[str]:
+        return self.grid[row_idx * self.column_count:(row_idx + 1) * self.column_count]
+
+
+def iter_docx_events(source: UploadSource) -> Iterator[Tuple]:
+    """
+    Yield ("paragraph", text) for each top-level paragraph, ("table", table_index)
+    when a top-level table starts and ("row", table_index, cells) for each of its
+    rows, in document order. Text is stripped, as in load_docx
+    """
+    with open_source(source) as upload, zipfile.ZipFile(upload) as archive:
+        with archive.open(_main_document_path(archive)) as stream:
+            yield from _iter_body_events(stream)
+
+
+def _iter_body_events(stream) -> Iterator[Tuple]:
+    table_index = -1
+    table = None  # top-level w:tbl being read
+    grid: Optional[_TableGrid] = None
+
+    # Only these elements come back from the parser, everything else stays in C
+    for _, elem in etree.iterparse(stream, events=("end",), tag=(P, TBL, TBL_GRID, TR), huge_tree=True):
+        parent = elem.getparent()
+        if parent is None:
+            continue
+
+        if parent.tag == BODY:
+            # Top-level body child is complete
+            if elem.tag == P:
+                yield "paragraph", _paragraph_text(elem).strip()
+            elif elem.tag == TBL:
+                if elem is not table:
+                    table_index += 1
+                    yield "table", table_index
+                elif grid is not None:
+                    for cells in grid.finish():
+                        yield "row", table_index, cells
+                table, grid = None, None
+            _release(elem)
+        elif parent.tag == TBL and elem.tag != P and parent.getparent() is not None \
+                and parent.getparent().tag == BODY:
+            # Child of a top-level table: the grid definition, or a finished row
+            if parent is not table:
+                table_index += 1
+                table, grid = parent, None
+                yield "table", table_index
+            if elem.tag == TBL_GRID:
+                grid = _TableGrid(sum(1 for col in elem if col.tag == GRID_COL))
+            elif elem.tag == TR:
+                if grid is None:
+                    grid = _TableGrid(0)  # no w:tblGrid, sized by the first row
+                for cells in grid.add_row(elem):
+                    yield "row", table_index, cells
+                _release(elem)
+
+
+def _release(elem) -> None:
+    """Drop a processed element and any earlier siblings from the partial tree"""
+    elem.clear(keep_tail=True)
+    parent = elem.getparent()
+    if parent is not None:
+        while elem.getprevious() is not None:
+            del parent[0]
+
+
+def read_docx_stream(source: UploadSource) -> Tuple[List[str], List[List[List[str]]]]:
+    """Paragraphs and tables (table -> row -> cells) of a DOCX, read with iter_docx_events"""
+    paragraphs: List[str] = []
+    tables: List[List[List[str]]] = []
+    for event in iter_docx_events(source):
+        if event[0] == "paragraph":
+            paragraphs.append(event[1])
+        elif event[0] == "table":
+            tables.append([])
+        else:
+            tables[event[1]].append(event[2])
+    return paragraphs, tables
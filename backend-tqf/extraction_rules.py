@@ -0,0 +1,227 @@
+"""
+Declarative extraction rules for the fast (regex) extractor
+Every pattern is compiled once when a rule set is built. Faculties can
+override the defaults from a JSON file named by EXTRACTION_RULES_FILE:
+
+{
+  "faculties": {
+    "engineering": {
+      "course_prefixes": ["CE", "EE", "ME", "GE"],
+      "elective_phrases": {"Technical Elective": "major_elective"}
+    }
+  }
+}
+
+Keys that are not given fall back to DEFAULT_CONFIG.
+"""
+import hashlib
+import json
+import os
+import re
+from typing import Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_CONFIG = {
+    # Course code pattern, no capturing groups. Matched codes have spaces removed
+    "course_code_pattern": r"[A-Z]{2,4}\s*\d{4}",
+    # Allowed course-code prefixes, empty means any prefix the pattern accepts
+    "course_prefixes": [],
+    # Elective phrase -> node type. Rows become "<phrase> Course" placeholders
+    "elective_phrases": {
+        "Major Elective": "major_elective",
+        "Free Elective": "free_elective",
+    },
+    # Year/Semester header formats. Each needs a named "year" group and may have
+    # a "semester" group; formats without one are summer sessions
+    "header_patterns": [
+        r"Year\s*(?P<year>\d+)[\s,]*Semester\s*(?P<semester>\d+)",
+        r"Year\s*(?P<year>\d+)[\s,]*Summer",
+    ],
+    # Words that must all appear on the study plan table header line
+    "table_header_keywords": ["Course Code", "Course Title", "Credits"],
+    "summer_semester": 3,
+    "default_credits": 3,
+}
+
+NUMBER_WORDS = {
+    'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5,
+    'six': 6, 'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10
+}
+
+TOTAL_PATTERN = re.compile(r"Total", re.IGNORECASE)
+TOTAL_LINE_CREDITS_PATTERN = re.compile(r"Total\D*?(\d+)", re.IGNORECASE)
+CREDITS_NUMBER_PATTERN = re.compile(r"^(\d+)")
+PREREQUISITE_PATTERN = re.compile(r"Prerequisites?:\s*(.+)", re.IGNORECASE)
+
+# Program info patterns
+PROGRAM_CODE_PATTERN = re.compile(r"Code\s+(\d{10,})", re.IGNORECASE)
+PROGRAM_CODE_FALLBACK_PATTERN = re.compile(r"Program\s*Code[:\s]*([A-Z0-9\-]+)", re.IGNORECASE)
+PROGRAM_TITLE_PATTERN = re.compile(r"Program\s+(Bachelor[^\n]+(?:\([^)]+\))?)", re.IGNORECASE)
+PROGRAM_TITLE_FALLBACK_PATTERN = re.compile(r"(Bachelor\s+of\s+\w+\s+Program\s+in[^\n]+(?:\([^)]+\))?)", re.IGNORECASE)
+TOTAL_CREDITS_PATTERN = re.compile(r"Total\s*(?:Credits?|หน่วยกิต)[:\s]*(\d+)", re.IGNORECASE)
+TOTAL_CREDITS_FALLBACK_PATTERN = re.compile(r"(\d{2,3})\s*Credits?", re.IGNORECASE)
+
+# Program duration: a stated "4-year program", or the maximum study time, which
+# Thai TQF documents set at twice the normal duration ("a maximum of 8 years")
+STUDY_YEARS_PATTERN = re.compile(r"\b(\d{1,2})[ \t-]*years?[ \t]+(?:bachelor(?:'s)?[ \t]+)?(?:degree[ \t]+)?program", re.IGNORECASE)
+MAX_STUDY_YEARS_PATTERN = re.compile(r"maximum[ \t]+of[ \t]+(\d{1,2})[ \t]+(?:academic[ \t]+)?years", re.IGNORECASE)
+
+# All of them, in the order extract_program_info tries them
+PROGRAM_INFO_PATTERNS = [
+    PROGRAM_CODE_PATTERN, PROGRAM_CODE_FALLBACK_PATTERN,
+    PROGRAM_TITLE_PATTERN, PROGRAM_TITLE_FALLBACK_PATTERN,
+    TOTAL_CREDITS_PATTERN, TOTAL_CREDITS_FALLBACK_PATTERN,
+]
+
+
+class ExtractionRules:
+    """Compiled rule set for one faculty"""
+
+    def __init__(self, config: Dict):
+        self.config = config
+        # Identifies the rule set in cache keys, changes whenever the config does
+        self.fingerprint = hashlib.sha256(
+            json.dumps(config, sort_keys=True).encode("utf-8")
+        ).hexdigest()[:16]
+        code = config["course_code_pattern"]
+        self.course_prefixes = frozenset(p.upper() for p in config["course_prefixes"])
+        self.summer_semester = config["summer_semester"]
+        self.default_credits = config["default_credits"]
+        self.table_header_keywords = list(config["table_header_keywords"])
+
+        self.course_code = re.compile(code)
+        self.course_code_start = re.compile(rf"^({code})")
+        # "CSX 3001 Fundamentals of Computer Programming 3 (3-0-6)"
+        self.course_entry = re.compile(
+            rf"(?P<code>{code})\s+(?P<title>[^0-9]+?)\s+(?P<credits>\d+\s*\([\d\-]+\))"
+        )
+
+        # One alternation for all elective phrases, resolved with a dict lookup,
+        # so adding phrases does not add passes over the line
+        self.elective_types = {
+            phrase.lower(): node_type
+            for phrase, node_type in config["elective_phrases"].items()
+        }
+        phrases = sorted(config["elective_phrases"], key=len, reverse=True)
+        counts = "|".join(NUMBER_WORDS)
+        if phrases:
+            # Phrases match case-sensitively, the count word in any case
+            self.elective = re.compile(
+                rf"(?:(?P<count>(?i:{counts})|\d+)\s+)?(?P<phrase>{'|'.join(re.escape(p) for p in phrases)})"
+            )
+        else:
+            self.elective = None
+
+        # Header formats are merged into one pattern with per-format group names
+        self.header_formats = len(config["header_patterns"])
+        self.header = re.compile(
+            "|".join(
+                "(?:" + pattern.replace("(?P<year>", f"(?P<year_{i}>")
+                               .replace("(?P<semester>", f"(?P<semester_{i}>") + ")"
+                for i, pattern in enumerate(config["header_patterns"])
+            ),
+            re.IGNORECASE
+        )
+
+    def normalize_code(self, code: str) -> str:
+        """Canonical course code: no whitespace"""
+        return "".join(code.split())
+
+    def is_allowed_code(self, code: str) -> bool:
+        """Check a normalized course code against the faculty's prefixes"""
+        if not self.course_prefixes:
+            return True
+        prefix = code.rstrip("0123456789")
+        return prefix in self.course_prefixes
+
+    def find_codes(self, text: str) -> List[str]:
+        """All allowed course codes in a string, normalized"""
+        codes = (self.normalize_code(code) for code in self.course_code.findall(text))
+        return [code for code in codes if self.is_allowed_code(code)]
+
+    def match_code_start(self, text: str) -> Optional[str]:
+        """Normalized course code at the start of a string, if any"""
+        code_match = self.course_code_start.match(text)
+        return self.normalize_code(code_match.group(1)) if code_match else None
+
+    def iter_course_entries(self, line: str) -> Iterator[Tuple[str, str, str]]:
+        """Yield (code, title, credits_text) for each course entry on a line"""
+        for entry in self.course_entry.finditer(line):
+            code = self.normalize_code(entry.group("code"))
+            if self.is_allowed_code(code):
+                yield code, entry.group("title").strip(), entry.group("credits").strip()
+
+    def match_elective(self, line: str) -> Optional[Tuple[str, Optional[int]]]:
+        """
+        Return (phrase, count) if the line is an elective row, or None.
+        count is None when the line names the elective without a count
+        """
+        if self.elective is None:
+            return None
+        elective_match = self.elective.search(line)
+        if not elective_match:
+            return None
+        phrase = elective_match.group("phrase")
+        count_str = elective_match.group("count")
+        if count_str is None:
+            return phrase, None
+        count_str = count_str.lower()
+        count = int(count_str) if count_str.isdigit() else NUMBER_WORDS.get(count_str, 1)
+        return phrase, count
+
+    def elective_type(self, title: str) -> Optional[str]:
+        """Node type for an elective placeholder title, None for regular courses"""
+        title_lower = title.lower()
+        for phrase_lower, node_type in self.elective_types.items():
+            if phrase_lower in title_lower:
+                return node_type
+        return None
+
+    def is_table_header(self, line: str) -> bool:
+        return all(keyword in line for keyword in self.table_header_keywords)
+
+    def iter_headers(self, text: str) -> Iterator[Tuple[int, int, int]]:
+        """Yield (start, year, semester) for each Year/Semester header in the text"""
+        for header_match in self.header.finditer(text):
+            for i in range(self.header_formats):
+                year = header_match.group(f"year_{i}")
+                if year is None:
+                    continue
+                semester = header_match.groupdict().get(f"semester_{i}")
+                yield (
+                    header_match.start(),
+                    int(year),
+                    int(semester) if semester else self.summer_semester,
+                )
+                break
+
+
+def _load_faculty_configs() -> Dict[str, Dict]:
+    path = os.getenv("EXTRACTION_RULES_FILE")
+    if not path:
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Warning: could not load extraction rules from {path}: {e}")
+        return {}
+    return {name.lower(): overrides for name, overrides in data.get("faculties", {}).items()}
+
+
+DEFAULT_RULES = ExtractionRules(DEFAULT_CONFIG)
+
+_faculty_configs = _load_faculty_configs()
+_rules_cache: Dict[str, ExtractionRules] = {}
+
+
+def get_rules(faculty: Optional[str] = None) -> ExtractionRules:
+    """Compiled rules for a faculty, or the defaults when it has no overrides"""
+    if not faculty:
+        return DEFAULT_RULES
+    key = faculty.lower()
+    overrides = _faculty_configs.get(key)
+    if overrides is None:
+        return DEFAULT_RULES
+    if key not in _rules_cache:
+        _rules_cache[key] = ExtractionRules({**DEFAULT_CONFIG, **overrides})
+    return _rules_cache[key]
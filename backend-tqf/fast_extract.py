@@ -3,76 +3,36 @@ Fast extraction module - No AI, uses regex patterns
 Extracted algorithm from studyplan.py
 """
 import re
-from typing import List, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from models import Course, ProgramInfo, ParseResponse
-from io import BytesIO
-import docx
-import PyPDF2
-
-
-def extract_text_from_pdf(file_content: bytes) -> str:
-    """Extract text from PDF file"""
-    pdf_reader = PyPDF2.PdfReader(BytesIO(file_content))
-    text_content = []
-    for page in pdf_reader.pages:
-        text = page.extract_text()
-        if text:
-            text_content.append(text)
-    return '\n'.join(text_content)
-
-
-def extract_text_from_docx(file_content: bytes) -> str:
-    """Extract text from Word document"""
-    doc = docx.Document(BytesIO(file_content))
-    text_content = []
-    
-    # Extract text from paragraphs
-    for paragraph in doc.paragraphs:
-        if paragraph.text.strip():
-            text_content.append(paragraph.text.strip())
-    
-    # Extract text from tables
-    # Handle cells with multiple lines (courses stacked in same cell)
-    for table in doc.tables:
-        for row in table.rows:
-            cells = [cell.text.strip() for cell in row.cells]
-            
-            # Check if any cell has newlines (multiple items stacked)
-            max_lines = max(len(c.split('\n')) for c in cells) if cells else 1
-            
-            if max_lines > 1:
-                # Split each cell by newlines and combine corresponding lines
-                split_cells = [c.split('\n') for c in cells]
-                for line_idx in range(max_lines):
-                    line_parts = []
-                    for cell_lines in split_cells:
-                        if line_idx < len(cell_lines):
-                            line_parts.append(cell_lines[line_idx].strip())
-                        else:
-                            line_parts.append('')
-                    combined = ' '.join(p for p in line_parts if p)
-                    if combined:
-                        text_content.append(combined)
-            else:
-                # Single line per cell - join normally
-                row_text = ' '.join(c for c in cells if c)
-                if row_text:
-                    text_content.append(row_text)
-    
-    return '\n'.join(text_content)
+from document_model import DocumentModel, load_document
+from uploads import UploadSource
+from course_index import CourseIndex
+from credit_load import plan_credits
+from metrics import span
+from extraction_rules import (
+    ExtractionRules, DEFAULT_RULES, TOTAL_PATTERN, TOTAL_LINE_CREDITS_PATTERN,
+    CREDITS_NUMBER_PATTERN, PREREQUISITE_PATTERN,
+    PROGRAM_CODE_PATTERN, PROGRAM_CODE_FALLBACK_PATTERN,
+    PROGRAM_TITLE_PATTERN, PROGRAM_TITLE_FALLBACK_PATTERN,
+    TOTAL_CREDITS_PATTERN, TOTAL_CREDITS_FALLBACK_PATTERN,
+    STUDY_YEARS_PATTERN, MAX_STUDY_YEARS_PATTERN,
+)
+
+# Part of every fast-path parse cache key (memory and PARSE_CACHE_DIR tiers).
+# Bump it in the same commit as any change to this module, document_model.py,
+# docx_stream.py, pdf_pages.py or the default rules that can change the courses
+# or program info extracted from a document; otherwise cached results from the
+# old extractor keep being served. Faculty rule files are covered by the rules
+# fingerprint and graph changes by GRAPH_VERSION, so they need no bump here.
+EXTRACTOR_VERSION = "3"
 
 
-def extract_prerequisites_from_docx(file_content: bytes) -> dict:
+def iter_prerequisite_lines(paras: List[str], rules: ExtractionRules = DEFAULT_RULES) -> Iterator[Tuple[int, int, str]]:
     """
-    Extract prerequisite mappings from Word document paragraphs.
-    Returns dict: {course_code: prerequisite_string}
-    Pattern: Course line followed by "Prerequisite: ..." line
+    Find "Prerequisite: ..." lines and the course line they belong to
+    Yields (course_line_index, prerequisite_line_index, course_code)
     """
-    doc = docx.Document(BytesIO(file_content))
-    prerequisites = {}
-    
-    paras = [p.text.strip() for p in doc.paragraphs]
-    
     for i, para in enumerate(paras):
         # Check if this line is a prerequisite line
         if para.lower().startswith('prerequisite'):
@@ -83,161 +43,217 @@ def extract_prerequisites_from_docx(file_content: bytes) -> dict:
                     continue
                 # Try to extract course code from previous line
                 # Pattern: "CSX 3002 Object-Oriented Concepts and Programming \t3 (3-0-6) credits"
-                course_match = re.match(r'^([A-Z]{2,4}\s*\d{4})', prev_para)
-                if course_match:
-                    course_code = course_match.group(1).replace(' ', '')
-                    # Extract prerequisite content after "Prerequisite:" or "Prerequisites:"
-                    prereq_match = re.match(r'Prerequisites?:\s*(.+)', para, re.IGNORECASE)
-                    if prereq_match:
-                        prereq_text = prereq_match.group(1).strip()
-                        prerequisites[course_code] = prereq_text
+                course_code = rules.match_code_start(prev_para)
+                if course_code:
+                    yield j, i, course_code
                     break
+
+
+def extract_prerequisites_from_paragraphs(paras: List[str], rules: ExtractionRules = DEFAULT_RULES) -> dict:
+    """
+    Extract prerequisite mappings from Word document paragraphs.
+    Returns dict: {course_code: prerequisite_string}
+    Pattern: Course line followed by "Prerequisite: ..." line
+    """
+    prerequisites = {}
+    
+    for _, i, course_code in iter_prerequisite_lines(paras, rules):
+        # Extract prerequisite content after "Prerequisite:" or "Prerequisites:"
+        prereq_match = PREREQUISITE_PATTERN.match(paras[i])
+        if prereq_match:
+            prerequisites[course_code] = prereq_match.group(1).strip()
     
     return prerequisites
 
 
-def extract_credits_number(credits_str: str) -> int:
+def extract_credits_number(credits_str: str, default: int = 3) -> int:
     """Extract credits number from string like '3 (3-0-6)'"""
-    match = re.search(r"^(\d+)", credits_str)
+    match = CREDITS_NUMBER_PATTERN.search(credits_str)
     if match:
         return int(match.group(1))
-    return 3  # default
+    return default
 
 
-def extract_semester_courses(text: str, year: int, semester: int) -> List[Tuple[str, str, int]]:
+def extract_course_line(line: str, next_line: str,
+                        rules: ExtractionRules = DEFAULT_RULES) -> List[Tuple[str, str, int, str]]:
     """
-    Extract courses for a specific year/semester
-    Returns list of (code, title, credits) tuples
+    Extract the courses listed on one study plan table line
+    Returns list of (code, title, credits, or_flag) tuples
     """
-    header_pattern = rf"Year\s*{year}[\s,]*Semester\s*{semester}"
+    line_stripped = line.strip()
     
-    if not text:
-        return []
+    # Handle electives first (before other patterns), e.g. "Two Major Elective Courses"
+    elective = rules.match_elective(line)
+    if elective:
+        phrase, count = elective
+        return [("", f"{phrase} Course", rules.default_credits, "")] * (count or 0)
+    
+    # Find ALL courses on this line: CODE TITLE CREDITS pattern
+    # Pattern matches: "CSX 3001 Fundamentals of Computer Programming 3 (3-0-6)"
+    # Also handle "or CODE TITLE CREDITS" pattern
+    
+    # Check if line starts with "or" (case insensitive)
+    is_or_course = line_stripped.lower().startswith('or ')
+    search_line = line_stripped[3:].strip() if is_or_course else line_stripped
     
-    header_match = re.search(header_pattern, text, re.IGNORECASE)
-    if not header_match:
-        return []
+    # Also handle "CODE or CODE" pattern within line
+    has_or_in_line = ' or ' in line_stripped.lower()
+    
+    # Check if NEXT line starts with "or" - means current line is start of OR group
+    next_line_starts_with_or = next_line.strip().lower().startswith('or ')
     
-    lines = text[header_match.start():].split('\n')
     data_rows = []
-    found_table = False
+    for i, (code, title, credits_text) in enumerate(rules.iter_course_entries(search_line)):
+        credits = extract_credits_number(credits_text, rules.default_credits)
+        # Mark as "or" if:
+        # 1. Line started with "or"
+        # 2. Multiple courses with "or" between them (not first one)
+        # 3. Next line starts with "or" (this is first in OR group)
+        # 4. Has "or" in line (all courses in that line are OR alternatives)
+        or_flag = "or" if (is_or_course or (has_or_in_line and i > 0) or next_line_starts_with_or or has_or_in_line) else ""
+        data_rows.append((code, title, credits, or_flag))
     
+    return data_rows
+
+
+def find_semester_headers(text: str, rules: ExtractionRules = DEFAULT_RULES) -> Dict[int, Tuple[int, int, int]]:
+    """
+    Locate Year/Semester headers in one pass over the text
+    Headers may span a line break, so they are matched on the whole text and
+    attached to the line they start on
+    Returns {line_index: (start_offset, year, semester)} for the first header on each line
+    """
+    headers = {}
+    line_index = 0
+    line_end = text.find('\n')
+    for header in rules.iter_headers(text):
+        while line_end != -1 and header[0] > line_end:
+            line_index += 1
+            line_end = text.find('\n', line_end + 1)
+        headers.setdefault(line_index, header)
+    return headers
+
+
+class SemesterBlock:
+    """Courses extracted for one Year/Semester block plus how well the block parsed"""
+
+    def __init__(self, year: int, semester: int):
+        self.year = year
+        self.semester = semester
+        self.rows: List[Tuple[str, str, int, str]] = []
+        self.total_credits: Optional[int] = None  # from the block's Total line
+        self.unmatched_lines = 0  # table lines that produced no course
+
+    @property
+    def extracted_credits(self) -> int:
+        """Credits a student takes: a run of OR alternatives counts once"""
+        return plan_credits((credits, or_flag == "or") for _, _, credits, or_flag in self.rows)
+
+    def confidence(self) -> float:
+        """
+        1.0 when the block parsed cleanly; lowered for empty blocks, credit sums
+        that disagree with the Total line and table lines nothing matched
+        """
+        if not self.rows:
+            return 0.0
+        score = 1.0
+        if self.total_credits is not None and self.extracted_credits != self.total_credits:
+            score *= 0.3
+        return score / (1 + self.unmatched_lines)
+
+
+def iter_semester_blocks(text: str, rules: ExtractionRules = DEFAULT_RULES) -> Iterator[SemesterBlock]:
+    """
+    Split the study plan into Year/Semester blocks in a single pass over the text
+    Handles any number of years and semesters, including summer sessions
+    Yields each block as soon as it is closed (Total line, next header or end of text).
+    A semester whose first block came out empty may be yielded again if a later
+    header for it produces courses; the later block supersedes the earlier one
+    """
+    if not text:
+        return
     
-    # For multi-line format parsing
-    pending_codes = []
-    pending_titles = []
-    pending_credits = []
+    headers = find_semester_headers(text, rules)
     
+    lines = text.split('\n')
+    line_starts = []
+    offset = 0
     for line in lines:
-        line_stripped = line.strip()
+        line_starts.append(offset)
+        offset += len(line) + 1
+    
+    completed = set()  # semesters that already produced courses
+    current = None  # block being read
+    found_table = False
+    
+    for idx, line in enumerate(lines):
+        header = headers.get(idx)
+        if header:
+            start, year, semester = header
+            key = (year, semester)
+            if current is not None:
+                yield current
+                if current.rows:
+                    completed.add((current.year, current.semester))
+                current = None
+            # A repeated header only reopens a semester that produced no courses
+            # (e.g. the first mention was in narrative text, not the plan table)
+            if key in completed:
+                continue
+            current = SemesterBlock(year, semester)
+            found_table = False
+            line = line[start - line_starts[idx]:]
         
+        if current is None:
+            continue
         
         # Stop at Total line
-        if re.search(r"Total", line, re.IGNORECASE):
-            break
+        if TOTAL_PATTERN.search(line):
+            total_match = TOTAL_LINE_CREDITS_PATTERN.search(line)
+            if total_match and found_table:
+                current.total_credits = int(total_match.group(1))
+            yield current
+            if current.rows:
+                completed.add((current.year, current.semester))
+            current = None
+            continue
         
         # Look for table header
-        if "Course Code" in line and "Course Title" in line and "Credits" in line:
+        if rules.is_table_header(line):
             found_table = True
             continue
         
         if not found_table:
             continue
         
-        # Handle Major Elective first (before other patterns)
-        if "Major Elective" in line:
-            elective_match = re.search(
-                r"(One|Two|Three|Four|Five|Six|Seven|Eight|Nine|Ten|\d+)\s+Major Elective", 
-                line, re.IGNORECASE
-            )
-            if elective_match:
-                word_to_num = {
-                    'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5,
-                    'six': 6, 'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10
-                }
-                num_str = elective_match.group(1).lower()
-                try:
-                    num = int(num_str)
-                except ValueError:
-                    num = word_to_num.get(num_str, 1)
-                for _ in range(num):
-                    data_rows.append(("", "Major Elective Course", 3, ""))
-            continue
-        
-        # Handle Free Elective
-        if "Free Elective" in line:
-            elective_match = re.search(
-                r"(One|Two|Three|Four|Five|Six|Seven|Eight|Nine|Ten|\d+)\s+Free Elective", 
-                line, re.IGNORECASE
-            )
-            if elective_match:
-                word_to_num = {
-                    'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5,
-                    'six': 6, 'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10
-                }
-                num_str = elective_match.group(1).lower()
-                try:
-                    num = int(num_str)
-                except ValueError:
-                    num = word_to_num.get(num_str, 1)
-                for _ in range(num):
-                    data_rows.append(("", "Free Elective Course", 3, ""))
-            continue
-        
-        # Find ALL courses on this line: CODE TITLE CREDITS pattern
-        # Pattern matches: "CSX 3001 Fundamentals of Computer Programming 3 (3-0-6)"
-        # Also handle "or CODE TITLE CREDITS" pattern
-        
-        # Check if line starts with "or" (case insensitive)
-        is_or_course = line_stripped.lower().startswith('or ')
-        search_line = line_stripped[3:].strip() if is_or_course else line_stripped
-        
-        # Also handle "CODE or CODE" pattern within line
-        has_or_in_line = ' or ' in line_stripped.lower()
-        
-        # Check if NEXT line starts with "or" - means current line is start of OR group
-        current_line_idx = lines.index(line) if line in lines else -1
-        next_line_starts_with_or = False
-        if current_line_idx >= 0 and current_line_idx + 1 < len(lines):
-            next_line = lines[current_line_idx + 1].strip().lower()
-            next_line_starts_with_or = next_line.startswith('or ')
-        
-        all_courses = re.findall(r"([A-Z]{2,4}\s*\d{4})\s+([^0-9]+?)\s+(\d+\s*\([\d\-]+\))", search_line)
-        if all_courses:
-            for i, course_match in enumerate(all_courses):
-                # Remove spaces from course code to match AI extraction format
-                code = course_match[0].strip().replace(" ", "")
-                title = course_match[1].strip()
-                credits = extract_credits_number(course_match[2].strip())
-                # Mark as "or" if:
-                # 1. Line started with "or"
-                # 2. Multiple courses with "or" between them (not first one)
-                # 3. Next line starts with "or" (this is first in OR group)
-                # 4. Has "or" in line (all courses in that line are OR alternatives)
-                or_flag = "or" if (is_or_course or (has_or_in_line and i > 0) or next_line_starts_with_or or has_or_in_line) else ""
-                data_rows.append((code, title, credits, or_flag))
-            continue
+        next_line = lines[idx + 1] if idx + 1 < len(lines) else ''
+        rows = extract_course_line(line, next_line, rules)
+        if rows:
+            current.rows.extend(rows)
+        elif line.strip() and not rules.match_elective(line):
+            current.unmatched_lines += 1
     
-    return data_rows
+    if current is not None:
+        yield current
 
 
 def extract_program_info(text: str) -> ProgramInfo:
     """Extract program info from document text"""
     # Try to find program code pattern
     # Pattern: "Code" followed by number like "25330741100188"
-    code_match = re.search(r"Code\s+(\d{10,})", text, re.IGNORECASE)
+    code_match = PROGRAM_CODE_PATTERN.search(text)
     if not code_match:
-        code_match = re.search(r"Program\s*Code[:\s]*([A-Z0-9\-]+)", text, re.IGNORECASE)
+        code_match = PROGRAM_CODE_FALLBACK_PATTERN.search(text)
     program_code = code_match.group(1) if code_match else "UNKNOWN"
     
     # Try to find program title
     # Pattern: "Program" followed by title like "Bachelor of Science Program in Computer Science (International Program)"
-    title_match = re.search(r"Program\s+(Bachelor[^\n]+(?:\([^)]+\))?)", text, re.IGNORECASE)
+    title_match = PROGRAM_TITLE_PATTERN.search(text)
     if title_match:
         program_title = title_match.group(1).strip()
     else:
         # Fallback: Look for "Bachelor of Science Program in" pattern
-        title_match = re.search(r"(Bachelor\s+of\s+\w+\s+Program\s+in[^\n]+(?:\([^)]+\))?)", text, re.IGNORECASE)
+        title_match = PROGRAM_TITLE_FALLBACK_PATTERN.search(text)
         if title_match:
             program_title = title_match.group(1).strip()
         else:
@@ -247,10 +263,10 @@ def extract_program_info(text: str) -> ProgramInfo:
     program_title = ' '.join(program_title.split())
     
     # Try to find total credits
-    credits_match = re.search(r"Total\s*(?:Credits?|หน่วยกิต)[:\s]*(\d+)", text, re.IGNORECASE)
+    credits_match = TOTAL_CREDITS_PATTERN.search(text)
     if not credits_match:
         # Try pattern like "132 Credits" or just count from structure
-        credits_match = re.search(r"(\d{2,3})\s*Credits?", text, re.IGNORECASE)
+        credits_match = TOTAL_CREDITS_FALLBACK_PATTERN.search(text)
     total_credits = int(credits_match.group(1)) if credits_match else 132
     
     return ProgramInfo(
@@ -260,84 +276,138 @@ def extract_program_info(text: str) -> ProgramInfo:
     )
 
 
-def fast_extract_study_plan(file_content: bytes, filename: str) -> ParseResponse:
+def extract_study_years(text: str) -> Optional[int]:
+    """Normal program duration in years, if the document states it"""
+    years_match = STUDY_YEARS_PATTERN.search(text)
+    if years_match:
+        return int(years_match.group(1))
+    max_match = MAX_STUDY_YEARS_PATTERN.search(text)
+    if max_match and int(max_match.group(1)) >= 2:
+        return int(max_match.group(1)) // 2
+    return None
+
+
+def expected_semesters(found: Iterable[Tuple[int, int]], study_years: Optional[int] = None,
+                       rules: ExtractionRules = DEFAULT_RULES) -> List[Tuple[int, int]]:
+    """
+    The (year, semester) grid a plan with these blocks should have: every regular
+    semester of each year up to the program duration (or the last year found),
+    plus the summer sessions that were found
+    """
+    found = set(found)
+    last_year = max([year for year, _ in found] + [study_years or 0])
+    expected = {
+        (year, semester)
+        for year in range(1, last_year + 1)
+        for semester in range(1, rules.summer_semester)
+    }
+    return sorted(expected | found)
+
+
+def fast_extract_study_plan(source: UploadSource, filename: str,
+                            document: Optional[DocumentModel] = None,
+                            rules: ExtractionRules = DEFAULT_RULES,
+                            index: Optional[CourseIndex] = None) -> ParseResponse:
     """
     Fast extraction without AI - uses regex patterns
     Returns ParseResponse in the same format as Gemini extraction
+    Pass an already built document to avoid opening the file again, and an
+    empty CourseIndex to get it back filled with the plan's courses
     """
-    # Extract text based on file type
-    if filename.lower().endswith('.docx'):
-        text = extract_text_from_docx(file_content)
-        # Also extract prerequisites from DOCX
-        prereq_map = extract_prerequisites_from_docx(file_content)
-    else:
-        text = extract_text_from_pdf(file_content)
+    parse_response, _ = fast_extract_with_confidence(source, filename, document, rules, index)
+    return parse_response
+
+
+def fast_extract_with_confidence(source: UploadSource, filename: str,
+                                 document: Optional[DocumentModel] = None,
+                                 rules: ExtractionRules = DEFAULT_RULES,
+                                 index: Optional[CourseIndex] = None
+                                 ) -> Tuple[ParseResponse, Dict[Tuple[int, int], float]]:
+    """
+    Fast extraction that also scores each Year/Semester block
+    Returns (parse_response, {(year, semester): confidence between 0 and 1})
+    """
+    if document is None:
+        document = load_document(source, filename, rules)
+    
+    program_info = None
+    semester_blocks: Dict[Tuple[int, int], SemesterBlock] = {}
+    semester_courses: Dict[Tuple[int, int], List[Course]] = {}
+    
+    with span("extract"):
+        for event in iter_study_plan(document, rules):
+            if event[0] == "program_info":
+                program_info = event[1]
+            else:
+                _, block, courses = event
+                key = (block.year, block.semester)
+                semester_blocks[key] = block
+                semester_courses[key] = courses
+        
+        confidence = {key: block.confidence() for key, block in semester_blocks.items()}
+        
+        return assemble_study_plan(program_info, semester_courses, rules, index), confidence
+
+
+def iter_study_plan(document: DocumentModel, rules: ExtractionRules = DEFAULT_RULES) -> Iterator[tuple]:
+    """
+    Fast extraction as a stream of events:
+    ("program_info", ProgramInfo) first, then ("semester", SemesterBlock, [Course, ...])
+    for each block as the segmenter closes it. Course prerequisites are not yet
+    filtered against the plan, see assemble_study_plan
+    """
+    text = document.fast_text
+    if document.is_pdf:
         prereq_map = {}  # PDF prerequisite extraction not implemented yet
+    else:
+        # Prerequisites come from the same paragraphs, no second DOCX parse
+        prereq_map = extract_prerequisites_from_paragraphs(document.paragraphs, rules)
     
     if not text.strip():
         raise ValueError("Could not extract text from the uploaded file")
     
     # Extract program info
-    program_info = extract_program_info(text)
-    
-    # Extract courses for all year/semester pairs
-    year_sem_pairs = [
-        (1, 1), (1, 2), (2, 1), (2, 2),
-        (3, 1), (3, 2), (4, 1), (4, 2)
-    ]
+    yield "program_info", extract_program_info(text)
     
-    courses: List[Course] = []
-    
-    for year, semester in year_sem_pairs:
-        semester_courses = extract_semester_courses(text, year, semester)
-        
-        for course_data in semester_courses:
-            # Unpack tuple (code, title, credits, or_flag)
-            code = course_data[0]
-            title = course_data[1]
-            credits = course_data[2]
-            or_flag = course_data[3] if len(course_data) > 3 else ""
-            
-            # Determine course type
-            if "Major Elective" in title:
-                course_type = "major_elective"
-            elif "Free Elective" in title:
-                course_type = "free_elective"
-            else:
-                course_type = "course"
-            
-            # Get prerequisite for this course (normalize code without space)
-            code_normalized = code.replace(' ', '') if code else ''
-            prereq = prereq_map.get(code_normalized, '')
-            
-            course = Course(
-                year=year,
-                semester=semester,
+    # Split the text into Year/Semester blocks once
+    for block in iter_semester_blocks(text, rules):
+        courses = [
+            Course(
+                year=block.year,
+                semester=block.semester,
                 course_code=code,
                 course_title=title,
                 credits=credits,
-                prerequisite=prereq,
+                prerequisite=prereq_map.get(code, '') if code else '',
                 or_flag=or_flag
             )
-            courses.append(course)
+            for code, title, credits, or_flag in block.rows
+        ]
+        yield "semester", block, courses
+
+
+def assemble_study_plan(program_info: ProgramInfo, semester_courses: Dict[Tuple[int, int], List[Course]],
+                        rules: ExtractionRules = DEFAULT_RULES,
+                        index: Optional[CourseIndex] = None) -> ParseResponse:
+    """
+    Order the semesters and filter prerequisites to courses that exist in the plan
+    A given (empty) index is filled with the plan's courses, so finalize_parse can reuse it
+    """
+    courses: List[Course] = []
+    for key in sorted(semester_courses):
+        courses.extend(semester_courses[key])
+    
+    if index is None:
+        index = CourseIndex(rules=rules)
+    index.add_courses(courses)
     
     # Filter prerequisites to only include courses that exist in the plan
-    valid_codes = {c.course_code.replace(' ', '') for c in courses if c.course_code}
     for course in courses:
         if course.prerequisite:
-            # Extract course codes from prerequisite string
-            prereq_codes = re.findall(r'([A-Z]{2,4}\s*\d{4})', course.prerequisite)
-            valid_prereqs = []
-            for prereq_code in prereq_codes:
-                prereq_normalized = prereq_code.replace(' ', '')
-                if prereq_normalized in valid_codes:
-                    # Use normalized code (no spaces) to match AI format
-                    valid_prereqs.append(prereq_normalized)
+            # Extract course codes from prerequisite string (normalized, no spaces, to match AI format)
+            valid_prereqs = [code for code in rules.find_codes(course.prerequisite) if code in index]
             # Update prerequisite to only include valid courses
-            if valid_prereqs:
-                course.prerequisite = ', '.join(valid_prereqs)
-            else:
-                course.prerequisite = ''
+            course.prerequisite = ', '.join(valid_prereqs)
     
     return ParseResponse(
         program_info=program_info,
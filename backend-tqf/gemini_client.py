@@ -1,52 +1,17 @@
 import os
 import json
-from typing import Dict, Any
+import random
+import asyncio
+from typing import Dict, Any, List, Optional
+import httpx
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 from models import ParseResponse, ProgramInfo, Course
+from llm_cache import create_llm_cache, make_llm_cache_key, prompt_fingerprint
 
+MODEL_NAME = 'models/gemini-pro-latest'
 
-class GeminiClient:
-    def __init__(self):
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY environment variable is required")
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('models/gemini-pro-latest')
-
-    def extract_study_plan(self, document_text: str) -> ParseResponse:
-        """
-        Extract structured study plan data from document text using Gemini Pro
-        """
-        prompt = self._get_extraction_prompt()
-        full_prompt = f"{prompt}\n\nDocument Text:\n{document_text}"
-        
-        try:
-            response = self.model.generate_content(full_prompt)
-            response_text = response.text
-            
-            # Clean response text - remove any markdown formatting
-            if response_text.startswith("```json"):
-                response_text = response_text[7:]
-            if response_text.endswith("```"):
-                response_text = response_text[:-3]
-            response_text = response_text.strip()
-            
-            # Parse JSON response
-            data = json.loads(response_text)
-            
-            # Validate with Pydantic
-            return ParseResponse(**data)
-            
-        except json.JSONDecodeError as e:
-            raise ValueError(f"Failed to parse Gemini JSON response: {e}")
-        except Exception as e:
-            raise ValueError(f"Gemini API error: {e}")
-
-    def _get_extraction_prompt(self) -> str:
-        """
-        Returns the structured prompt for Gemini Pro extraction
-        """
-        return """
+EXTRACTION_PROMPT = """
 
 You are an expert academic data extractor. Extract the university study plan information from the provided document and return it as structured JSON.
 
@@ -107,3 +72,268 @@ Examples:
 - Major elective: {"year": 3, "semester": 1, "course_code": "", "course_title": "Major Elective", "credits": 3, "prerequisite": "", "or_flag": ""}
 - OR-choice course: {"year": 2, "semester": 2, "course_code": "GE1401", "course_title": "General Education", "credits": 3, "prerequisite": "", "or_flag": "or"}
 """
+
+# Part of the /parse and /parse-hybrid cache keys: the same model and prompt
+# fingerprint the LLM response cache uses, so editing either invalidates both
+EXTRACTOR_VERSION = prompt_fingerprint(EXTRACTION_PROMPT, MODEL_NAME)[:16]
+
+# HTTP status codes worth retrying
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class TransientGeminiError(Exception):
+    """A Gemini failure that may succeed when retried (rate limit, overload, network)"""
+
+
+class GeminiBusyError(Exception):
+    """Raised when no Gemini slot frees up before the queue timeout"""
+
+
+class SdkTransport:
+    """Calls Gemini through the google-generativeai SDK (reuses its channel across calls)"""
+
+    def __init__(self, model_name: str = MODEL_NAME):
+        self.model = genai.GenerativeModel(model_name)
+
+    async def generate(self, prompt: str, timeout: float) -> str:
+        try:
+            response = await self.model.generate_content_async(
+                prompt, request_options={"timeout": timeout}
+            )
+        except (google_exceptions.TooManyRequests, google_exceptions.ResourceExhausted,
+                google_exceptions.ServiceUnavailable, google_exceptions.InternalServerError,
+                google_exceptions.DeadlineExceeded) as e:
+            raise TransientGeminiError(str(e)) from e
+        return response.text
+
+    async def aclose(self) -> None:
+        pass
+
+
+class HttpTransport:
+    """
+    Calls the Gemini REST API over a pooled HTTP client.
+    Point GEMINI_BASE_URL at a local stub server for tests and load tests.
+    """
+
+    def __init__(self, api_key: str, model_name: str = MODEL_NAME,
+                 base_url: str = "https://generativelanguage.googleapis.com",
+                 max_connections: int = 10):
+        self.api_key = api_key
+        self.model_name = model_name
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+        return self._client
+
+    async def generate(self, prompt: str, timeout: float) -> str:
+        try:
+            response = await self._get_client().post(
+                f"/v1beta/{self.model_name}:generateContent",
+                params={"key": self.api_key},
+                json={"contents": [{"parts": [{"text": prompt}]}]},
+                timeout=timeout,
+            )
+        except httpx.TransportError as e:
+            raise TransientGeminiError(str(e)) from e
+
+        if response.status_code in RETRYABLE_STATUS_CODES:
+            raise TransientGeminiError(f"HTTP {response.status_code}: {response.text[:200]}")
+        response.raise_for_status()
+
+        data = response.json()
+        parts = data["candidates"][0]["content"]["parts"]
+        return "".join(part.get("text", "") for part in parts)
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def create_transport(api_key: str):
+    """Transport selected by GEMINI_TRANSPORT: sdk (default) or http"""
+    if os.getenv("GEMINI_TRANSPORT", "sdk").lower() == "http":
+        return HttpTransport(
+            api_key,
+            base_url=os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com"),
+            max_connections=int(os.getenv("GEMINI_MAX_CONCURRENCY", "4")),
+        )
+    return SdkTransport()
+
+
+def merge_parse_responses(responses: List[ParseResponse]) -> ParseResponse:
+    """Merge per-chunk results: first program info, de-duplicated courses in plan order"""
+    seen = set()
+    courses = []
+    for response in responses:
+        for course in response.courses:
+            key = (course.year, course.semester, course.course_code, course.course_title)
+            # Electives have no code and repeat legitimately within a chunk
+            if course.course_code and key in seen:
+                continue
+            seen.add(key)
+            courses.append(course)
+    courses.sort(key=lambda course: (course.year, course.semester))
+    return ParseResponse(program_info=responses[0].program_info, courses=courses)
+
+
+class GeminiClient:
+    def __init__(self, transport=None, cache=None):
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key and transport is None:
+            raise ValueError("GEMINI_API_KEY environment variable is required")
+        if api_key:
+            genai.configure(api_key=api_key)
+            self.model = genai.GenerativeModel(MODEL_NAME)
+        else:
+            self.model = None
+        self.transport = transport or create_transport(api_key)
+        # Responses keyed by normalized document text and prompt hash
+        self.cache = cache if cache is not None else create_llm_cache()
+
+        # Per-attempt and per-call deadlines, retry budget and concurrency limits for the async path
+        self.timeout = float(os.getenv("GEMINI_TIMEOUT", "120"))
+        self.deadline = float(os.getenv("GEMINI_DEADLINE", "180"))
+        self.max_retries = int(os.getenv("GEMINI_MAX_RETRIES", "2"))
+        self.backoff_base = float(os.getenv("GEMINI_BACKOFF_BASE", "1.0"))
+        self.backoff_max = float(os.getenv("GEMINI_BACKOFF_MAX", "10.0"))
+        self.queue_timeout = float(os.getenv("GEMINI_QUEUE_TIMEOUT", "30"))
+        self._semaphore = asyncio.Semaphore(int(os.getenv("GEMINI_MAX_CONCURRENCY", "4")))
+
+    def extract_study_plan(self, document_text: str) -> ParseResponse:
+        """
+        Extract structured study plan data from document text using Gemini Pro
+        Blocking variant, see extract_study_plan_async for the server path
+        """
+        if self.model is None:
+            raise ValueError("Blocking extraction needs GEMINI_API_KEY")
+        prompt = self._get_extraction_prompt()
+        cache_key = make_llm_cache_key(document_text, prompt, MODEL_NAME)
+        cached = self.cache.get(cache_key) if self.cache else None
+        if cached is not None:
+            return ParseResponse.model_validate_json(cached)
+        
+        full_prompt = f"{prompt}\n\nDocument Text:\n{document_text}"
+        
+        try:
+            response = self.model.generate_content(
+                full_prompt, request_options={"timeout": self.timeout}
+            )
+            parse_response = self._parse_response(response.text)
+            if self.cache:
+                self.cache.put(cache_key, parse_response.model_dump_json())
+            return parse_response
+            
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Failed to parse Gemini JSON response: {e}")
+        except Exception as e:
+            raise ValueError(f"Gemini API error: {e}")
+
+    async def extract_study_plan_async(self, document_text: str) -> ParseResponse:
+        """
+        Extract structured study plan data without blocking the event loop.
+        At most GEMINI_MAX_CONCURRENCY calls run at once; each attempt has a
+        deadline and transient failures are retried with jittered backoff, all
+        within one GEMINI_DEADLINE for the whole call (queueing included).
+        """
+        deadline = asyncio.get_running_loop().time() + self.deadline
+        prompt = self._get_extraction_prompt()
+        cache_key = make_llm_cache_key(document_text, prompt, MODEL_NAME)
+        if self.cache:
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached is not None:
+                return ParseResponse.model_validate_json(cached)
+
+        full_prompt = f"{prompt}\n\nDocument Text:\n{document_text}"
+
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), min(self.queue_timeout, self._remaining(deadline)))
+        except asyncio.TimeoutError:
+            raise GeminiBusyError("Too many Gemini requests in flight, try again later")
+
+        try:
+            response_text = await self._generate_with_retries(full_prompt, deadline)
+        finally:
+            self._semaphore.release()
+
+        try:
+            parse_response = self._parse_response(response_text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Failed to parse Gemini JSON response: {e}")
+        except Exception as e:
+            raise ValueError(f"Gemini API error: {e}")
+
+        if self.cache:
+            await asyncio.to_thread(self.cache.put, cache_key, parse_response.model_dump_json())
+        return parse_response
+
+    async def extract_study_plan_chunks(self, chunks: List[str]) -> ParseResponse:
+        """
+        Extract each chunk (e.g. one per study plan year) concurrently and merge
+        the results; concurrency is still bounded by the client's semaphore
+        """
+        if len(chunks) == 1:
+            return await self.extract_study_plan_async(chunks[0])
+        responses = await asyncio.gather(*(self.extract_study_plan_async(chunk) for chunk in chunks))
+        return merge_parse_responses(responses)
+
+    async def aclose(self) -> None:
+        """Release pooled connections"""
+        await self.transport.aclose()
+
+    @staticmethod
+    def _remaining(deadline: float) -> float:
+        return max(0.0, deadline - asyncio.get_running_loop().time())
+
+    async def _generate_with_retries(self, prompt: str, deadline: float) -> str:
+        for attempt in range(self.max_retries + 1):
+            timeout = min(self.timeout, self._remaining(deadline))
+            try:
+                return await asyncio.wait_for(
+                    self.transport.generate(prompt, timeout), timeout
+                )
+            except (TransientGeminiError, asyncio.TimeoutError) as e:
+                if attempt == self.max_retries:
+                    raise ValueError(f"Gemini API error after {attempt + 1} attempts: {str(e) or 'timed out'}")
+                # Full jitter keeps retries from bursting back in lockstep
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                if delay >= self._remaining(deadline):
+                    raise ValueError(
+                        f"Gemini API error, {self.deadline:.0f}s deadline spent after {attempt + 1} attempts: "
+                        f"{str(e) or 'timed out'}"
+                    )
+                print(f"Warning: transient Gemini error ({str(e) or 'timed out'}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+            except Exception as e:
+                raise ValueError(f"Gemini API error: {e}")
+
+    def _parse_response(self, response_text: str) -> ParseResponse:
+        # Clean response text - remove any markdown formatting
+        if response_text.startswith("```json"):
+            response_text = response_text[7:]
+        if response_text.endswith("```"):
+            response_text = response_text[:-3]
+        response_text = response_text.strip()
+        
+        # Parse JSON response
+        data = json.loads(response_text)
+        
+        # Validate with Pydantic
+        return ParseResponse(**data)
+
+    def _get_extraction_prompt(self) -> str:
+        """
+        Returns the structured prompt for Gemini Pro extraction
+        """
+        return EXTRACTION_PROMPT
@@ -0,0 +1,199 @@
+"""
+Study plan graph analysis
+Topological order, prerequisite cycles, per-course depth, the critical path,
+redundant prerequisite links and per-semester credit load, computed from a
+StudyPlanGraph so the front end does not have to traverse large plans itself.
+
+Node ids are mapped to integers and edges packed into CSR-style adjacency
+arrays (offsets + targets). Cycles are found with an iterative Tarjan pass,
+whose strongly connected components also give the topological order of the
+condensed graph, so everything but the transitive reduction is O(V + E). The
+reduction uses ancestor bitsets (Python ints), one word-parallel OR per edge.
+"""
+from typing import Dict, List, Tuple
+from models import StudyPlanGraph, StudyPlanEdge, StudyPlanAnalysis, SemesterLoad
+from credit_load import plan_credits
+
+
+def _edge_pairs(graph: StudyPlanGraph, node_index: Dict[str, int]) -> List[Tuple[int, int]]:
+    """(prerequisite, course) index pairs of every edge, branching edges expanded, duplicates dropped"""
+    pairs = []
+    seen = set()
+    for edge in graph.edges:
+        target = node_index.get(edge.to_id)
+        if target is None:
+            continue
+        for source_id in edge.sources or [edge.from_id]:
+            source = node_index.get(source_id)
+            if source is not None and (source, target) not in seen:
+                seen.add((source, target))
+                pairs.append((source, target))
+    return pairs
+
+
+def _adjacency(node_count: int, pairs: List[Tuple[int, int]], reverse: bool = False) -> Tuple[List[int], List[int]]:
+    """CSR adjacency: neighbours of node v are targets[offsets[v]:offsets[v + 1]]"""
+    offsets = [0] * (node_count + 1)
+    for source, target in pairs:
+        offsets[(target if reverse else source) + 1] += 1
+    for v in range(node_count):
+        offsets[v + 1] += offsets[v]
+    targets = [0] * len(pairs)
+    fill = offsets[:-1]
+    for source, target in pairs:
+        v, w = (target, source) if reverse else (source, target)
+        targets[fill[v]] = w
+        fill[v] += 1
+    return offsets, targets
+
+
+def _strongly_connected_components(node_count: int, offsets: List[int], targets: List[int]) -> List[List[int]]:
+    """Tarjan's algorithm without recursion; components come out in reverse topological order"""
+    index = [-1] * node_count
+    lowlink = [0] * node_count
+    on_stack = [False] * node_count
+    stack: List[int] = []
+    components: List[List[int]] = []
+    counter = 0
+
+    for root in range(node_count):
+        if index[root] != -1:
+            continue
+        work = [(root, offsets[root])]
+        index[root] = lowlink[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        while work:
+            v, position = work[-1]
+            if position < offsets[v + 1]:
+                work[-1] = (v, position + 1)
+                w = targets[position]
+                if index[w] == -1:
+                    index[w] = lowlink[w] = counter
+                    counter += 1
+                    stack.append(w)
+                    on_stack[w] = True
+                    work.append((w, offsets[w]))
+                elif on_stack[w]:
+                    lowlink[v] = min(lowlink[v], index[w])
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[v])
+            if lowlink[v] == index[v]:
+                component = []
+                while True:
+                    w = stack.pop()
+                    on_stack[w] = False
+                    component.append(w)
+                    if w == v:
+                        break
+                component.sort()
+                components.append(component)
+    return components
+
+
+def analyze_study_plan_graph(graph: StudyPlanGraph) -> StudyPlanAnalysis:
+    """
+    Analyse the prerequisite structure of a study plan graph
+    Members of a prerequisite cycle share one depth and are listed together in
+    the topological order; a cycle counts as one step of the critical path and
+    its edges are never reported as redundant
+    """
+    node_ids = [node.id for node in graph.nodes]
+    node_index = {node_id: i for i, node_id in enumerate(node_ids)}
+    node_count = len(node_ids)
+    pairs = _edge_pairs(graph, node_index)
+    succ_offsets, succ = _adjacency(node_count, pairs)
+    pred_offsets, pred = _adjacency(node_count, pairs, reverse=True)
+
+    # Components in topological order, prerequisites first
+    components = _strongly_connected_components(node_count, succ_offsets, succ)
+    components.reverse()
+    component_of = [0] * node_count
+    for c, members in enumerate(components):
+        for v in members:
+            component_of[v] = c
+
+    self_loops = {source for source, target in pairs if source == target}
+    cycles = [
+        [node_ids[v] for v in members]
+        for members in components
+        if len(members) > 1 or members[0] in self_loops
+    ]
+
+    # Longest prerequisite chain into each component, remembering the edge it came through
+    component_depth = [0] * len(components)
+    came_from: List[Tuple[int, int]] = [(-1, -1)] * len(components)  # (prerequisite node, node)
+    # Ancestor components of each component, as bitsets
+    ancestors = [0] * len(components)
+    for c, members in enumerate(components):
+        for v in members:
+            for position in range(pred_offsets[v], pred_offsets[v + 1]):
+                u = pred[position]
+                cu = component_of[u]
+                if cu == c:
+                    continue
+                if component_depth[cu] + 1 > component_depth[c]:
+                    component_depth[c] = component_depth[cu] + 1
+                    came_from[c] = (u, v)
+                ancestors[c] |= ancestors[cu] | (1 << cu)
+
+    critical_path: List[str] = []
+    if components:
+        c = max(range(len(components)), key=lambda k: component_depth[k])
+        node = components[c][0]
+        while came_from[c][0] != -1:
+            u, v = came_from[c]
+            critical_path.append(node_ids[v])
+            c = component_of[u]
+            node = u
+        critical_path.append(node_ids[node])
+        critical_path.reverse()
+
+    # u -> v is redundant when u is also an ancestor of another prerequisite of v
+    redundant = set()
+    for v in range(node_count):
+        cv = component_of[v]
+        via_other = 0
+        for position in range(pred_offsets[v], pred_offsets[v + 1]):
+            cu = component_of[pred[position]]
+            if cu != cv:
+                via_other |= ancestors[cu]
+        if not via_other:
+            continue
+        for position in range(pred_offsets[v], pred_offsets[v + 1]):
+            u = pred[position]
+            cu = component_of[u]
+            if cu != cv and via_other >> cu & 1:
+                redundant.add((node_ids[u], node_ids[v]))
+
+    reduced_edges = []
+    for edge in graph.edges:
+        kept = [source for source in edge.sources or [edge.from_id] if (source, edge.to_id) not in redundant]
+        if kept:
+            reduced_edges.append(StudyPlanEdge(
+                from_id=kept[0], to_id=edge.to_id, sources=kept if len(kept) > 1 else None
+            ))
+
+    # OR alternatives count once per group, as in the extractor's semester credit check
+    semester_items: Dict[Tuple[int, int], List[Tuple[int, bool]]] = {}
+    for node in graph.nodes:
+        semester_items.setdefault((node.year, node.semester), []).append((node.credits, node.or_group is not None))
+    semester_load = {
+        key: SemesterLoad(year=key[0], semester=key[1], credits=plan_credits(items), courses=len(items))
+        for key, items in semester_items.items()
+    }
+
+    return StudyPlanAnalysis(
+        topological_order=[node_ids[v] for members in components for v in members],
+        has_cycles=bool(cycles),
+        cycles=cycles,
+        depth={node_ids[v]: component_depth[component_of[v]] for v in range(node_count)},
+        critical_path=critical_path,
+        redundant_edges=[StudyPlanEdge(from_id=u, to_id=v) for u, v in sorted(redundant)],
+        reduced_edges=reduced_edges,
+        semester_load=[semester_load[key] for key in sorted(semester_load)],
+    )
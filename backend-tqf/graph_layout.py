@@ -0,0 +1,190 @@
+"""
+Layered (Sugiyama-style) layout for study plan graphs
+Semesters are the layers, so x stays the semester column. Within each column
+the node order is chosen to cut prerequisite edge crossings:
+
+1. Edges spanning several semesters are split by dummy nodes, one per column
+   they pass, so every edge joins adjacent columns
+2. Columns are reordered by barycenter sweeps (down, then up), each node or
+   OR-group block moving to the mean position of its neighbours in the
+   previous column; the order with the fewest crossings is kept
+3. Real nodes are stacked top to bottom in that order
+
+Runs once when the graph is built, so positions are stored with the session.
+"""
+import os
+from typing import Dict, List
+from models import StudyPlanNode, StudyPlanEdge
+
+# "layered" (default) or "grid" (input order, one row per course)
+GRAPH_LAYOUT = os.getenv("GRAPH_LAYOUT", "layered")
+
+LAYER_SPACING = 300  # horizontal spacing between semester columns
+NODE_SPACING = 150  # vertical spacing between nodes in a column
+
+# Down + up sweeps tried before keeping the best order found
+MAX_SWEEPS = 12
+
+
+def _count_crossings(upper_order: List[int], lower_order: List[int], lower_neighbours: Dict[int, List[int]]) -> int:
+    """Crossings between two adjacent columns, by counting inversions with a Fenwick tree"""
+    upper_position = {v: i for i, v in enumerate(upper_order)}
+    lower_position = {v: i for i, v in enumerate(lower_order)}
+    pairs = []
+    for v in lower_order:
+        for u in lower_neighbours.get(v, ()):
+            if u in upper_position:
+                pairs.append((upper_position[u], lower_position[v]))
+    pairs.sort()
+
+    size = len(lower_order)
+    tree = [0] * (size + 1)
+    crossings = 0
+    for seen, (_, position) in enumerate(pairs):
+        # Earlier edges ending below this one cross it
+        i = position + 1
+        not_below = 0
+        while i > 0:
+            not_below += tree[i]
+            i -= i & -i
+        crossings += seen - not_below
+        i = position + 1
+        while i <= size:
+            tree[i] += 1
+            i += i & -i
+    return crossings
+
+
+def _blocks(order: List[int], group_of: Dict[int, str]) -> List[List[int]]:
+    """Nodes of a column as blocks: OR-group members together (at the first member's place), others alone"""
+    blocks: List[List[int]] = []
+    group_block: Dict[str, List[int]] = {}
+    for v in order:
+        group = group_of.get(v)
+        if group is None:
+            blocks.append([v])
+        elif group in group_block:
+            group_block[group].append(v)
+        else:
+            group_block[group] = [v]
+            blocks.append(group_block[group])
+    return blocks
+
+
+def _reorder(order: List[int], reference_order: List[int], neighbours: Dict[int, List[int]],
+             group_of: Dict[int, str]) -> List[int]:
+    """Sort a column's blocks by the mean position of their neighbours in the reference column"""
+    reference_position = {v: i for i, v in enumerate(reference_order)}
+    own_position = {v: i for i, v in enumerate(order)}
+    scale = len(reference_order) / max(len(order), 1)
+
+    keyed = []
+    for block in _blocks(order, group_of):
+        positions = [
+            reference_position[u]
+            for v in block for u in neighbours.get(v, ()) if u in reference_position
+        ]
+        if positions:
+            barycenter = sum(positions) / len(positions)
+        else:
+            # No neighbours there: hold the block near its current place
+            barycenter = sum(own_position[v] for v in block) / len(block) * scale
+        keyed.append((barycenter, own_position[block[0]], block))
+    keyed.sort(key=lambda item: (item[0], item[1]))
+    return [v for _, _, block in keyed for v in block]
+
+
+def apply_layered_layout(nodes: List[StudyPlanNode], edges: List[StudyPlanEdge], semesters_per_year: int) -> None:
+    """Set position {x, y} of every node from a layered layout of the graph"""
+    node_index = {node.id: i for i, node in enumerate(nodes)}
+    layer_keys = sorted({(node.year - 1) * semesters_per_year + node.semester for node in nodes})
+    layer_of_key = {key: i for i, key in enumerate(layer_keys)}
+    layer_of = [layer_of_key[(node.year - 1) * semesters_per_year + node.semester] for node in nodes]
+
+    orders: List[List[int]] = [[] for _ in layer_keys]
+    for i in range(len(nodes)):
+        orders[layer_of[i]].append(i)
+    group_of = {i: node.or_group for i, node in enumerate(nodes) if node.or_group}
+
+    # Proper layering: long edges become chains through dummy nodes (ids after the real nodes)
+    up: Dict[int, List[int]] = {}  # neighbours in the previous column
+    down: Dict[int, List[int]] = {}  # neighbours in the next column
+    next_dummy = len(nodes)
+    seen = set()
+    for edge in edges:
+        target = node_index.get(edge.to_id)
+        for source_id in edge.sources or [edge.from_id]:
+            source = node_index.get(source_id)
+            if source is None or target is None or (source, target) in seen:
+                continue
+            seen.add((source, target))
+            first, last = sorted((source, target), key=lambda v: layer_of[v])
+            if layer_of[first] == layer_of[last]:
+                continue  # same semester: no crossings to avoid
+            previous = first
+            for layer in range(layer_of[first] + 1, layer_of[last] + 1):
+                if layer == layer_of[last]:
+                    current = last
+                else:
+                    current = next_dummy
+                    next_dummy += 1
+                    orders[layer].append(current)
+                down.setdefault(previous, []).append(current)
+                up.setdefault(current, []).append(previous)
+                previous = current
+
+    # OR-group members start out next to each other
+    orders = [[v for block in _blocks(order, group_of) for v in block] for order in orders]
+
+    def total_crossings() -> int:
+        return sum(_count_crossings(orders[i], orders[i + 1], up) for i in range(len(orders) - 1))
+
+    best = total_crossings()
+    best_orders = [list(order) for order in orders]
+    for _ in range(MAX_SWEEPS):
+        if not best:
+            break
+        for i in range(1, len(orders)):
+            orders[i] = _reorder(orders[i], orders[i - 1], up, group_of)
+        for i in range(len(orders) - 2, -1, -1):
+            orders[i] = _reorder(orders[i], orders[i + 1], down, group_of)
+        crossings = total_crossings()
+        if crossings >= best:
+            break
+        best = crossings
+        best_orders = [list(order) for order in orders]
+
+    for layer, order in enumerate(best_orders):
+        row = 0
+        for v in order:
+            if v < len(nodes):
+                nodes[v].position = {"x": layer_keys[layer] * LAYER_SPACING, "y": row * NODE_SPACING}
+                row += 1
+
+
+def relayout_column(column: List[StudyPlanNode], nodes: List[StudyPlanNode], edges: List[StudyPlanEdge]) -> None:
+    """
+    Re-order one semester column after an edit, leaving every other column in place:
+    blocks move to the mean height of their neighbours in other columns
+    """
+    column_ids = {node.id for node in column}
+    other_y = {node.id: node.position["y"] for node in nodes if node.id not in column_ids and node.position}
+    neighbour_y: Dict[int, List[float]] = {}
+    column_index = {node.id: i for i, node in enumerate(column)}
+    for edge in edges:
+        for source_id in edge.sources or [edge.from_id]:
+            if edge.to_id in column_index and source_id in other_y:
+                neighbour_y.setdefault(column_index[edge.to_id], []).append(other_y[source_id])
+            elif source_id in column_index and edge.to_id in other_y:
+                neighbour_y.setdefault(column_index[source_id], []).append(other_y[edge.to_id])
+
+    group_of = {i: node.or_group for i, node in enumerate(column) if node.or_group}
+    keyed = []
+    for block in _blocks(list(range(len(column))), group_of):
+        heights = [y for v in block for y in neighbour_y.get(v, ())]
+        barycenter = sum(heights) / len(heights) / NODE_SPACING if heights else sum(block) / len(block)
+        keyed.append((barycenter, block[0], block))
+    keyed.sort(key=lambda item: (item[0], item[1]))
+
+    for row, v in enumerate(v for _, _, block in keyed for v in block):
+        column[v].position = {"x": column[v].position["x"], "y": row * NODE_SPACING}
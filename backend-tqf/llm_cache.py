@@ -0,0 +1,141 @@
+"""
+Persistent cache for Gemini extraction results
+Keyed by a hash of the whitespace-normalized document text plus a hash of
+the prompt and model, so re-exported documents with the same text skip the
+LLM call and any prompt change invalidates old entries automatically.
+"""
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Optional
+
+
+def normalize_document_text(document_text: str) -> str:
+    """Collapse all whitespace runs so layout-only differences hash the same"""
+    return " ".join(document_text.split())
+
+
+def prompt_fingerprint(prompt: str, model_name: str) -> str:
+    """sha256 of the model name and prompt; changes whenever either does"""
+    return hashlib.sha256(f"{model_name}\0{prompt}".encode("utf-8")).hexdigest()
+
+
+def make_llm_cache_key(document_text: str, prompt: str, model_name: str) -> str:
+    """Cache key from the normalized document text and the prompt/model fingerprint"""
+    text_hash = hashlib.sha256(normalize_document_text(document_text).encode("utf-8")).hexdigest()
+    return f"{prompt_fingerprint(prompt, model_name)[:16]}:{text_hash}"
+
+
+class LlmResponseCache:
+    """SQLite-backed cache with TTL expiry and a total size budget"""
+
+    def __init__(self, path: str, ttl_seconds: float = 7 * 24 * 3600,
+                 max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " payload TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_created ON responses (created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached payload, or None if missing or expired"""
+        try:
+            payload = self._get(key)
+        except sqlite3.Error as e:
+            print(f"Warning: Gemini response cache read failed: {e}")
+            payload = None
+        with self._lock:
+            if payload is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return payload
+
+    def _get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            payload, created_at = row
+            if now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return payload
+
+    def put(self, key: str, payload: str) -> None:
+        """Store a payload, then drop expired and least recently used entries over budget"""
+        try:
+            self._put(key, payload)
+        except sqlite3.Error as e:
+            print(f"Warning: Gemini response cache write failed: {e}")
+
+    def _put(self, key: str, payload: str) -> None:
+        now = time.time()
+        size = len(payload.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, payload, size, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, payload, size, now, now)
+            )
+            self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                cursor = self._conn.execute("SELECT key, size FROM responses ORDER BY accessed_at")
+                evict = []
+                for old_key, old_size in cursor:
+                    if total <= self.max_bytes:
+                        break
+                    evict.append((old_key,))
+                    total -= old_size
+                self._conn.executemany("DELETE FROM responses WHERE key = ?", evict)
+            self._conn.commit()
+
+
+def create_llm_cache() -> Optional[LlmResponseCache]:
+    """
+    Cache configured from GEMINI_CACHE_PATH / GEMINI_CACHE_TTL / GEMINI_CACHE_MAX_BYTES.
+    An empty GEMINI_CACHE_PATH disables it.
+    """
+    path = os.getenv("GEMINI_CACHE_PATH")
+    if path is None:
+        path = os.path.join(tempfile.gettempdir(), "tqf_gemini_cache.sqlite3")
+    if not path:
+        return None
+    try:
+        return LlmResponseCache(
+            path,
+            ttl_seconds=float(os.getenv("GEMINI_CACHE_TTL", str(7 * 24 * 3600))),
+            max_bytes=int(os.getenv("GEMINI_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+        )
+    except sqlite3.Error as e:
+        print(f"Warning: Gemini response cache disabled: {e}")
+        return None
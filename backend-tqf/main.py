@@ -2,23 +2,42 @@ import os
 import tempfile
 import uuid
 import asyncio
-from typing import Dict, Any
-from datetime import datetime, timedelta
-from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks, Response
+import json
+import time
+import contextvars
+import weakref
+from typing import Dict, Any, List, Optional
+from fastapi import FastAPI, File, Form, Header, UploadFile, HTTPException, BackgroundTasks, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-import docx
-import PyPDF2
-from io import BytesIO
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
-from models import ParseResponse, ErrorResponse
-from gemini_client import GeminiClient
-from csv_utils import generate_csv, validate_and_clean_courses, generate_study_plan_graph
-from fast_extract import fast_extract_study_plan
+from models import ParseResponse, ErrorResponse, ProgramInfo, StudyPlanGraph, StudyPlanAnalysis, StudyPlanPatch
+from gemini_client import GeminiClient, GeminiBusyError, EXTRACTOR_VERSION as GEMINI_EXTRACTOR_VERSION
+from fast_extract import EXTRACTOR_VERSION as FAST_EXTRACTOR_VERSION
+from parse_cache import ParseCache, make_cache_key
+from session_store import SessionResourceCache, create_session_store
+from csv_utils import iter_csv_chunks
+from graph_analysis import analyze_study_plan_graph
+from plan_edits import apply_course_edits, PlanEditError
+from extraction_rules import get_rules
+from pipeline import (
+    create_extraction_pool, finalize_parse, prepare_gemini_input, run_fast_pipeline, iter_fast_parse_events,
+    prepare_hybrid_parse, merge_hybrid_results,
+    expand_zip_upload, BATCH_MAX_FILES, BATCH_MAX_FILE_BYTES, BATCH_MAX_ARCHIVE_BYTES,
+    GEMINI_SLIM_INPUT, GEMINI_CHUNK_BY_YEAR, HYBRID_MIN_CONFIDENCE, HYBRID_VERSION
+)
+from metrics import (
+    registry, request_seconds, span, record_spans, run_timed,
+    start_request_timings, end_request_timings
+)
+from prompt_slimming import report_token_counts
+from uploads import (
+    SpooledUpload, UploadTooLargeError, UnsupportedUploadError, receive_upload, upload_kind, UPLOAD_MAX_BYTES
+)
 
 app = FastAPI(title="Study Plan Extractor", version="1.0.0")
 
@@ -31,10 +50,76 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# In-memory storage for parsed data (in production, use Redis or database)
-parsed_data_storage: Dict[str, ParseResponse] = {}
-csv_storage: Dict[str, str] = {}
-session_timestamps: Dict[str, datetime] = {}
+# Single-document endpoints; requests that declare a body larger than the upload
+# limit (plus room for the multipart framing) are refused before it is read
+UPLOAD_ENDPOINTS = ("/parse", "/parse-fast", "/parse-fast/stream", "/parse-hybrid")
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """Fail fast on uploads whose Content-Length is already over UPLOAD_MAX_BYTES"""
+    if request.method == "POST" and request.url.path in UPLOAD_ENDPOINTS:
+        content_length = request.headers.get("content-length", "")
+        if content_length.isdigit() and int(content_length) > UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD_BYTES:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"File is larger than {UPLOAD_MAX_BYTES} bytes"}
+            )
+    return await call_next(request)
+
+
+# Stage timings reveal which pipeline work a request hit (caches, Gemini calls),
+# so the Server-Timing header is only sent when enabled, e.g. for development
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0") == "1"
+
+
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    """
+    Collect the request's stage spans into the /metrics histograms and, with
+    SERVER_TIMING=1, a Server-Timing header. Streaming responses only report the
+    spans that finished before their first byte; later ones still reach the histograms
+    """
+    timings, token = start_request_timings()
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        end_request_timings(token)
+    elapsed = time.perf_counter() - start
+    endpoint = getattr(request.scope.get("endpoint"), "__name__", "unmatched")
+    request_seconds.observe(elapsed, request.method, endpoint, str(response.status_code))
+    if SERVER_TIMING:
+        response.headers["Server-Timing"] = timings.server_timing(elapsed)
+    return response
+
+
+# Parsed sessions (SESSION_STORE=sqlite shares them between uvicorn workers)
+session_store = create_session_store()
+
+# Cache-Control for session resources. They carry strong ETags, so clients and
+# proxies may keep them and revalidate with If-None-Match (answered with 304)
+SESSION_CACHE_CONTROL = os.getenv("SESSION_CACHE_CONTROL", "private, no-cache")
+
+# CSV exports, built on the first /csv download of a session
+csv_cache = SessionResourceCache(max_bytes=int(os.getenv("CSV_CACHE_MAX_BYTES", str(16 * 1024 * 1024))))
+
+# Graph analyses (JSON), computed on the first /graph/{id}/analysis request
+analysis_cache = SessionResourceCache(max_bytes=int(os.getenv("ANALYSIS_CACHE_MAX_BYTES", str(16 * 1024 * 1024))))
+
+# One PATCH at a time per session within this process
+session_edit_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+# Cache of finished parse results keyed by upload bytes (optional disk tier survives restarts)
+parse_cache = ParseCache(
+    max_bytes=int(os.getenv("PARSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    cache_dir=os.getenv("PARSE_CACHE_DIR") or None,
+    max_disk_entries=int(os.getenv("PARSE_CACHE_MAX_DISK_ENTRIES", "1000")),
+)
+
+# Process pool for CPU-bound extraction, created on startup
+extraction_pool = None
 
 # Initialize Gemini client
 try:
@@ -46,79 +131,123 @@ except ValueError as e:
 
 async def cleanup_expired_sessions():
     """
-    Background task to clean up expired sessions (older than 1 hour)
+    Background task to clean up expired sessions (older than SESSION_TTL_SECONDS)
     """
     while True:
         try:
-            current_time = datetime.now()
-            expired_sessions = [
-                session_id for session_id, timestamp in session_timestamps.items()
-                if current_time - timestamp > timedelta(hours=1)
-            ]
-            
+            # Expiry is indexed, so only the expired sessions are touched
+            expired_sessions = await asyncio.to_thread(session_store.expire)
             for session_id in expired_sessions:
-                if session_id in parsed_data_storage:
-                    del parsed_data_storage[session_id]
-                if session_id in csv_storage:
-                    del csv_storage[session_id]
-                if session_id in session_timestamps:
-                    del session_timestamps[session_id]
-                    
+                csv_cache.discard(session_id)
+                analysis_cache.discard(session_id)
                 print(f"Cleaned up expired session: {session_id}")
             
         except Exception as e:
             print(f"Error during session cleanup: {e}")
         
-        # Run cleanup every 30 minutes
-        await asyncio.sleep(1800)
+        # Run cleanup every minute
+        await asyncio.sleep(60)
 
 
 @app.on_event("startup")
 async def startup_event():
-    """Start background cleanup task"""
+    """Start background cleanup task and the extraction pool"""
+    global extraction_pool
+    extraction_pool = create_extraction_pool()
     asyncio.create_task(cleanup_expired_sessions())
 
 
-def extract_text_from_docx(file_content: bytes) -> str:
-    """Extract text from DOCX file including both paragraphs and tables"""
-    doc = docx.Document(BytesIO(file_content))
-    text_parts = []
-    
-    # Extract paragraph text
-    for paragraph in doc.paragraphs:
-        if paragraph.text.strip():
-            text_parts.append(paragraph.text.strip())
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop extraction workers and close pooled Gemini connections"""
+    if extraction_pool:
+        extraction_pool.shutdown(wait=False, cancel_futures=True)
+    if gemini_client:
+        await gemini_client.aclose()
+    session_store.close()
+
+
+async def run_in_pool(func, *args):
+    """
+    Run a blocking pipeline stage in the extraction pool, off the event loop
+    The spans it records in the worker are added to the current request
+    """
+    loop = asyncio.get_running_loop()
+    result, spans = await loop.run_in_executor(extraction_pool, run_timed, func, *args)
+    record_spans(spans)
+    return result
+
+
+async def receive_document(file: UploadFile) -> SpooledUpload:
+    """
+    Spool an uploaded DOCX/PDF in chunks, rejecting it as soon as it is too
+    large (413) or its first bytes do not match its extension (400)
+    """
+    try:
+        with span("upload"):
+            return await receive_upload(file)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UnsupportedUploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def store_session(parse_response: ParseResponse) -> ParseResponse:
+    """Store a finished parse result under a new session id"""
+    session_id = str(uuid.uuid4())
     
-    # Extract table content with special formatting for year/semester headers
-    for table in doc.tables:
-        for row in table.rows:
-            row_text = []
-            for cell in row.cells:
-                if cell.text.strip():
-                    row_text.append(cell.text.strip())
-            
-            if row_text:
-                row_content = " | ".join(row_text)
-                
-                # Check if this is a year/semester header row
-                first_cell = row_text[0].lower() if row_text else ""
-                if any(pattern in first_cell for pattern in ['year', 'semester']):
-                    # Add special formatting for year/semester headers
-                    text_parts.append(f"\n=== {row_content} ===\n")
-                else:
-                    # Regular course row
-                    text_parts.append(row_content)
+    # Create response with session_id and store it
+    parse_response.session_id = session_id
+    with span("store"):
+        session_store.put(session_id, parse_response)
     
-    return "\n".join(text_parts)
+    return parse_response
+
+
+async def iter_in_thread(generator_func, *args):
+    """
+    Drive a blocking generator in the default thread pool and yield its items
+    on the event loop as they are produced
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    finished = object()
+
+    def worker():
+        try:
+            for item in generator_func(*args):
+                loop.call_soon_threadsafe(queue.put_nowait, (item, None))
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, (None, e))
+        loop.call_soon_threadsafe(queue.put_nowait, (finished, None))
+
+    # Run in a copy of this context so the generator's spans reach the current request
+    task = loop.run_in_executor(None, contextvars.copy_context().run, worker)
+    while True:
+        item, error = await queue.get()
+        if error is not None:
+            raise error
+        if item is finished:
+            break
+        yield item
+    await task
 
 
-def extract_text_from_pdf(file_content: bytes) -> str:
-    """Extract text from PDF file"""
-    pdf_reader = PyPDF2.PdfReader(BytesIO(file_content))
-    text = ""
-    for page in pdf_reader.pages:
-        text += page.extract_text() + "\n"
-    return text
+def format_stream_event(event: str, data: Any, stream_format: str) -> str:
+    """One streamed event as an NDJSON line or a Server-Sent Events message"""
+    if stream_format == "sse":
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return json.dumps({"event": event, "data": data}) + "\n"
+
+
+def cached_parse_events(parse_response: ParseResponse):
+    """Replay a cached result as the (event, data) pairs a fresh streaming parse emits"""
+    yield "program_info", parse_response.program_info.model_dump()
+    semesters: Dict[tuple, list] = {}
+    for course in parse_response.courses:
+        semesters.setdefault((course.year, course.semester), []).append(course.model_dump())
+    for (year, semester), courses in sorted(semesters.items()):
+        yield "semester", {"year": year, "semester": semester, "courses": courses}
 
 
 @app.get("/")
@@ -145,65 +274,80 @@ async def parse_document(file: UploadFile = File(...)):
             detail="Only DOCX and PDF files are supported"
         )
     
+    upload = await receive_document(file)
     try:
-        # Read file content
-        file_content = await file.read()
-        
-        # Extract text based on file type
-        if file.filename.lower().endswith('.docx'):
-            document_text = extract_text_from_docx(file_content)
-        else:
-            document_text = extract_text_from_pdf(file_content)
-        
-        if not document_text.strip():
-            raise HTTPException(
-                status_code=400,
-                detail="Could not extract text from the uploaded file"
-            )
-        
-        # Extract structured data using Gemini
-        print("DEBUG: Calling gemini_client.extract_study_plan...")
-        parse_response = gemini_client.extract_study_plan(document_text)
-        print("DEBUG: Gemini extraction completed")
-        
-        # Validate and clean courses
-        print("DEBUG: Validating and cleaning courses...")
-        parse_response.courses = validate_and_clean_courses(parse_response.courses)
-        print("DEBUG: Course validation completed")
-        
-        # Generate study plan graph
-        print("DEBUG: About to call generate_study_plan_graph...")
-        parse_response.graph = generate_study_plan_graph(parse_response.courses)
-        print("DEBUG: Graph generation completed")
-        
-        # Generate unique ID for this parsing session
-        session_id = str(uuid.uuid4())
-        
-        # Store parsed data with timestamp
-        parsed_data_storage[session_id] = parse_response
-        session_timestamps[session_id] = datetime.now()
-        
-        # Generate and store CSV
-        csv_content = generate_csv(parse_response.courses)
-        csv_storage[session_id] = csv_content
-        
-        # Create response with session_id
-        parse_response.session_id = session_id
+        # Identical bytes never reach Gemini twice, even when uploaded concurrently
+        cache_key = make_cache_key(
+            upload.digest, f"gemini:slim={GEMINI_SLIM_INPUT}:chunk={GEMINI_CHUNK_BY_YEAR}",
+            GEMINI_EXTRACTOR_VERSION
+        )
+        async with parse_cache.lock(cache_key):
+            cached = parse_cache.get(cache_key)
+            if cached:
+                return store_session(cached)
+            
+            # Extract text based on file type and cut it down to the study plan regions
+            document_text, chunks = await run_in_pool(prepare_gemini_input, upload.source, file.filename, upload.digest)
+            
+            if not document_text.strip():
+                raise HTTPException(
+                    status_code=400,
+                    detail="Could not extract text from the uploaded file"
+                )
+            report_token_counts(document_text, chunks)
+            
+            # Extract structured data using Gemini (async, bounded concurrency with retries)
+            with span("gemini"):
+                parse_response = await gemini_client.extract_study_plan_chunks(chunks)
+            
+            # Validate, build graph and CSV, then remember the finished result
+            parse_response = await run_in_pool(finalize_parse, parse_response)
+            parse_cache.put(cache_key, parse_response)
         
-        return parse_response
+        return store_session(parse_response)
         
+    except GeminiBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Failed to parse document: {str(e)}"
         )
+    finally:
+        upload.close()
+
+
+async def parse_fast_cached(upload: SpooledUpload, faculty: Optional[str] = None):
+    """
+    Fast extraction, validation and graph in a worker process, served from
+    the parse cache when the same upload was parsed before
+    Returns the parse result without a session
+    """
+    rules = get_rules(faculty)
+    
+    # The file type and rule set change what the extractor returns, so both are part of the key
+    extension = os.path.splitext(upload.filename.lower())[1]
+    cache_key = make_cache_key(upload.digest, f"fast{extension}:{rules.fingerprint}", FAST_EXTRACTOR_VERSION)
+    async with parse_cache.lock(cache_key):
+        cached = parse_cache.get(cache_key)
+        if cached:
+            return cached
+        
+        # Fast extraction using regex patterns, validation, graph and CSV in a worker process
+        parse_response = await run_in_pool(
+            run_fast_pipeline, upload.source, upload.filename, faculty, upload.digest
+        )
+        parse_cache.put(cache_key, parse_response)
+    
+    return parse_response
 
 
 @app.post("/parse-fast", response_model=ParseResponse)
-async def parse_document_fast(file: UploadFile = File(...)):
+async def parse_document_fast(file: UploadFile = File(...), faculty: Optional[str] = Form(None)):
     """
     Fast parse uploaded DOCX or PDF file using regex patterns (no AI)
     Much faster but does not extract prerequisites
+    An optional faculty selects its extraction rules (see extraction_rules.py)
     """
     # Validate file type
     if not file.filename.lower().endswith(('.docx', '.pdf')):
@@ -212,88 +356,458 @@ async def parse_document_fast(file: UploadFile = File(...)):
             detail="Only DOCX and PDF files are supported"
         )
     
+    upload = await receive_document(file)
     try:
-        # Read file content
-        file_content = await file.read()
-        
-        # Fast extraction using regex patterns
-        print("DEBUG: Starting fast extraction (no AI)...")
-        parse_response = fast_extract_study_plan(file_content, file.filename)
-        print(f"DEBUG: Fast extraction completed - found {len(parse_response.courses)} courses")
-        
-        # Validate and clean courses
-        print("DEBUG: Validating and cleaning courses...")
-        parse_response.courses = validate_and_clean_courses(parse_response.courses)
-        print("DEBUG: Course validation completed")
-        
-        # Generate study plan graph
-        print("DEBUG: Generating study plan graph...")
-        parse_response.graph = generate_study_plan_graph(parse_response.courses)
-        print("DEBUG: Graph generation completed")
-        
-        # Generate unique ID for this parsing session
-        session_id = str(uuid.uuid4())
+        parse_response = await parse_fast_cached(upload, faculty)
+        return store_session(parse_response)
         
-        # Store parsed data with timestamp
-        parsed_data_storage[session_id] = parse_response
-        session_timestamps[session_id] = datetime.now()
-        
-        # Generate and store CSV
-        csv_content = generate_csv(parse_response.courses)
-        csv_storage[session_id] = csv_content
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to parse document: {str(e)}"
+        )
+    finally:
+        upload.close()
+
+
+@app.post("/parse-fast/stream")
+async def parse_document_fast_stream(file: UploadFile = File(...), faculty: Optional[str] = Form(None),
+                                     format: str = Form("ndjson")):
+    """
+    Streaming variant of /parse-fast for progressive rendering
+    Emits program_info, then each semester's courses as the segmenter finishes
+    them, then the graph, then the session id. format is "ndjson" (default) or "sse".
+    Failures after the stream has started are sent as an error event
+    """
+    rules = get_rules(faculty)
+    
+    # Validate file type
+    if not file.filename.lower().endswith(('.docx', '.pdf')):
+        raise HTTPException(
+            status_code=400,
+            detail="Only DOCX and PDF files are supported"
+        )
+    if format not in ("ndjson", "sse"):
+        raise HTTPException(
+            status_code=400,
+            detail="format must be 'ndjson' or 'sse'"
+        )
+    
+    upload = await receive_document(file)
+    filename = file.filename
+    extension = os.path.splitext(filename.lower())[1]
+    cache_key = make_cache_key(upload.digest, f"fast{extension}:{rules.fingerprint}", FAST_EXTRACTOR_VERSION)
+    
+    async def event_stream():
+        try:
+            async with parse_cache.lock(cache_key):
+                cached = parse_cache.get(cache_key)
+                if cached:
+                    parse_response = cached
+                    for event, data in cached_parse_events(parse_response):
+                        yield format_stream_event(event, data, format)
+                else:
+                    # Runs in a thread rather than the extraction pool so events can flow back as they are produced
+                    events = iter_in_thread(iter_fast_parse_events, upload.source, filename, faculty, upload.digest)
+                    async for event, data in events:
+                        if event == "done":
+                            parse_response = data
+                        else:
+                            yield format_stream_event(event, data, format)
+                    parse_cache.put(cache_key, parse_response)
+            
+            yield format_stream_event("graph", parse_response.graph.model_dump(), format)
+            store_session(parse_response)
+            yield format_stream_event("session", {"session_id": parse_response.session_id}, format)
+        except Exception as e:
+            yield format_stream_event("error", {"detail": f"Failed to parse document: {str(e)}"}, format)
+        finally:
+            upload.close()
+    
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(event_stream(), media_type=media_type)
+
+
+@app.post("/parse-batch")
+async def parse_document_batch(files: List[UploadFile] = File(...), faculty: Optional[str] = Form(None),
+                               format: str = Form("ndjson")):
+    """
+    Fast parse many DOCX/PDF files, or ZIP archives of them, in one request
+    Documents are extracted in parallel across the extraction pool and one result
+    event is streamed per document as it finishes, each with its own session id.
+    A document that fails produces an error event without failing the batch.
+    format is "ndjson" (default) or "sse"
+    """
+    if format not in ("ndjson", "sse"):
+        raise HTTPException(
+            status_code=400,
+            detail="format must be 'ndjson' or 'sse'"
+        )
+    
+    # (filename, upload, error) per document, ZIP archives expanded in place
+    documents = []
+    
+    def close_uploads():
+        for _, upload, _ in documents:
+            if upload is not None:
+                upload.close()
+    
+    try:
+        for file in files:
+            filename = file.filename
+            kind = upload_kind(filename or "")
+            if kind is None:
+                documents.append((filename, None, "Only DOCX, PDF and ZIP files are supported"))
+                continue
+            max_bytes = BATCH_MAX_ARCHIVE_BYTES if kind == "zip" else BATCH_MAX_FILE_BYTES
+            try:
+                with span("upload"):
+                    upload = await receive_upload(file, kind, max_bytes)
+            except ValueError as e:
+                documents.append((filename, None, str(e)))
+                continue
+            if kind != "zip":
+                documents.append((filename, upload, None))
+                continue
+            try:
+                documents.extend(await asyncio.to_thread(expand_zip_upload, upload.source))
+            except Exception as e:
+                documents.append((filename, None, f"Could not read ZIP archive: {str(e)}"))
+            finally:
+                upload.close()
         
-        # Create response with session_id
-        parse_response.session_id = session_id
+        if len(documents) > BATCH_MAX_FILES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"A batch can contain at most {BATCH_MAX_FILES} documents"
+            )
+    except BaseException:
+        close_uploads()
+        raise
+    
+    async def parse_one(index: int, filename: str, upload: Optional[SpooledUpload], error: Optional[str]):
+        if error:
+            return "error", {"index": index, "filename": filename, "detail": error}
+        try:
+            parse_response = await parse_fast_cached(upload, faculty)
+        except Exception as e:
+            return "error", {"index": index, "filename": filename, "detail": f"Failed to parse document: {str(e)}"}
+        finally:
+            upload.close()
+        store_session(parse_response)
+        return "result", {"index": index, "filename": filename, **parse_response.model_dump()}
+    
+    async def event_stream():
+        tasks = [
+            asyncio.ensure_future(parse_one(index, *document))
+            for index, document in enumerate(documents)
+        ]
+        succeeded = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                event, data = await next_done
+                if event == "result":
+                    succeeded += 1
+                yield format_stream_event(event, data, format)
+        finally:
+            # Client went away: do not keep parsing documents nobody will receive
+            for task in tasks:
+                task.cancel()
+            close_uploads()
+        yield format_stream_event("done", {
+            "total": len(documents),
+            "succeeded": succeeded,
+            "failed": len(documents) - succeeded
+        }, format)
+    
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(event_stream(), media_type=media_type)
+
+
+@app.post("/parse-hybrid", response_model=ParseResponse)
+async def parse_document_hybrid(file: UploadFile = File(...), faculty: Optional[str] = Form(None)):
+    """
+    Regex extraction first; Gemini is called only for semesters the regex pass
+    scores below HYBRID_MIN_CONFIDENCE and its courses replace those semesters.
+    Falls back to the regex result when Gemini is unavailable or fails
+    """
+    rules = get_rules(faculty)
+    
+    # Validate file type
+    if not file.filename.lower().endswith(('.docx', '.pdf')):
+        raise HTTPException(
+            status_code=400,
+            detail="Only DOCX and PDF files are supported"
+        )
+    
+    upload = await receive_document(file)
+    try:
+        extension = os.path.splitext(file.filename.lower())[1]
+        cache_key = make_cache_key(
+            upload.digest, f"hybrid{extension}:{rules.fingerprint}:{HYBRID_MIN_CONFIDENCE}:{HYBRID_VERSION}",
+            f"{FAST_EXTRACTOR_VERSION}/{GEMINI_EXTRACTOR_VERSION}"
+        )
+        async with parse_cache.lock(cache_key):
+            cached = parse_cache.get(cache_key)
+            if cached:
+                return store_session(cached)
+            
+            parse_response, weak_semesters, excerpt = await run_in_pool(
+                prepare_hybrid_parse, upload.source, file.filename, faculty, upload.digest
+            )
+            
+            # Only results that did not need a missing Gemini answer are cached
+            complete = True
+            if excerpt is not None:
+                if gemini_client:
+                    try:
+                        with span("gemini"):
+                            gemini_response = await gemini_client.extract_study_plan_async(excerpt)
+                        parse_response = merge_hybrid_results(parse_response, gemini_response, weak_semesters)
+                    except Exception as e:
+                        print(f"Warning: Gemini fallback failed, keeping regex result: {e}")
+                        complete = False
+                else:
+                    print("Warning: Gemini client not initialized, keeping regex result")
+                    complete = False
+            
+            parse_response = await run_in_pool(finalize_parse, parse_response, faculty)
+            if complete:
+                parse_cache.put(cache_key, parse_response)
         
-        return parse_response
+        return store_session(parse_response)
         
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Failed to parse document: {str(e)}"
         )
+    finally:
+        upload.close()
+
+
+def session_etag(session_id: str, resource: str, not_found: str) -> str:
+    """
+    Strong ETag of one resource of a session, derived from the content hash
+    computed when the session was stored. Raises 404 for unknown sessions
+    """
+    etag = session_store.get_etag(session_id)
+    if etag is None:
+        raise HTTPException(status_code=404, detail=not_found)
+    return f'"{etag}-{resource}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an ETag (weak comparison, as RFC 9110 asks for)"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def cache_headers(etag: str) -> Dict[str, str]:
+    return {"ETag": etag, "Cache-Control": SESSION_CACHE_CONTROL}
 
 
 @app.get("/csv/{session_id}")
-async def download_csv(session_id: str):
+async def download_csv(session_id: str, if_none_match: Optional[str] = Header(None)):
     """
     Download CSV file for a specific parsing session
     """
-    if session_id not in csv_storage:
+    etag = session_etag(session_id, "csv", "CSV not found")
+    headers = {'Content-Disposition': 'attachment; filename=study-plan.csv', **cache_headers(etag)}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    
+    csv_content = csv_cache.get(session_id, etag)
+    if csv_content is not None:
+        return StreamingResponse(iter([csv_content]), media_type='text/csv', headers=headers)
+    
+    parse_response = session_store.get_response(session_id)
+    if parse_response is None:
         raise HTTPException(status_code=404, detail="CSV not found")
     
-    csv_content = csv_storage[session_id]
+    # Built on first download and streamed chunk by chunk, then kept for repeat downloads
+    def csv_stream():
+        chunks = []
+        with span("csv"):
+            for chunk in iter_csv_chunks(parse_response.courses):
+                data = chunk.encode("utf-8")
+                chunks.append(data)
+                yield data
+        csv_cache.put(session_id, etag, b"".join(chunks))
     
-    return Response(
-        content=csv_content,
-        media_type='text/csv',
-        headers={'Content-Disposition': 'attachment; filename=study-plan.csv'}
-    )
+    return StreamingResponse(csv_stream(), media_type='text/csv', headers=headers)
 
 
-@app.get("/graph/{session_id}")
-async def get_study_plan_graph(session_id: str):
+@app.get("/graph/{session_id}", response_model=StudyPlanGraph)
+async def get_study_plan_graph(session_id: str, if_none_match: Optional[str] = Header(None)):
     """Get study plan graph data for a specific parsing session"""
-    if session_id not in parsed_data_storage:
-        raise HTTPException(status_code=404, detail="Session not found")
+    etag = session_etag(session_id, "graph", "Session not found")
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=cache_headers(etag))
     
-    parse_response = parsed_data_storage[session_id]
+    parse_response = session_store.get_response(session_id)
+    if parse_response is None:
+        raise HTTPException(status_code=404, detail="Session not found")
     
     if not parse_response.graph:
         raise HTTPException(status_code=404, detail="Graph data not available")
     
-    return parse_response.graph
+    return Response(
+        content=parse_response.graph.model_dump_json(),
+        media_type="application/json",
+        headers=cache_headers(etag)
+    )
+
+
+@app.get("/graph/{session_id}/analysis", response_model=StudyPlanAnalysis)
+async def get_study_plan_analysis(session_id: str, if_none_match: Optional[str] = Header(None)):
+    """
+    Prerequisite analysis of a session's graph: topological order, cycles,
+    per-course depth, critical path, transitive reduction and semester credit load
+    Computed on the first request and cached for the session
+    """
+    etag = session_etag(session_id, "analysis", "Session not found")
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=cache_headers(etag))
+    
+    content = analysis_cache.get(session_id, etag)
+    if content is None:
+        parse_response = session_store.get_response(session_id)
+        if parse_response is None:
+            raise HTTPException(status_code=404, detail="Session not found")
+        
+        if not parse_response.graph:
+            raise HTTPException(status_code=404, detail="Graph data not available")
+        
+        with span("analysis"):
+            analysis = await run_in_pool(analyze_study_plan_graph, parse_response.graph)
+        content = analysis.model_dump_json().encode("utf-8")
+        analysis_cache.put(session_id, etag, content)
+    
+    return Response(content=content, media_type="application/json", headers=cache_headers(etag))
 
 
-@app.get("/program-info/{session_id}")
-async def get_program_info(session_id: str):
+def if_match_ok(if_match: Optional[str], session_etag_value: str) -> bool:
+    """
+    Check an If-Match header (strong comparison) against the session's stored
+    ETag; any resource ETag of the session, or "*", matches
+    """
+    if not if_match:
+        return True
+    for candidate in if_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.strip('"').split("-", 1)[0] == session_etag_value:
+            return True
+    return False
+
+
+@app.patch("/courses/{session_id}", response_model=ParseResponse)
+async def edit_courses(session_id: str, patch: StudyPlanPatch, faculty: Optional[str] = None,
+                       if_match: Optional[str] = Header(None)):
+    """
+    Add, remove or update courses of a parsed session, or change a course's
+    prerequisites. Edits apply in order and all or nothing; only the touched
+    semesters and prerequisite edges of the stored graph are rebuilt
+    """
+    lock = session_edit_locks.get(session_id)
+    if lock is None:
+        lock = session_edit_locks[session_id] = asyncio.Lock()
+    
+    async with lock:
+        stored_etag = session_store.get_etag(session_id)
+        if stored_etag is None:
+            raise HTTPException(status_code=404, detail="Session not found")
+        if not if_match_ok(if_match, stored_etag):
+            raise HTTPException(status_code=412, detail="Session has changed since it was read")
+        
+        parse_response = session_store.get_response(session_id)
+        if parse_response is None:
+            raise HTTPException(status_code=404, detail="Session not found")
+        
+        try:
+            with span("edit"):
+                parse_response = await run_in_pool(apply_course_edits, parse_response, patch.edits, get_rules(faculty))
+        except PlanEditError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        parse_response.session_id = session_id
+        with span("store"):
+            etag = session_store.put(session_id, parse_response)
+        # Exports and analyses of the old version are keyed by its ETag; drop them now
+        csv_cache.discard(session_id)
+        analysis_cache.discard(session_id)
+    
+    return Response(
+        content=parse_response.model_dump_json(),
+        media_type="application/json",
+        headers=cache_headers(f'"{etag}-plan"')
+    )
+
+
+@app.get("/program-info/{session_id}", response_model=ProgramInfo)
+async def get_program_info(session_id: str, if_none_match: Optional[str] = Header(None)):
     """Get program info for a specific parsing session"""
-    if session_id not in parsed_data_storage:
-        raise HTTPException(status_code=404, detail="Session not found")
+    etag = session_etag(session_id, "program-info", "Session not found")
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=cache_headers(etag))
     
-    parse_response = parsed_data_storage[session_id]
+    parse_response = session_store.get_response(session_id)
+    if parse_response is None:
+        raise HTTPException(status_code=404, detail="Session not found")
     
-    return parse_response.program_info
+    return Response(
+        content=parse_response.program_info.model_dump_json(),
+        media_type="application/json",
+        headers=cache_headers(etag)
+    )
+
+
+def resource_cache_stats() -> Dict[str, Dict[str, int]]:
+    return {"parse": parse_cache.stats(), "csv": csv_cache.stats(), "analysis": analysis_cache.stats()}
+
+
+registry.gauge_callback(
+    "tqf_sessions", "Parse sessions in the session store", [],
+    lambda: {(): session_store.stats()["sessions"]}
+)
+registry.gauge_callback(
+    "tqf_session_store_bytes", "Bytes held by the session store", [],
+    lambda: {(): session_store.stats()["bytes"]}
+)
+registry.counter_callback(
+    "tqf_session_evictions_total", "Sessions evicted to keep the memory store within SESSION_MAX_BYTES", [],
+    lambda: {(): session_store.stats().get("evictions", 0)}
+)
+registry.gauge_callback(
+    "tqf_cache_bytes", "Bytes held by each in-memory cache", ["cache"],
+    lambda: {(name,): stats["bytes"] for name, stats in resource_cache_stats().items()}
+)
+registry.gauge_callback(
+    "tqf_cache_entries", "Entries in each in-memory cache", ["cache"],
+    lambda: {(name,): stats["entries"] for name, stats in resource_cache_stats().items()}
+)
+registry.counter_callback(
+    "tqf_cache_hits_total", "Cache lookups that found an entry", ["cache"],
+    lambda: {(name,): stats["hits"] for name, stats in resource_cache_stats().items()}
+)
+registry.counter_callback(
+    "tqf_cache_misses_total", "Cache lookups that found nothing", ["cache"],
+    lambda: {(name,): stats["misses"] for name, stats in resource_cache_stats().items()}
+)
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Prometheus metrics of this worker process: stage and request latency
+    histograms, session store size and cache hit/miss counters
+    """
+    return Response(content=registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @app.delete("/cleanup/{session_id}")
@@ -301,10 +815,9 @@ async def cleanup_session(session_id: str):
     """
     Clean up stored data for a session
     """
-    if session_id in parsed_data_storage:
-        del parsed_data_storage[session_id]
-    if session_id in csv_storage:
-        del csv_storage[session_id]
+    session_store.delete(session_id)
+    csv_cache.discard(session_id)
+    analysis_cache.discard(session_id)
     
     return {"message": "Session cleaned up successfully"}
 
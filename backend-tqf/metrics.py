@@ -0,0 +1,214 @@
+"""
+Request timing spans and Prometheus metrics
+Each request gets a Timings (set by the middleware in main.py) that pipeline
+stages add named spans to with `with span("graph"):`. The spans are returned
+in the Server-Timing header and observed into the tqf_stage_seconds histogram.
+Stages that run in the extraction pool record into a Timings of their own
+(run_timed) and hand the spans back with their result.
+
+/metrics renders the registry in the Prometheus text format. Gauges and
+counters owned by other objects (session store size, cache hits) are read
+through callbacks when scraped. Every uvicorn worker process has its own
+registry.
+"""
+import contextvars
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Histogram buckets (seconds) shared by the stage and request histograms
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Buckets for the Gemini input token histogram
+TOKEN_BUCKETS = (500, 1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000, 500000)
+
+Labels = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Histogram:
+    """Cumulative-bucket histogram with label values"""
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = DURATION_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series: Dict[Labels, List[float]] = {}  # bucket counts..., +Inf count, sum
+
+    def observe(self, value: float, *label_values: str) -> None:
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        for labels, series in items:
+            for bound, count in zip(self.buckets + (math.inf,), series[:-1]):
+                le = 'le="{}"'.format(_format_value(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {_format_value(count)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {_format_value(series[-1])}")
+        return lines
+
+
+class CallbackMetric:
+    """Gauge or counter whose samples are read from a callback when scraped"""
+
+    def __init__(self, name: str, help_text: str, kind: str, label_names: Sequence[str],
+                 collect: Callable[[], Dict[Labels, float]]):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind  # "gauge" or "counter"
+        self.label_names = tuple(label_names)
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List = []
+
+    def histogram(self, name: str, help_text: str, label_names: Sequence[str] = (),
+                  buckets: Sequence[float] = DURATION_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, label_names, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge_callback(self, name: str, help_text: str, label_names: Sequence[str],
+                       collect: Callable[[], Dict[Labels, float]]) -> None:
+        self._metrics.append(CallbackMetric(name, help_text, "gauge", label_names, collect))
+
+    def counter_callback(self, name: str, help_text: str, label_names: Sequence[str],
+                         collect: Callable[[], Dict[Labels, float]]) -> None:
+        self._metrics.append(CallbackMetric(name, help_text, "counter", label_names, collect))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                print(f"Warning: could not collect metric {metric.name}: {e}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+stage_seconds = registry.histogram(
+    "tqf_stage_seconds", "Time spent in one parse pipeline stage", ["stage"]
+)
+request_seconds = registry.histogram(
+    "tqf_request_seconds", "Time until the response started, by endpoint", ["method", "endpoint", "status"]
+)
+gemini_input_tokens = registry.histogram(
+    "tqf_gemini_input_tokens", "Estimated Gemini input tokens per document, before (document) and after (sent) slimming",
+    ["input"], TOKEN_BUCKETS
+)
+
+
+class Timings:
+    """
+    Spans of one request, in the order they finished. observe=True also feeds
+    tqf_stage_seconds, which only the request-level Timings in main.py does
+    """
+
+    def __init__(self, observe: bool = False):
+        self.observe = observe
+        self.spans: List[Tuple[str, float]] = []
+
+    def add(self, name: str, seconds: float) -> None:
+        self.spans.append((name, seconds))
+        if self.observe:
+            stage_seconds.observe(seconds, name)
+
+    def extend(self, spans: List[Tuple[str, float]]) -> None:
+        for name, seconds in spans:
+            self.add(name, seconds)
+
+    def server_timing(self, total: Optional[float] = None) -> str:
+        """Server-Timing header value; repeated stages (batch documents) are summed"""
+        totals: Dict[str, float] = {}
+        for name, seconds in self.spans:
+            totals[name] = totals.get(name, 0.0) + seconds
+        if total is not None:
+            totals["total"] = total
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in totals.items())
+
+
+_current_timings: contextvars.ContextVar[Optional[Timings]] = contextvars.ContextVar("timings", default=None)
+
+
+def start_request_timings() -> Tuple[Timings, contextvars.Token]:
+    timings = Timings(observe=True)
+    return timings, _current_timings.set(timings)
+
+
+def end_request_timings(token: contextvars.Token) -> None:
+    _current_timings.reset(token)
+
+
+def current_timings() -> Optional[Timings]:
+    return _current_timings.get()
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time a block as stage `name` of the current request (does nothing outside one)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = _current_timings.get()
+        if timings is not None:
+            timings.add(name, time.perf_counter() - start)
+
+
+def record_spans(spans: List[Tuple[str, float]]) -> None:
+    """Add spans measured elsewhere (an extraction worker) to the current request"""
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.extend(spans)
+
+
+def run_timed(func, *args):
+    """
+    Run a pipeline stage under a Timings of its own, for the extraction pool
+    Returns (result, spans)
+    """
+    timings = Timings()
+    token = _current_timings.set(timings)
+    try:
+        return func(*args), timings.spans
+    finally:
+        _current_timings.reset(token)
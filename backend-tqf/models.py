@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, Dict, List, Literal, Optional
 
 
 class ProgramInfo(BaseModel):
@@ -9,8 +9,8 @@ class ProgramInfo(BaseModel):
 
 
 class Course(BaseModel):
-    year: int  # 1-4
-    semester: int  # 1 or 2
+    year: int  # 1-6
+    semester: int  # 1, 2 or 3 (summer session)
     course_code: str  # empty for electives
     course_title: str  # exact title
     credits: int = 3  # course credits, default 3
@@ -41,6 +41,24 @@ class StudyPlanGraph(BaseModel):
     edges: List[StudyPlanEdge]
 
 
+class SemesterLoad(BaseModel):
+    year: int
+    semester: int
+    credits: int  # credits of the semester's nodes, each OR group counted once
+    courses: int  # number of nodes, electives included
+
+
+class StudyPlanAnalysis(BaseModel):
+    topological_order: List[str]  # node ids, prerequisites before the courses that need them
+    has_cycles: bool
+    cycles: List[List[str]]  # node ids of each prerequisite cycle
+    depth: Dict[str, int]  # node id -> length of the longest prerequisite chain leading to it
+    critical_path: List[str]  # node ids of the longest prerequisite chain in the plan
+    redundant_edges: List[StudyPlanEdge]  # prerequisite links already implied by a longer chain
+    reduced_edges: List[StudyPlanEdge]  # graph edges without the redundant links (transitive reduction)
+    semester_load: List[SemesterLoad]
+
+
 class ParseResponse(BaseModel):
     program_info: ProgramInfo
     courses: List[Course]
@@ -48,6 +66,18 @@ class ParseResponse(BaseModel):
     graph: Optional[StudyPlanGraph] = None
 
 
+class CourseEdit(BaseModel):
+    op: Literal["add", "remove", "update", "set_prerequisite"]
+    node_id: Optional[str] = None  # course to remove/update/re-link: its graph node id (course code or elective id)
+    course: Optional[Course] = None  # add: the new course
+    changes: Optional[Dict[str, Any]] = None  # update: Course fields to change
+    prerequisite: Optional[str] = None  # set_prerequisite: comma-separated prerequisite codes, "" for none
+
+
+class StudyPlanPatch(BaseModel):
+    edits: List[CourseEdit]  # applied in order, all or nothing
+
+
 class ErrorResponse(BaseModel):
     error: str
     detail: Optional[str] = None
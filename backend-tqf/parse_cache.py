@@ -0,0 +1,183 @@
+"""
+Content-addressed cache for parse results
+Keyed by a hash of the uploaded bytes and the extractor version, so
+re-uploading the same document skips extraction, validation and graph building.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+from models import ParseResponse
+from csv_utils import GRAPH_VERSION
+
+
+def make_cache_key(content_digest: str, extractor: str, version: str) -> str:
+    """
+    Build a cache key from the upload's sha256 (computed while it was received)
+    and the extractor that produced the result. Cached results include the
+    graph, so the graph version is part of every key
+    """
+    return hashlib.sha256(f"{extractor}:{version}:{GRAPH_VERSION}\0{content_digest}".encode("utf-8")).hexdigest()
+
+
+class ParseCache:
+    """
+    Two-tier cache: a byte-bounded in-memory LRU and an optional on-disk tier.
+    Entries are stored serialized, so every hit yields a fresh ParseResponse.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, cache_dir: Optional[str] = None,
+                 max_disk_entries: int = 1000):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.max_disk_entries = max_disk_entries
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._size = 0
+        self._mutex = threading.Lock()
+        self._inflight: Dict[str, "_InflightLock"] = {}
+        self.hits = 0
+        self.misses = 0
+
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def get(self, key: str) -> Optional[ParseResponse]:
+        """Return the parse result for a key, or None on miss"""
+        with self._mutex:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+
+        if payload is None and self.cache_dir:
+            payload = self._read_disk(key)
+            if payload is not None:
+                self._put_memory(key, payload)
+
+        with self._mutex:
+            if payload is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if payload is None:
+            return None
+
+        entry = json.loads(payload)
+        return ParseResponse.model_validate(entry["response"])
+
+    def put(self, key: str, parse_response: ParseResponse) -> None:
+        """Store a finished parse result (the session id is not cached)"""
+        response_data = parse_response.model_dump(exclude={"session_id"})
+        payload = json.dumps({"response": response_data}, ensure_ascii=False)
+        self._put_memory(key, payload)
+        if self.cache_dir:
+            self._write_disk(key, payload)
+
+    def stats(self) -> Dict[str, int]:
+        """In-memory entries and bytes, plus hit/miss counts since startup"""
+        with self._mutex:
+            return {"entries": len(self._entries), "bytes": self._size, "hits": self.hits, "misses": self.misses}
+
+    def lock(self, key: str) -> "_KeyLock":
+        """
+        Per-key async lock so concurrent uploads of identical bytes
+        run the extraction only once
+        """
+        return _KeyLock(self, key)
+
+    def _put_memory(self, key: str, payload: str) -> None:
+        size = len(payload)
+        if size > self.max_bytes:
+            return
+        with self._mutex:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = payload
+            self._size += size
+            while self._size > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[str]:
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                payload = f.read()
+            # Touch so disk eviction is least-recently-used as well
+            os.utime(path, None)
+            return payload
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            print(f"Warning: could not read parse cache entry {key}: {e}")
+            return None
+
+    def _write_disk(self, key: str, payload: str) -> None:
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(payload)
+            os.replace(tmp_path, self._disk_path(key))
+            self._evict_disk()
+        except OSError as e:
+            print(f"Warning: could not write parse cache entry {key}: {e}")
+
+    def _evict_disk(self) -> None:
+        entries = [
+            entry for entry in os.scandir(self.cache_dir)
+            if entry.is_file() and entry.name.endswith(".json")
+        ]
+        if len(entries) <= self.max_disk_entries:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_disk_entries]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+class _InflightLock:
+    """A key's lock and how many requests hold or wait for it"""
+
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class _KeyLock:
+    """Async context manager handing out one shared lock per cache key"""
+
+    def __init__(self, cache: ParseCache, key: str):
+        self.cache = cache
+        self.key = key
+        self._entry: Optional[_InflightLock] = None
+
+    async def __aenter__(self):
+        entry = self._entry = self.cache._inflight.setdefault(self.key, _InflightLock())
+        entry.users += 1
+        try:
+            await entry.lock.acquire()
+        except BaseException:
+            self._leave()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._entry.lock.release()
+        self._leave()
+
+    def _leave(self) -> None:
+        # locked() is already False while a woken waiter has not run yet, so count users instead
+        self._entry.users -= 1
+        if not self._entry.users and self.cache._inflight.get(self.key) is self._entry:
+            del self.cache._inflight[self.key]
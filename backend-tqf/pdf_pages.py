@@ -0,0 +1,139 @@
+"""
+Page-indexed PDF extraction
+TQF PDFs run to 100-200 pages, but the study plan, its prerequisites and the
+program info sit on a handful of them. Every page goes through PyPDF2's
+extract_text once, and its text is cached by document hash and page number.
+The locator then picks the pages the extractors need from that text, so the
+regex passes, the Gemini prompt and the stored document only see those pages,
+and later reads of the same upload (other pipelines, retries) skip PyPDF2.
+Each PDF is read in one extraction pool worker; separate uploads are read in
+parallel by the pool.
+"""
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Set, Tuple
+import PyPDF2
+from extraction_rules import (
+    ExtractionRules, DEFAULT_RULES, TOTAL_PATTERN, PREREQUISITE_PATTERN, PROGRAM_INFO_PATTERNS
+)
+from uploads import UploadSource, open_source, source_digest
+from metrics import span
+
+logger = logging.getLogger(__name__)
+
+PDF_PAGE_CACHE_MAX_BYTES = int(os.getenv("PDF_PAGE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# A Year/Semester block without a Total line on its page may run onto this many more pages
+MAX_CONTINUATION_PAGES = 2
+
+
+def locate_study_plan_pages(pages: List[str], rules: ExtractionRules = DEFAULT_RULES) -> Optional[List[int]]:
+    """
+    Indexes of the pages the extractors need, from each page's text:
+    the first page matching each program info pattern, pages with Year/Semester
+    headers (plus following pages until the block's Total line) and pages with
+    prerequisite lines. Pages without text (scans, unreadable pages) are kept.
+    Returns None when no header is found, meaning the whole document is needed
+    """
+    selected: Set[int] = set()
+    found_header = False
+    pending_info = list(PROGRAM_INFO_PATTERNS)
+    open_block_pages = 0  # pages left that may continue an unclosed block
+
+    for idx, text in enumerate(pages):
+        if not text.strip():
+            selected.add(idx)
+            continue
+
+        for pattern in list(pending_info):
+            if pattern.search(text):
+                selected.add(idx)
+                pending_info.remove(pattern)
+
+        if PREREQUISITE_PATTERN.search(text):
+            selected.add(idx)
+
+        headers = list(rules.iter_headers(text))
+        if headers:
+            found_header = True
+            selected.add(idx)
+            last_header = headers[-1][0]
+            # Block closed on this page?
+            open_block_pages = 0 if TOTAL_PATTERN.search(text, last_header) else MAX_CONTINUATION_PAGES
+        elif open_block_pages:
+            selected.add(idx)
+            open_block_pages = 0 if TOTAL_PATTERN.search(text) else open_block_pages - 1
+
+    if not found_header:
+        return None
+    return sorted(selected)
+
+
+_page_cache: "OrderedDict[Tuple[str, int], str]" = OrderedDict()
+_page_cache_size = 0
+_page_cache_lock = threading.Lock()
+
+
+def _cache_get(key: Tuple[str, int]) -> Optional[str]:
+    with _page_cache_lock:
+        text = _page_cache.get(key)
+        if text is not None:
+            _page_cache.move_to_end(key)
+        return text
+
+
+def _cache_put(key: Tuple[str, int], text: str) -> None:
+    global _page_cache_size
+    size = len(text) + 100
+    if size > PDF_PAGE_CACHE_MAX_BYTES:
+        return
+    with _page_cache_lock:
+        previous = _page_cache.pop(key, None)
+        if previous is not None:
+            _page_cache_size -= len(previous) + 100
+        _page_cache[key] = text
+        _page_cache_size += size
+        while _page_cache_size > PDF_PAGE_CACHE_MAX_BYTES:
+            _, evicted = _page_cache.popitem(last=False)
+            _page_cache_size -= len(evicted) + 100
+
+
+def extract_pages(reader: PyPDF2.PdfReader, digest: str, indexes: Iterable[int]) -> List[str]:
+    """extract_text for the given pages, served from the page cache where possible"""
+    texts = []
+    for idx in indexes:
+        text = _cache_get((digest, idx))
+        if text is None:
+            try:
+                text = reader.pages[idx].extract_text() or ''
+            except Exception as e:
+                # Kept as an empty page, which the locator always selects
+                logger.warning("Could not extract text of PDF page %d: %s", idx + 1, e)
+                text = ''
+            _cache_put((digest, idx), text)
+        texts.append(text)
+    return texts
+
+
+def read_pdf_pages(source: UploadSource, rules: ExtractionRules = DEFAULT_RULES,
+                   all_pages: bool = False, digest: Optional[str] = None) -> List[str]:
+    """
+    Text of the study-plan pages of a PDF in page order, or of every page
+    when all_pages is set or the locator finds no Year/Semester header
+    digest keys the page cache; pass the upload's SpooledUpload.digest so the
+    document is not hashed again (it is computed here when missing)
+    """
+    if digest is None:
+        digest = source_digest(source)
+    with open_source(source) as stream:
+        reader = PyPDF2.PdfReader(stream)
+        pages = extract_pages(reader, digest, range(len(reader.pages)))
+    if all_pages:
+        return pages
+    with span("locate"):
+        indexes = locate_study_plan_pages(pages, rules)
+    if indexes is None:
+        return pages
+    return [pages[idx] for idx in indexes]
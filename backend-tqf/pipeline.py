@@ -0,0 +1,229 @@
+"""
+Blocking parse pipeline stages
+These run in the extraction process pool, so they must stay top-level,
+take picklable arguments and never touch main.py's session storage.
+"""
+import os
+import multiprocessing
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Iterator, List, Optional, Tuple
+from models import ParseResponse
+from csv_utils import validate_and_clean_courses, generate_study_plan_graph
+from course_index import CourseIndex
+from fast_extract import (
+    fast_extract_study_plan, fast_extract_with_confidence, iter_study_plan, assemble_study_plan,
+    expected_semesters, extract_study_years,
+)
+from document_model import load_document
+from extraction_rules import get_rules
+from prompt_slimming import excerpt_semesters, slim_document_text, split_document_by_year
+from uploads import SpooledUpload, UploadSource, open_source, spool_stream, upload_kind
+from metrics import span
+
+# Send only the study-plan regions to Gemini, optionally one request per year
+GEMINI_SLIM_INPUT = os.getenv("GEMINI_SLIM_INPUT", "1") == "1"
+GEMINI_CHUNK_BY_YEAR = os.getenv("GEMINI_CHUNK_BY_YEAR", "0") == "1"
+
+# Limits for /parse-batch uploads (ZIP members count individually)
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "200"))
+BATCH_MAX_FILE_BYTES = int(os.getenv("BATCH_MAX_FILE_BYTES", str(50 * 1024 * 1024)))
+BATCH_MAX_ARCHIVE_BYTES = int(os.getenv("BATCH_MAX_ARCHIVE_BYTES", str(512 * 1024 * 1024)))
+
+# Hybrid mode sends semesters scoring below this to Gemini
+HYBRID_MIN_CONFIDENCE = float(os.getenv("HYBRID_MIN_CONFIDENCE", "0.8"))
+# Bump when the choice of semesters sent to Gemini changes (part of the parse cache key)
+HYBRID_VERSION = "2"
+
+
+def create_extraction_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    Process pool for CPU-bound extraction, sized by EXTRACTION_WORKERS
+    (default: CPU count). EXTRACTION_WORKERS=0 runs stages in the default
+    thread pool instead, which is handy for debugging.
+    """
+    workers = int(os.getenv("EXTRACTION_WORKERS") or os.cpu_count() or 1)
+    if workers <= 0:
+        return None
+    # spawn: forking a process that already runs an event loop and threads is unsafe
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def finalize_parse(parse_response: ParseResponse, faculty: Optional[str] = None,
+                   index: Optional[CourseIndex] = None) -> ParseResponse:
+    """
+    Validate courses and build the graph for an extracted study plan (CSV is built on download)
+    Both stages share one CourseIndex: the one passed in (already filled by
+    extraction) or one built here
+    """
+    rules = get_rules(faculty)
+    if index is None:
+        index = CourseIndex(parse_response.courses, rules)
+
+    # Validate and clean courses
+    with span("validate"):
+        parse_response.courses = validate_and_clean_courses(parse_response.courses, rules, index)
+
+    # Generate study plan graph
+    with span("graph"):
+        parse_response.graph = generate_study_plan_graph(parse_response.courses, rules, index)
+
+    return parse_response
+
+
+def run_fast_pipeline(source: UploadSource, filename: str, faculty: Optional[str] = None,
+                      digest: Optional[str] = None) -> ParseResponse:
+    """Regex extraction plus validation and graph for /parse-fast"""
+    index = CourseIndex(rules=get_rules(faculty))
+    document = load_document(source, filename, index.rules, digest=digest)
+    parse_response = fast_extract_study_plan(source, filename, document, rules=index.rules, index=index)
+    return finalize_parse(parse_response, faculty, index)
+
+
+def iter_fast_parse_events(source: UploadSource, filename: str, faculty: Optional[str] = None,
+                           digest: Optional[str] = None) -> Iterator[Tuple[str, Any]]:
+    """
+    /parse-fast as a stream of (event, data) pairs:
+    "program_info", then one "semester" per non-empty Year/Semester block as soon as
+    the segmenter closes it, then "done" with the finished parse_response.
+    Semester courses are provisional: prerequisites are filtered and courses
+    validated only once the whole plan is known
+    """
+    rules = get_rules(faculty)
+    document = load_document(source, filename, rules, digest=digest)
+
+    program_info = None
+    semester_courses = {}
+    # Events are handed to a queue as they are produced, so this is (almost) only extraction time
+    with span("extract"):
+        for event in iter_study_plan(document, rules):
+            if event[0] == "program_info":
+                program_info = event[1]
+                yield "program_info", program_info.model_dump()
+                continue
+            _, block, courses = event
+            semester_courses[(block.year, block.semester)] = courses
+            if courses:
+                yield "semester", {
+                    "year": block.year,
+                    "semester": block.semester,
+                    "courses": [course.model_dump() for course in courses],
+                }
+
+        index = CourseIndex(rules=rules)
+        parse_response = assemble_study_plan(program_info, semester_courses, rules, index)
+    yield "done", finalize_parse(parse_response, faculty, index)
+
+
+def expand_zip_upload(source: UploadSource) -> List[Tuple[str, Optional[SpooledUpload], Optional[str]]]:
+    """
+    DOCX/PDF members of a ZIP archive as (name, upload, error) in archive order,
+    each spooled like a direct upload. Members that are too large or whose
+    content does not match their name carry an error instead; other files,
+    directories and macOS metadata are skipped. The caller closes the uploads
+    """
+    members = []
+    try:
+        with open_source(source) as stream, zipfile.ZipFile(stream) as archive:
+            for info in archive.infolist():
+                name = info.filename
+                if info.is_dir() or name.startswith('__MACOSX/') or os.path.basename(name).startswith('._'):
+                    continue
+                if not name.lower().endswith(('.docx', '.pdf')):
+                    continue
+                if len(members) >= BATCH_MAX_FILES:
+                    raise ValueError(f"Archive has more than {BATCH_MAX_FILES} documents")
+                if info.file_size > BATCH_MAX_FILE_BYTES:
+                    members.append((name, None, f"File is larger than {BATCH_MAX_FILE_BYTES} bytes"))
+                    continue
+                try:
+                    # Declared sizes can lie, so the limit is enforced again while copying
+                    with archive.open(info) as member:
+                        upload = spool_stream(member, name, upload_kind(name), BATCH_MAX_FILE_BYTES)
+                except ValueError as e:
+                    members.append((name, None, str(e)))
+                    continue
+                members.append((name, upload, None))
+    except BaseException:
+        for _, upload, _ in members:
+            if upload is not None:
+                upload.close()
+        raise
+    return members
+
+
+def prepare_gemini_input(source: UploadSource, filename: str, digest: Optional[str] = None) -> Tuple[str, List[str]]:
+    """
+    Document text in the layout sent to Gemini, plus the (slimmed) chunks to send
+    Returns (document_text, chunks); chunks is empty when the document has no text
+    """
+    # Unslimmed input means the whole document, so the PDF page locator is skipped
+    slim = GEMINI_SLIM_INPUT or GEMINI_CHUNK_BY_YEAR
+    document_text = load_document(source, filename, all_pages=not slim, digest=digest).gemini_text
+    if not document_text.strip():
+        return document_text, []
+
+    with span("slim"):
+        if GEMINI_CHUNK_BY_YEAR:
+            chunks = split_document_by_year(document_text)
+        elif GEMINI_SLIM_INPUT:
+            chunks = [slim_document_text(document_text)]
+        else:
+            chunks = [document_text]
+    return document_text, chunks
+
+
+def prepare_hybrid_parse(source: UploadSource, filename: str, faculty: Optional[str] = None,
+                         digest: Optional[str] = None) -> Tuple[ParseResponse, List[Tuple[int, int]], Optional[str]]:
+    """
+    Fast extraction plus a Gemini excerpt for the semesters it is not confident about
+    and the semesters missing from the plan's Year/Semester grid
+    Returns (fast_response, weak_semesters, excerpt). excerpt is None when every
+    semester parsed cleanly; when no semester was found at all the excerpt is
+    the slimmed document and the semester list is empty
+    """
+    rules = get_rules(faculty)
+    document = load_document(source, filename, rules, digest=digest)
+    parse_response, confidence = fast_extract_with_confidence(source, filename, document, rules)
+
+    if not confidence:
+        return parse_response, [], slim_document_text(document.gemini_text, rules)
+
+    weak = {key for key, score in confidence.items() if score < HYBRID_MIN_CONFIDENCE}
+    # Gaps: semesters of the expected grid that have no block at all
+    study_years = extract_study_years(document.gemini_text)
+    weak.update(key for key in expected_semesters(confidence, study_years, rules) if key not in confidence)
+    weak = sorted(weak)
+    if not weak:
+        return parse_response, [], None
+    return parse_response, weak, excerpt_semesters(document.gemini_text, weak, rules)
+
+
+def merge_hybrid_results(fast_response: ParseResponse, gemini_response: ParseResponse,
+                         semesters: List[Tuple[int, int]]) -> ParseResponse:
+    """
+    Replace the listed semesters of the fast result with Gemini's courses for them.
+    An empty list means Gemini extracted the whole plan
+    """
+    program_info = fast_response.program_info
+    if program_info.program_code == "UNKNOWN":
+        program_info = gemini_response.program_info
+
+    if not semesters:
+        return ParseResponse(program_info=program_info, courses=gemini_response.courses)
+
+    replacements = {}
+    for course in gemini_response.courses:
+        key = (course.year, course.semester)
+        if key in semesters:
+            replacements.setdefault(key, []).append(course)
+
+    courses = [
+        course for course in fast_response.courses
+        if (course.year, course.semester) not in replacements
+    ]
+    for replacement in replacements.values():
+        courses.extend(replacement)
+    courses.sort(key=lambda course: (course.year, course.semester))
+
+    return ParseResponse(program_info=program_info, courses=courses)
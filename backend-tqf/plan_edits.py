@@ -0,0 +1,219 @@
+"""
+Incremental edits of a parsed study plan
+Adding, removing or changing a course only rebuilds the nodes of the semesters
+it touches and the prerequisite edges into the affected courses; everything
+else in the stored graph is kept as it is. With the layered layout only the
+touched semester columns are re-ordered. The full graph is rebuilt only when an
+edit adds or removes the summer semester, which moves every column.
+"""
+from typing import Dict, List, Optional, Set, Tuple
+from pydantic import ValidationError
+from models import Course, CourseEdit, ParseResponse, StudyPlanEdge, StudyPlanGraph, StudyPlanNode
+from extraction_rules import ExtractionRules, DEFAULT_RULES
+from course_index import CourseIndex
+from csv_utils import (
+    semester_nodes, prerequisite_edge, clean_prerequisite, semesters_per_year_of, generate_study_plan_graph
+)
+from graph_layout import GRAPH_LAYOUT, relayout_column
+
+SemesterKey = Tuple[int, int]
+
+
+class PlanEditError(ValueError):
+    """An edit that does not apply to the plan (unknown course, duplicate code, invalid field)"""
+
+
+class _EditablePlan:
+    """A parse result split into per-semester courses and nodes, plus edges by target course"""
+
+    def __init__(self, parse_response: ParseResponse, rules: ExtractionRules):
+        self.rules = rules
+        courses = sorted(parse_response.courses, key=lambda course: (course.year, course.semester))
+        self.index = CourseIndex(courses, rules)
+        self.semesters_per_year = semesters_per_year_of(courses)
+
+        graph = parse_response.graph
+        if graph is None or len(graph.nodes) != len(courses):
+            graph = generate_study_plan_graph(courses, rules, self.index)
+
+        self.semesters: Dict[SemesterKey, List[Course]] = {}
+        for course in courses:
+            self.semesters.setdefault((course.year, course.semester), []).append(course)
+        # Nodes line up with the (sorted) courses of their semester
+        self.nodes: Dict[SemesterKey, List[StudyPlanNode]] = {}
+        self.location: Dict[str, Tuple[SemesterKey, int]] = {}  # node id -> (semester, position)
+        for node in graph.nodes:
+            semester_list = self.nodes.setdefault((node.year, node.semester), [])
+            self.location[node.id] = ((node.year, node.semester), len(semester_list))
+            semester_list.append(node)
+        self.edges: Dict[str, StudyPlanEdge] = {edge.to_id: edge for edge in graph.edges}
+
+        self.touched: Set[SemesterKey] = set()
+        self.relink: List[Course] = []  # courses whose incoming edge is rebuilt at the end
+
+    def find(self, node_id: Optional[str]) -> Tuple[SemesterKey, int, Course]:
+        located = self.location.get(node_id or "")
+        if located is None:
+            raise PlanEditError(f"Course {node_id} is not in the plan")
+        key, position = located
+        return key, position, self.semesters[key][position]
+
+    def refresh_semester(self, key: SemesterKey) -> None:
+        """Rebuild the nodes (ids, OR groups, grid rows) of one semester"""
+        for node in self.nodes.pop(key, []):
+            if self.location.get(node.id, (None,))[0] == key:
+                del self.location[node.id]
+        courses = self.semesters.get(key)
+        if not courses:
+            self.semesters.pop(key, None)
+        else:
+            self.nodes[key] = semester_nodes(courses, self.semesters_per_year, self.rules)
+            for position, node in enumerate(self.nodes[key]):
+                self.location[node.id] = (key, position)
+        self.touched.add(key)
+
+    def check_course(self, course: Course) -> None:
+        if course.year < 1 or not 1 <= course.semester <= 3:
+            raise PlanEditError("year must be at least 1 and semester 1, 2 or 3")
+        if course.prerequisite and course.prerequisite != "-":
+            self.check_prerequisite(course.prerequisite)
+
+    def check_prerequisite(self, prerequisite: str) -> None:
+        """Explicit edits name in-plan courses only; unknown codes are rejected rather than dropped"""
+        for prereq in prerequisite.split(","):
+            prereq = prereq.strip()
+            if not prereq:
+                continue
+            prereq_code = self.rules.match_code_start(prereq)
+            if not prereq_code or prereq_code not in self.index:
+                raise PlanEditError(f"Prerequisite '{prereq}' is not a course in the plan")
+
+    def unlink_code(self, code: str) -> None:
+        """A course code left the plan: drop its edge and its mentions in other courses' prerequisites"""
+        self.edges.pop(code, None)
+        self.index = CourseIndex((course for courses in self.semesters.values() for course in courses), self.rules)
+        dependents = [
+            target for target, edge in self.edges.items()
+            if code in (edge.sources or [edge.from_id])
+        ]
+        for target in dependents:
+            if target in self.location:
+                _, _, course = self.find(target)
+                course.prerequisite = clean_prerequisite(course.prerequisite, self.index)
+                self.relink.append(course)
+
+    def add(self, edit: CourseEdit) -> None:
+        if edit.course is None:
+            raise PlanEditError("add needs a course")
+        course = edit.course.model_copy()
+        course.course_code = course.course_code.strip()
+        if course.course_code and course.course_code in self.index:
+            raise PlanEditError(f"Course {course.course_code} is already in the plan")
+        self.index.add_courses([course])
+        self.check_course(course)
+        key = (course.year, course.semester)
+        self.semesters.setdefault(key, []).append(course)
+        self.refresh_semester(key)
+        self.relink.append(course)
+
+    def remove(self, edit: CourseEdit) -> None:
+        key, position, course = self.find(edit.node_id)
+        del self.semesters[key][position]
+        self.refresh_semester(key)
+        if course.course_code:
+            self.unlink_code(course.course_code)
+
+    def update(self, edit: CourseEdit) -> None:
+        key, position, course = self.find(edit.node_id)
+        changes = dict(edit.changes or {})
+        unknown = set(changes) - set(Course.model_fields)
+        if unknown:
+            raise PlanEditError(f"Unknown course field(s): {', '.join(sorted(unknown))}")
+        try:
+            updated = Course.model_validate({**course.model_dump(), **changes})
+        except ValidationError as e:
+            raise PlanEditError(str(e))
+        updated.course_code = updated.course_code.strip()
+
+        old_code = course.course_code
+        renamed = updated.course_code != old_code
+        if renamed and updated.course_code and updated.course_code in self.index \
+                and self.index.canonical(updated.course_code) != self.index.canonical(old_code):
+            raise PlanEditError(f"Course {updated.course_code} is already in the plan")
+
+        new_key = (updated.year, updated.semester)
+        if new_key == key:
+            self.semesters[key][position] = updated
+        else:
+            del self.semesters[key][position]
+            self.semesters.setdefault(new_key, []).append(updated)
+            self.refresh_semester(key)
+        if renamed:
+            # The old id disappears; courses that depended on it lose that prerequisite
+            self.edges.pop(old_code, None)
+            if old_code:
+                self.unlink_code(old_code)
+            else:
+                self.index.add_courses([updated])
+        self.check_course(updated)
+        self.refresh_semester(new_key)
+        self.relink.append(updated)
+
+    def set_prerequisite(self, edit: CourseEdit) -> None:
+        _, _, course = self.find(edit.node_id)
+        if not course.course_code:
+            raise PlanEditError("Electives without a course code cannot have prerequisites")
+        prerequisite = ", ".join(p.strip() for p in (edit.prerequisite or "").split(",") if p.strip())
+        self.check_prerequisite(prerequisite)
+        course.prerequisite = prerequisite
+        self.relink.append(course)
+
+    def finish(self, parse_response: ParseResponse) -> ParseResponse:
+        courses = [course for key in sorted(self.semesters) for course in self.semesters[key]]
+        parse_response.courses = courses
+
+        # Adding or removing the summer semester moves every column
+        if semesters_per_year_of(courses) != self.semesters_per_year:
+            parse_response.graph = generate_study_plan_graph(courses, self.rules, self.index)
+            return parse_response
+
+        present = {id(course) for course in courses}
+        for course in self.relink:
+            if id(course) not in present or not course.course_code:
+                continue
+            # Prerequisites removed later in the same patch are dropped here
+            if course.prerequisite and course.prerequisite != "-":
+                course.prerequisite = clean_prerequisite(course.prerequisite, self.index)
+            edge = prerequisite_edge(course, self.index)
+            if edge is None:
+                self.edges.pop(course.course_code, None)
+            else:
+                self.edges[course.course_code] = edge
+
+        nodes = [node for key in sorted(self.nodes) for node in self.nodes[key]]
+        edges = list(self.edges.values())
+        if GRAPH_LAYOUT == "layered":
+            for key in sorted(self.touched):
+                if key in self.nodes:
+                    relayout_column(self.nodes[key], nodes, edges)
+        parse_response.graph = StudyPlanGraph(nodes=nodes, edges=edges)
+        return parse_response
+
+
+def apply_course_edits(parse_response: ParseResponse, edits: List[CourseEdit],
+                       rules: ExtractionRules = DEFAULT_RULES) -> ParseResponse:
+    """
+    Apply edits to a stored parse result in order and return it updated
+    Raises PlanEditError, leaving the caller's stored copy untouched, when any edit does not apply
+    """
+    plan = _EditablePlan(parse_response, rules)
+    for edit in edits:
+        if edit.op == "add":
+            plan.add(edit)
+        elif edit.op == "remove":
+            plan.remove(edit)
+        elif edit.op == "update":
+            plan.update(edit)
+        else:
+            plan.set_prerequisite(edit)
+    return plan.finish(parse_response)
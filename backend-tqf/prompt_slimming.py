@@ -0,0 +1,181 @@
+"""
+Prompt slimming for the Gemini path
+Cuts document text down to the regions the extraction prompt actually uses
+(program info, Year/Semester blocks, prerequisite lines), reusing the fast
+extractor's header and prerequisite detection. Optionally splits the result
+into one chunk per study-plan year so the chunks can be sent in parallel.
+report_token_counts records the estimated input size before and after.
+"""
+from bisect import bisect_right
+from typing import Dict, List, Optional, Set, Tuple
+from extraction_rules import ExtractionRules, DEFAULT_RULES, TOTAL_PATTERN, PROGRAM_INFO_PATTERNS
+from fast_extract import find_semester_headers, iter_prerequisite_lines
+from metrics import gemini_input_tokens
+
+# Upper bound on lines kept after a header when no Total line closes the block
+MAX_BLOCK_LINES = 80
+
+GAP_MARKER = "..."
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough Gemini token count (about four characters per token)"""
+    return (len(text) + 3) // 4
+
+
+def report_token_counts(document_text: str, chunks: List[str]) -> None:
+    """Record the estimated input tokens before and after slimming in tqf_gemini_input_tokens"""
+    gemini_input_tokens.observe(estimate_tokens(document_text), "document")
+    gemini_input_tokens.observe(sum(estimate_tokens(chunk) for chunk in chunks), "sent")
+
+
+def _select_regions(text: str, rules: ExtractionRules) -> Tuple[List[str], Set[int], Dict[Tuple[int, int], Set[int]], List[Tuple[str, List[int]]]]:
+    """
+    Returns (lines, program_info_lines, {(year, semester): block_lines}, [(course_code, prerequisite_lines)])
+    where the line sets hold indexes into lines
+    """
+    lines = text.split('\n')
+    line_starts = []
+    offset = 0
+    for line in lines:
+        line_starts.append(offset)
+        offset += len(line) + 1
+
+    # Lines holding the program code, title and total credits
+    program_lines: Set[int] = set()
+    for pattern in PROGRAM_INFO_PATTERNS:
+        info_match = pattern.search(text)
+        if info_match:
+            first = bisect_right(line_starts, info_match.start()) - 1
+            last = bisect_right(line_starts, max(info_match.end() - 1, info_match.start())) - 1
+            program_lines.update(range(first, last + 1))
+
+    # Each header keeps its lines up to the Total line or the next header
+    headers = find_semester_headers(text, rules)
+    header_lines = sorted(headers)
+    semester_blocks: Dict[Tuple[int, int], Set[int]] = {}
+    for position, start in enumerate(header_lines):
+        _, year, semester = headers[start]
+        stop = header_lines[position + 1] if position + 1 < len(header_lines) else len(lines)
+        stop = min(stop, start + MAX_BLOCK_LINES)
+        block = semester_blocks.setdefault((year, semester), set())
+        for idx in range(start, stop):
+            block.add(idx)
+            if idx > start and TOTAL_PATTERN.search(lines[idx]):
+                break
+
+    prerequisites = [
+        (course_code, [course_idx, prereq_idx])
+        for course_idx, prereq_idx, course_code in iter_prerequisite_lines(lines, rules)
+    ]
+
+    return lines, program_lines, semester_blocks, prerequisites
+
+
+def _join_lines(lines: List[str], selected: Set[int]) -> str:
+    """Selected lines in document order, with a marker where text was left out"""
+    parts = []
+    previous = None
+    for idx in sorted(selected):
+        if previous is not None and idx != previous + 1:
+            parts.append(GAP_MARKER)
+        parts.append(lines[idx])
+        previous = idx
+    return '\n'.join(parts)
+
+
+def slim_document_text(text: str, rules: ExtractionRules = DEFAULT_RULES) -> str:
+    """
+    Keep only program info, study plan blocks and prerequisite lines
+    Falls back to the full text when no Year/Semester header is found
+    """
+    lines, program_lines, semester_blocks, prerequisites = _select_regions(text, rules)
+    if not semester_blocks:
+        return text
+
+    selected = set(program_lines)
+    for block in semester_blocks.values():
+        selected |= block
+    for _, prereq_lines in prerequisites:
+        selected.update(prereq_lines)
+    return _join_lines(lines, selected)
+
+
+def split_document_by_year(text: str, rules: ExtractionRules = DEFAULT_RULES) -> List[str]:
+    """
+    One slimmed chunk per study plan year, each with the program info and the
+    prerequisite lines of that year's courses
+    Falls back to a single full-text chunk when no Year/Semester header is found
+    """
+    lines, program_lines, semester_blocks, prerequisites = _select_regions(text, rules)
+    if not semester_blocks:
+        return [text]
+
+    years: Dict[int, Set[int]] = {}
+    for (year, _), block in semester_blocks.items():
+        years.setdefault(year, set()).update(block)
+
+    chunks = []
+    for year in sorted(years):
+        selected = _with_prerequisites(lines, program_lines | years[year], prerequisites, rules)
+        note = (
+            f"Note: this excerpt covers Year {year} of the study plan only. "
+            "Prerequisites may name courses from other years; keep those course codes."
+        )
+        chunks.append(f"{note}\n{_join_lines(lines, selected)}")
+    return chunks
+
+
+def excerpt_semesters(text: str, keys: List[Tuple[int, int]], rules: ExtractionRules = DEFAULT_RULES) -> Optional[str]:
+    """
+    Program info plus the given Year/Semester blocks and their courses'
+    prerequisite lines. A semester whose header was not found is covered by the
+    text where it should be: the block before it and the lines up to the next
+    header. Returns None if none of the semesters can be located
+    """
+    lines, program_lines, semester_blocks, prerequisites = _select_regions(text, rules)
+    selected = set(program_lines)
+    found = []
+    for key in keys:
+        region = semester_blocks.get(key) or _gap_region(len(lines), semester_blocks, key)
+        if region:
+            selected |= region
+            found.append(key)
+    if not found:
+        return None
+    selected = _with_prerequisites(lines, selected, prerequisites, rules)
+
+    names = ", ".join(f"Year {year} Semester {semester}" for year, semester in found)
+    note = (
+        f"Note: this excerpt covers only {names} of the study plan. "
+        "Prerequisites may name courses from other semesters; keep those course codes."
+    )
+    return f"{note}\n{_join_lines(lines, selected)}"
+
+
+def _gap_region(line_count: int, semester_blocks: Dict[Tuple[int, int], Set[int]], key: Tuple[int, int]) -> Set[int]:
+    """Lines where a semester without a header should be, between the blocks around it"""
+    before = [other for other in semester_blocks if other < key]
+    after = [other for other in semester_blocks if other > key]
+    if not before and not after:
+        return set()
+    stop = min(semester_blocks[min(after)]) if after else line_count
+    if not before:
+        return set(range(max(0, stop - MAX_BLOCK_LINES), stop))
+    # Without a Total line the block before may have taken in the missing semester's rows
+    previous = semester_blocks[max(before)]
+    start = max(previous) + 1
+    return previous | set(range(start, min(stop, start + MAX_BLOCK_LINES)))
+
+
+def _with_prerequisites(lines: List[str], selected: Set[int],
+                        prerequisites: List[Tuple[str, List[int]]], rules: ExtractionRules) -> Set[int]:
+    """Add the prerequisite lines of every course mentioned in the selected lines"""
+    codes = set()
+    for idx in selected:
+        codes.update(rules.find_codes(lines[idx]))
+    selected = set(selected)
+    for course_code, prereq_lines in prerequisites:
+        if course_code in codes:
+            selected.update(prereq_lines)
+    return selected
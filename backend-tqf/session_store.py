@@ -0,0 +1,389 @@
+"""
+Session storage for parse results
+/csv, /graph and /program-info look sessions up by id, so with more than one
+uvicorn worker or replica the sessions must live somewhere every process can
+read. SESSION_STORE selects the backend:
+
+- "memory" (default): per-process dicts, fine for a single worker
+- "sqlite": a SQLite file at SESSION_STORE_PATH shared by all workers on the host
+
+Both expire sessions SESSION_TTL_SECONDS after they were stored, using an index
+ordered by expiry time instead of scanning every session. The memory backend
+also keeps to a SESSION_MAX_BYTES budget, evicting the least recently used
+sessions, holds active sessions in the compact form of compact_session.py and
+compresses sessions idle for SESSION_COMPRESS_IDLE_SECONDS. Stored and
+compressed sessions are zlib-compressed JSON, not a custom binary format.
+"""
+import hashlib
+import heapq
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Union
+from models import ParseResponse
+from compact_session import (
+    CompactParseResponse, StringPool, compact_parse_response, expand_parse_response, release_compact
+)
+
+
+def make_etag(response_json: bytes) -> str:
+    """Strong content hash of a stored parse result, used for HTTP ETags"""
+    return hashlib.sha256(response_json).hexdigest()[:32]
+
+
+def decode_parse_response(payload: bytes) -> ParseResponse:
+    """
+    Parse result from its stored form: zlib-compressed JSON text (the pydantic
+    JSON dump), not a custom binary encoding. JSON keeps rows readable with
+    the sqlite3 shell and zlib gets the sample plan from about 14 KB to 1.7 KB
+    """
+    return ParseResponse.model_validate_json(zlib.decompress(payload))
+
+
+class SessionStore(ABC):
+    """Interface shared by the session backends; a backend missing a method cannot be created"""
+
+    def __init__(self, ttl_seconds: float = 3600):
+        self.ttl_seconds = ttl_seconds
+
+    @abstractmethod
+    def put(self, session_id: str, parse_response: ParseResponse) -> str:
+        """Store a parse result, returns its ETag"""
+        ...
+
+    @abstractmethod
+    def get_response(self, session_id: str) -> Optional[ParseResponse]:
+        """Parse result of a live session, or None"""
+        ...
+
+    @abstractmethod
+    def get_etag(self, session_id: str) -> Optional[str]:
+        """ETag computed when the session was stored, or None if it is not live"""
+        ...
+
+    @abstractmethod
+    def delete(self, session_id: str) -> bool:
+        """Remove a session, returns whether it existed"""
+        ...
+
+    @abstractmethod
+    def expire(self) -> List[str]:
+        """Remove sessions past their TTL, returns their ids"""
+        ...
+
+    @abstractmethod
+    def stats(self) -> Dict[str, int]:
+        """Stored sessions and their size in bytes, plus evictions for the memory backend (for /metrics)"""
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+# Rough per-session bookkeeping cost (dict slots, entry object, heap entry, id string)
+SESSION_OVERHEAD_BYTES = 400
+
+
+class _MemorySession:
+    __slots__ = ("response", "etag", "compressed", "expires_at", "last_access", "size")
+
+    def __init__(self, response: Union[CompactParseResponse, bytes], etag: str, expires_at: float, last_access: float):
+        self.response = response  # compact while active, zlib-compressed JSON once idle
+        self.etag = etag
+        self.compressed = isinstance(response, bytes)
+        self.expires_at = expires_at
+        self.last_access = last_access
+        self.size = (len(response) if self.compressed else response.nbytes) + SESSION_OVERHEAD_BYTES
+
+
+class MemorySessionStore(SessionStore):
+    """
+    Per-process store with a byte budget
+    Active sessions are kept as CompactParseResponse columns over a string pool
+    shared by all sessions, not as pydantic objects, so their size is known.
+    Sessions idle for compress_idle_seconds become zlib-compressed JSON (a
+    negative value disables this), and the least recently used sessions are
+    evicted whenever sessions plus pooled strings go over max_bytes (0 means no budget)
+    """
+
+    def __init__(self, ttl_seconds: float = 3600, max_bytes: int = 0, compress_idle_seconds: float = 60):
+        super().__init__(ttl_seconds)
+        self.max_bytes = max_bytes
+        self.compress_idle_seconds = compress_idle_seconds
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, _MemorySession]" = OrderedDict()  # least recently used first
+        self._hot: "OrderedDict[str, None]" = OrderedDict()  # compact sessions, least recently used first
+        self._expiry: List[Tuple[float, str]] = []  # heap of (expires_at, id)
+        self._strings = StringPool()  # strings of the compact sessions
+        self.bytes_used = 0  # sessions, without the string pool
+        self.evictions = 0  # sessions dropped to stay within max_bytes, since startup
+
+    def put(self, session_id: str, parse_response: ParseResponse) -> str:
+        now = time.time()
+        response_json = parse_response.model_dump_json().encode("utf-8")
+        etag = make_etag(response_json)
+        compressed = zlib.compress(response_json) if self.compress_idle_seconds == 0 else None
+        with self._lock:
+            self._remove(session_id)
+            # The pool is shared, so encoding happens under the lock
+            response = compressed if compressed is not None else compact_parse_response(parse_response, self._strings)
+            session = _MemorySession(response, etag, now + self.ttl_seconds, now)
+            self._sessions[session_id] = session
+            if not session.compressed:
+                self._hot[session_id] = None
+            self.bytes_used += session.size
+            heapq.heappush(self._expiry, (session.expires_at, session_id))
+            self._compress_cold(now)
+            self._evict()
+            # Rebuild the heap once entries left behind by deletes and evictions dominate it
+            if len(self._expiry) > 2 * len(self._sessions) + 64:
+                self._expiry = [(entry.expires_at, sid) for sid, entry in self._sessions.items()]
+                heapq.heapify(self._expiry)
+        return session.etag
+
+    def _get(self, session_id: str) -> Optional[_MemorySession]:
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session.expires_at <= now:
+                return None
+            session.last_access = now
+            self._sessions.move_to_end(session_id)
+            if session_id in self._hot:
+                self._hot.move_to_end(session_id)
+            return session
+
+    def get_response(self, session_id: str) -> Optional[ParseResponse]:
+        session = self._get(session_id)
+        if session is None:
+            return None
+        response = session.response
+        if isinstance(response, bytes):
+            return decode_parse_response(response)
+        return expand_parse_response(response)
+
+    def get_etag(self, session_id: str) -> Optional[str]:
+        session = self._get(session_id)
+        return session.etag if session else None
+
+    def delete(self, session_id: str) -> bool:
+        # The heap entry is left behind and skipped when it comes due
+        with self._lock:
+            return self._remove(session_id)
+
+    def _remove(self, session_id: str) -> bool:
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        self._hot.pop(session_id, None)
+        self.bytes_used -= session.size
+        if not session.compressed:
+            release_compact(session.response, self._strings)
+        return True
+
+    def _total_bytes(self) -> int:
+        return self.bytes_used + self._strings.bytes
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"sessions": len(self._sessions), "bytes": self._total_bytes(), "evictions": self.evictions}
+
+    def _compress_cold(self, now: float) -> None:
+        """Compress uncompressed sessions that have been idle long enough"""
+        if self.compress_idle_seconds < 0:
+            return
+        while self._hot:
+            session_id = next(iter(self._hot))
+            session = self._sessions[session_id]
+            if now - session.last_access < self.compress_idle_seconds:
+                break
+            del self._hot[session_id]
+            self.bytes_used -= session.size
+            compact = session.response
+            session.response = zlib.compress(expand_parse_response(compact).model_dump_json().encode("utf-8"))
+            release_compact(compact, self._strings)
+            session.compressed = True
+            session.size = len(session.response) + SESSION_OVERHEAD_BYTES
+            self.bytes_used += session.size
+
+    def _evict(self) -> None:
+        """Drop least recently used sessions until the store fits its budget (keeps the newest)"""
+        if not self.max_bytes:
+            return
+        while self._total_bytes() > self.max_bytes and len(self._sessions) > 1:
+            self._remove(next(iter(self._sessions)))
+            self.evictions += 1
+
+    def expire(self) -> List[str]:
+        now = time.time()
+        expired = []
+        with self._lock:
+            while self._expiry and self._expiry[0][0] <= now:
+                expires_at, session_id = heapq.heappop(self._expiry)
+                session = self._sessions.get(session_id)
+                # Skip heap entries of deleted, evicted or re-stored sessions
+                if session is not None and session.expires_at == expires_at:
+                    self._remove(session_id)
+                    expired.append(session_id)
+            self._compress_cold(now)
+        return expired
+
+
+class SqliteSessionStore(SessionStore):
+    """Store shared by every worker process that opens the same database file"""
+
+    def __init__(self, path: str, ttl_seconds: float = 3600):
+        super().__init__(ttl_seconds)
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY,"
+            " response BLOB NOT NULL,"
+            " etag TEXT NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires_at)")
+        self._conn.commit()
+
+    def put(self, session_id: str, parse_response: ParseResponse) -> str:
+        response_json = parse_response.model_dump_json().encode("utf-8")
+        etag = make_etag(response_json)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, response, etag, expires_at) VALUES (?, ?, ?, ?)",
+                (session_id, zlib.compress(response_json), etag, time.time() + self.ttl_seconds)
+            )
+            self._conn.commit()
+        return etag
+
+    def _get_column(self, session_id: str, column: str):
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {column} FROM sessions WHERE session_id = ? AND expires_at > ?",
+                (session_id, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def get_response(self, session_id: str) -> Optional[ParseResponse]:
+        payload = self._get_column(session_id, "response")
+        return decode_parse_response(payload) if payload is not None else None
+
+    def get_etag(self, session_id: str) -> Optional[str]:
+        return self._get_column(session_id, "etag")
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+        return cursor.rowcount > 0
+
+    def expire(self) -> List[str]:
+        # Range scan on the expires_at index, only expired rows are touched
+        now = time.time()
+        with self._lock:
+            expired = [
+                row[0] for row in self._conn.execute(
+                    "SELECT session_id FROM sessions WHERE expires_at <= ?", (now,)
+                )
+            ]
+            self._conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+            self._conn.commit()
+        return expired
+
+    def stats(self) -> Dict[str, int]:
+        # Includes expired rows the cleanup task has not removed yet
+        with self._lock:
+            count, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(response)), 0) FROM sessions"
+            ).fetchone()
+        return {"sessions": count, "bytes": size}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class SessionResourceCache:
+    """
+    Byte-bounded LRU of resources derived from a session (CSV exports, graph
+    analyses), keyed by session id. They are built from the stored parse result
+    on first request, so only sessions that are actually asked for one pay for it.
+    Entries remember the session ETag they were built from, so a session edited
+    by another worker never gets an outdated copy served
+    """
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[str, bytes]]" = OrderedDict()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, session_id: str, etag: str) -> Optional[bytes]:
+        """Cached resource if it was built from the session version with this ETag"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None or entry[0] != etag:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(session_id)
+            return entry[1]
+
+    def put(self, session_id: str, etag: str, content: bytes) -> None:
+        """Cache a resource; resources larger than a quarter of the budget are not kept"""
+        if len(content) > self.max_bytes // 4:
+            return
+        with self._lock:
+            self._discard(session_id)
+            self._entries[session_id] = (etag, content)
+            self._size += len(content)
+            while self._size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def discard(self, session_id: str) -> None:
+        with self._lock:
+            self._discard(session_id)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._size, "hits": self.hits, "misses": self.misses}
+
+    def _discard(self, session_id: str) -> None:
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self._size -= len(entry[1])
+
+
+def create_session_store() -> SessionStore:
+    """
+    Session backend configured from SESSION_STORE / SESSION_STORE_PATH / SESSION_TTL_SECONDS
+    (plus SESSION_MAX_BYTES / SESSION_COMPRESS_IDLE_SECONDS for the memory backend)
+    """
+    ttl_seconds = float(os.getenv("SESSION_TTL_SECONDS", "3600"))
+    backend = os.getenv("SESSION_STORE", "memory").lower()
+    if backend == "sqlite":
+        path = os.getenv("SESSION_STORE_PATH") or os.path.join(tempfile.gettempdir(), "tqf_sessions.sqlite3")
+        return SqliteSessionStore(path, ttl_seconds=ttl_seconds)
+    if backend != "memory":
+        print(f"Warning: unknown SESSION_STORE '{backend}', using memory")
+    return MemorySessionStore(
+        ttl_seconds=ttl_seconds,
+        max_bytes=int(os.getenv("SESSION_MAX_BYTES", str(128 * 1024 * 1024))),
+        compress_idle_seconds=float(os.getenv("SESSION_COMPRESS_IDLE_SECONDS", "60")),
+    )
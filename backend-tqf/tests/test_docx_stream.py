@@ -0,0 +1,83 @@
+import io
+import os
+import re
+import zipfile
+import docx
+import pytest
+from docx.enum.text import WD_BREAK
+from document_model import load_docx_object_model
+from docx_stream import read_docx_stream
+
+SAMPLE_DOCX = os.path.join(os.path.dirname(__file__), "..", "..", "public", "TQF_Sample.docx")
+
+
+def _save(document) -> bytes:
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def _merged_cells_docx() -> bytes:
+    document = docx.Document()
+    paragraph = document.add_paragraph("  Year 1 ")
+    run = paragraph.add_run("tab\tbed")
+    run.add_break()
+    run.add_text("after break")
+    run.add_break(WD_BREAK.PAGE)
+
+    table = document.add_table(rows=4, cols=4)
+    for i, cell in enumerate(table._cells):
+        cell.text = f"c{i}"
+    table.cell(0, 0).merge(table.cell(0, 2))  # horizontal
+    table.cell(1, 1).merge(table.cell(3, 1))  # vertical
+    table.cell(2, 2).merge(table.cell(3, 3))  # both
+    table.cell(1, 3).add_table(rows=2, cols=2).cell(0, 0).text = "nested"
+    table.cell(2, 0).add_paragraph("second paragraph")
+
+    document.add_paragraph("between")
+    short = document.add_table(rows=2, cols=3)
+    short.cell(0, 1).text = "stacked\nlines"
+    row = short._tbl.tr_lst[1]
+    row.remove(row.tc_lst[-1])  # a row with fewer cells than the grid
+    document.add_paragraph("")
+    return _save(document)
+
+
+def _sample_docx() -> bytes:
+    with open(SAMPLE_DOCX, "rb") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("build", [_sample_docx, _merged_cells_docx], ids=["sample", "merged-cells"])
+def test_stream_reader_matches_python_docx(build):
+    source = build()
+    expected = load_docx_object_model(source)
+    paragraphs, tables = read_docx_stream(source)
+    assert paragraphs == expected.paragraphs
+    assert tables == expected.tables
+
+
+def test_table_without_grid_takes_columns_from_first_row():
+    document = docx.Document()
+    table = document.add_table(rows=3, cols=3)
+    for i, cell in enumerate(table._cells):
+        cell.text = f"c{i}"
+    table.cell(0, 0).merge(table.cell(0, 1))
+    table.cell(1, 2).merge(table.cell(2, 2))
+
+    # Some generators leave out w:tblGrid, which python-docx cannot read
+    source = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(_save(document))) as original, zipfile.ZipFile(source, "w") as stripped:
+        for item in original.infolist():
+            data = original.read(item.filename)
+            if item.filename == "word/document.xml":
+                data, count = re.subn(rb"<w:tblGrid>.*?</w:tblGrid>", b"", data, flags=re.DOTALL)
+                assert count == 1
+            stripped.writestr(item, data)
+
+    _, tables = read_docx_stream(source.getvalue())
+    assert tables == [[
+        ["c0\nc1", "c0\nc1", "c2"],
+        ["c3", "c4", "c5\nc8"],
+        ["c6", "c7", "c5\nc8"],
+    ]]
@@ -0,0 +1,56 @@
+import os
+import pytest
+
+# Run extraction in the test process and keep Gemini responses out of any on-disk cache
+os.environ["EXTRACTION_WORKERS"] = "0"
+os.environ["GEMINI_CACHE_PATH"] = ""
+
+from fastapi.testclient import TestClient
+import main
+
+SAMPLE_DOCX = os.path.join(os.path.dirname(__file__), "..", "..", "public", "TQF_Sample.docx")
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture
+def session_id(client):
+    with open(SAMPLE_DOCX, "rb") as f:
+        response = client.post("/parse-fast", files={"file": ("TQF_Sample.docx", f.read())})
+    assert response.status_code == 200
+    return response.json()["session_id"]
+
+
+@pytest.mark.parametrize("resource", ["csv", "graph", "graph/{}/analysis", "program-info"])
+def test_if_none_match_returns_304(client, session_id, resource):
+    path = f"/{resource.format(session_id)}" if "{}" in resource else f"/{resource}/{session_id}"
+    first = client.get(path)
+    etag = first.headers["etag"]
+    assert first.status_code == 200
+
+    revalidated = client.get(path, headers={"If-None-Match": f"W/{etag}"})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["etag"] == etag
+    assert revalidated.content == b""
+
+
+def test_edit_changes_etags_and_stale_if_match_returns_412(client, session_id):
+    graph_etag = client.get(f"/graph/{session_id}").headers["etag"]
+    edit = {"edits": [{"op": "add", "course": {
+        "year": 2, "semester": 1, "course_code": "ZZZ 9999", "course_title": "New",
+        "credits": 3, "prerequisite": "", "or_flag": "",
+    }}]}
+
+    edited = client.patch(f"/courses/{session_id}", json=edit, headers={"If-Match": graph_etag})
+    assert edited.status_code == 200
+
+    # The graph ETag read before the edit no longer matches anything
+    assert client.get(f"/graph/{session_id}", headers={"If-None-Match": graph_etag}).status_code == 200
+    stale = client.patch(f"/courses/{session_id}", json={"edits": []}, headers={"If-Match": graph_etag})
+    assert stale.status_code == 412
+    fresh = client.patch(f"/courses/{session_id}", json={"edits": []}, headers={"If-Match": edited.headers["etag"]})
+    assert fresh.status_code == 200
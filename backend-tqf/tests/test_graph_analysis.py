@@ -0,0 +1,23 @@
+from models import Course
+from csv_utils import generate_study_plan_graph
+from graph_analysis import analyze_study_plan_graph
+
+
+def _course(code: str, semester: int = 1, credits: int = 3, or_flag: str = "", prerequisite: str = "") -> Course:
+    return Course(year=1, semester=semester, course_code=code, course_title=f"Course {code}",
+                  credits=credits, prerequisite=prerequisite, or_flag=or_flag)
+
+
+def test_semester_load_counts_or_group_once():
+    courses = [
+        _course("CSX 1001"),
+        _course("GE 1403", or_flag="or"),
+        _course("GE 1408", credits=2, or_flag="or"),
+        _course("CSX 1002", semester=2, prerequisite="CSX 1001"),
+    ]
+    analysis = analyze_study_plan_graph(generate_study_plan_graph(courses))
+
+    first, second = analysis.semester_load
+    # CSX 1001 plus the larger alternative of GE 1403 OR GE 1408
+    assert (first.semester, first.credits, first.courses) == (1, 6, 3)
+    assert (second.semester, second.credits, second.courses) == (2, 3, 1)
@@ -0,0 +1,42 @@
+import asyncio
+from models import ParseResponse, ProgramInfo
+from parse_cache import ParseCache
+
+
+def _response() -> ParseResponse:
+    return ParseResponse(
+        program_info=ProgramInfo(program_code="X", program_title="Test Program", total_credits=3), courses=[]
+    )
+
+
+def test_concurrent_same_key_requests_parse_once():
+    cache = ParseCache()
+    parses = []
+
+    async def request(name: str, fail: bool = False):
+        async with cache.lock("key"):
+            if cache.get("key") is not None:
+                return
+            parses.append(name)
+            await asyncio.sleep(0.01)
+            if fail:
+                raise RuntimeError("extraction failed")
+            cache.put("key", _response())
+
+    async def first(started: list):
+        try:
+            await request("first", fail=True)
+        except RuntimeError:
+            pass
+        # Arrives after the release, before the woken waiter has run
+        started.append(asyncio.create_task(request("third")))
+
+    async def main():
+        started = []
+        await asyncio.gather(first(started), request("second"))
+        await asyncio.gather(*started)
+
+    asyncio.run(main())
+    # The failed attempt left nothing cached; of the other two only one may parse
+    assert parses == ["first", "second"]
+    assert cache._inflight == {}
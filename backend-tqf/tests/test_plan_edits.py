@@ -0,0 +1,90 @@
+import os
+import random
+import pytest
+from models import CourseEdit, ParseResponse
+from csv_utils import generate_study_plan_graph
+from pipeline import run_fast_pipeline
+from plan_edits import PlanEditError, apply_course_edits
+
+SAMPLE_DOCX = os.path.join(os.path.dirname(__file__), "..", "..", "public", "TQF_Sample.docx")
+
+
+@pytest.fixture(scope="module")
+def sample_plan() -> ParseResponse:
+    return run_fast_pipeline(SAMPLE_DOCX, "TQF_Sample.docx")
+
+
+def _assert_matches_full_rebuild(parse_response: ParseResponse) -> None:
+    # Layout positions of untouched columns are kept, so only compare them loosely
+    full = generate_study_plan_graph(parse_response.courses)
+    nodes = lambda graph: sorted((node.model_dump(exclude={"position"}) for node in graph.nodes), key=str)
+    edges = lambda graph: sorted(edge.model_dump_json() for edge in graph.edges)
+    assert nodes(parse_response.graph) == nodes(full)
+    assert edges(parse_response.graph) == edges(full)
+
+
+def _coded(parse_response: ParseResponse):
+    return [course for course in parse_response.courses if course.course_code]
+
+
+def test_edits_match_full_rebuild(sample_plan):
+    plan = sample_plan.model_copy(deep=True)
+    target = next(course for course in _coded(plan) if course.prerequisite not in ("", "-"))
+    first = _coded(plan)[0].course_code
+    new_course = {"year": 2, "semester": 1, "course_code": "ZZZ 9999", "course_title": "New",
+                  "credits": 3, "prerequisite": first, "or_flag": ""}
+
+    plan = apply_course_edits(plan, [CourseEdit(op="add", course=new_course)])
+    _assert_matches_full_rebuild(plan)
+
+    plan = apply_course_edits(plan, [
+        CourseEdit(op="update", node_id="ZZZ 9999", changes={"year": 3, "semester": 2, "course_code": "ZZZ 8888"}),
+        CourseEdit(op="set_prerequisite", node_id=target.course_code, prerequisite="ZZZ 8888"),
+    ])
+    _assert_matches_full_rebuild(plan)
+    assert any(edge.from_id == "ZZZ 8888" and edge.to_id == target.course_code for edge in plan.graph.edges)
+
+    # Removing a prerequisite course unlinks its dependents
+    plan = apply_course_edits(plan, [CourseEdit(op="remove", node_id="ZZZ 8888")])
+    _assert_matches_full_rebuild(plan)
+    assert not any(edge.from_id == "ZZZ 8888" for edge in plan.graph.edges)
+
+    # Adding the summer semester rebuilds the whole graph
+    plan = apply_course_edits(plan, [CourseEdit(op="add", course={**new_course, "course_code": "SUM 1000",
+                                                                   "semester": 3, "prerequisite": ""})])
+    _assert_matches_full_rebuild(plan)
+
+
+def test_random_edit_sequences_match_full_rebuild(sample_plan):
+    rng = random.Random(1)
+    applied = 0
+    for _ in range(60):
+        plan = sample_plan.model_copy(deep=True)
+        ids = [node.id for node in plan.graph.nodes]
+        codes = [course.course_code for course in _coded(plan)]
+        edits = []
+        for _ in range(rng.randint(1, 5)):
+            op = rng.choice(["add", "remove", "update", "set_prerequisite"])
+            if op == "add":
+                edit = CourseEdit(op="add", course={
+                    "year": rng.randint(1, 4), "semester": rng.randint(1, 2),
+                    "course_code": f"RND {rng.randint(1000, 9999)}", "course_title": "Random",
+                    "prerequisite": ", ".join(rng.sample(codes, 2)), "or_flag": rng.choice(["", "or"]),
+                })
+            elif op == "remove":
+                edit = CourseEdit(op="remove", node_id=rng.choice(ids))
+            elif op == "update":
+                edit = CourseEdit(op="update", node_id=rng.choice(ids), changes=rng.choice([
+                    {"year": rng.randint(1, 4)}, {"course_code": f"UPD {rng.randint(1000, 9999)}"}, {"or_flag": "or"},
+                ]))
+            else:
+                edit = CourseEdit(op="set_prerequisite", node_id=rng.choice(codes),
+                                  prerequisite=", ".join(rng.sample(codes, rng.randint(0, 3))))
+            edits.append(edit)
+        try:
+            plan = apply_course_edits(plan, edits)
+        except PlanEditError:
+            continue
+        _assert_matches_full_rebuild(plan)
+        applied += 1
+    assert applied > 20
@@ -0,0 +1,97 @@
+import time
+import pytest
+from models import Course, ParseResponse, ProgramInfo
+from csv_utils import generate_study_plan_graph
+from session_store import MemorySessionStore, SqliteSessionStore
+
+
+def _response(session_id: str, count: int = 12) -> ParseResponse:
+    courses = [
+        Course(year=1 + i // 6, semester=1 + i % 2, course_code=f"{session_id.upper()} {1001 + i}",
+               course_title=f"Course {i}", credits=3, prerequisite=f"{session_id.upper()} {1000 + i}" if i else "",
+               or_flag="")
+        for i in range(count)
+    ]
+    return ParseResponse(
+        program_info=ProgramInfo(program_code="CS", program_title="Computer Science", total_credits=3 * count),
+        courses=courses, session_id=session_id, graph=generate_study_plan_graph(courses),
+    )
+
+
+@pytest.mark.parametrize("compress_idle_seconds", [60, 0])
+def test_memory_store_round_trip(compress_idle_seconds):
+    store = MemorySessionStore(compress_idle_seconds=compress_idle_seconds)
+    response = _response("a")
+    etag = store.put("a", response)
+
+    assert store.get_etag("a") == etag
+    assert store.get_response("a") == response
+    assert store.delete("a") and store.get_response("a") is None
+    assert store.stats() == {"sessions": 0, "bytes": 0, "evictions": 0}
+
+
+def test_memory_store_ttl_expiry():
+    store = MemorySessionStore(ttl_seconds=0.05)
+    store.put("a", _response("a"))
+    time.sleep(0.1)
+    store.put("b", _response("b"))
+
+    # Expired sessions are gone for readers before the cleanup runs
+    assert store.get_response("a") is None
+    assert store.expire() == ["a"]
+    assert store.get_response("b") is not None
+    assert store.stats()["sessions"] == 1
+
+
+def test_memory_store_evicts_least_recently_used():
+    reference = MemorySessionStore()
+    reference.put("a", _response("a"))
+    one = reference.stats()["bytes"]
+    reference.put("b", _response("b"))
+    # Room for two sessions but not three
+    budget = reference.stats()["bytes"] + one // 2
+
+    store = MemorySessionStore(max_bytes=budget)
+    store.put("a", _response("a"))
+    store.put("b", _response("b"))
+    store.get_etag("a")  # now "b" is the least recently used
+    store.put("c", _response("c"))
+
+    assert store.get_response("b") is None
+    assert store.get_response("a") is not None and store.get_response("c") is not None
+    stats = store.stats()
+    assert stats["evictions"] == 1 and stats["bytes"] <= budget
+
+
+def test_memory_store_compresses_idle_sessions():
+    store = MemorySessionStore(compress_idle_seconds=0.05)
+    response = _response("a", count=40)
+    etag = store.put("a", response)
+    hot_bytes = store.stats()["bytes"]
+    time.sleep(0.1)
+    store.expire()
+
+    assert store.stats()["bytes"] < hot_bytes
+    assert store.get_etag("a") == etag
+    assert store.get_response("a") == response
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "sessions.sqlite3")
+    first = SqliteSessionStore(path)
+    second = SqliteSessionStore(path, ttl_seconds=0.05)
+    try:
+        response = _response("a")
+        etag = first.put("a", response)
+        assert second.get_etag("a") == etag
+        assert second.get_response("a") == response
+
+        second.put("b", _response("b"))
+        time.sleep(0.1)
+        # The expires_at cleanup of one worker removes rows for all of them
+        assert first.expire() == ["b"]
+        assert first.stats()["sessions"] == 1
+        assert second.delete("a") and first.get_response("a") is None
+    finally:
+        first.close()
+        second.close()
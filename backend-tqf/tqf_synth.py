@@ -0,0 +1,208 @@
+"""
+Synthetic TQF documents for benchmarks
+Builds DOCX and PDF study plans in the layout of public/TQF_Sample.docx:
+program info paragraphs, one study plan table (a "Year N, Semester M" header
+row, a "Course Code | Course Title | Credits" row, course rows and a Total row
+per semester) and course descriptions with "Prerequisite:" lines. Plans are
+random but reproducible from a seed and include OR groups ("or CODE ..."
+rows), elective placeholder rows and dense prerequisite chains.
+"""
+import random
+import zlib
+from io import BytesIO
+from typing import List, Tuple
+from xml.sax.saxutils import escape
+import docx
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+
+PREFIXES = ["CSX", "ITX", "GE", "ELE", "MA", "BBA"]
+TITLE_WORDS = [
+    "Advanced", "Applied", "Computing", "Data", "Design", "Digital", "Distributed", "Foundations",
+    "Introduction", "Learning", "Logic", "Management", "Methods", "Mobile", "Networks", "Principles",
+    "Programming", "Security", "Software", "Statistics", "Systems", "Theory", "Visual", "Web",
+]
+COUNT_WORDS = ["One", "Two", "Three"]
+ELECTIVE_PHRASES = ["Major Elective", "Free Elective"]
+PROGRAM_TITLE = "Bachelor of Science Program in Synthetic Studies (Benchmark Program)"
+
+# (code cell, title cell, credits cell)
+Row = Tuple[str, str, str]
+
+
+def _credits_text(credits: int) -> str:
+    return f"{credits} ({credits}-0-{2 * credits})"
+
+
+class SyntheticPlan:
+    """A generated study plan and the number of courses extraction should find in it"""
+
+    def __init__(self):
+        self.semesters: List[Tuple[str, List[Row]]] = []  # (header, rows ending with the Total row)
+        self.descriptions: List[str] = []  # course description paragraphs
+        self.course_count = 0  # courses, OR alternatives and elective placeholders
+        self.total_credits = 0
+
+
+def semester_keys(semesters: int) -> List[Tuple[int, int]]:
+    """(year, semester) of each semester; plans over 12 semesters include summer sessions"""
+    per_year = 3 if semesters > 12 else 2
+    return [(i // per_year + 1, i % per_year + 1) for i in range(semesters)]
+
+
+def generate_plan(semesters: int, courses: int, seed: int = 0) -> SyntheticPlan:
+    """Random study plan with the given number of semesters and (about) courses"""
+    rng = random.Random(seed)
+    plan = SyntheticPlan()
+    earlier: List[Tuple[str, str]] = []  # (code, title) of courses in previous semesters
+    serial = 0
+
+    def new_course() -> Tuple[str, str, int]:
+        nonlocal serial
+        serial += 1
+        prefix = PREFIXES[serial % len(PREFIXES)]
+        # Some codes are written without the space, as in the sample ("BBA1001")
+        code = f"{prefix}{1000 + serial}" if serial % 10 == 0 else f"{prefix} {1000 + serial}"
+        title = " ".join(rng.sample(TITLE_WORDS, rng.randint(2, 5)))
+        return code, title, rng.choice([3, 3, 3, 1, 2, 4])
+
+    def describe(code: str, title: str, credits: int) -> None:
+        plan.descriptions.append(f"{code} {title}\t{_credits_text(credits)} credits")
+        if earlier and rng.random() < 0.7:
+            picked = rng.sample(earlier, min(len(earlier), rng.randint(1, 3)))
+            joiner = rng.choice([" and ", " or "])
+            label = "Prerequisites" if len(picked) > 1 else "Prerequisite"
+            plan.descriptions.append(f"{label}: " + joiner.join(f"{c} {t}" for c, t in picked))
+        elif rng.random() < 0.1:
+            plan.descriptions.append("Prerequisite: Third-year student status with the consent of the instructors")
+        plan.descriptions.append(f"Study of {title.lower()} with laboratory work and a term project.")
+
+    keys = semester_keys(semesters)
+    for i, (year, semester) in enumerate(keys):
+        header = f"Year {year}, Summer" if semester == 3 else f"Year {year}, Semester {semester}"
+        remaining = courses // semesters + (1 if i < courses % semesters else 0)
+        rows: List[Row] = []
+        semester_credits = 0
+        added: List[Tuple[str, str]] = []
+        after_group = False  # two OR groups in a row would read as one
+        while remaining > 0:
+            choice = rng.random()
+            if choice < 0.1:
+                count = rng.randint(1, min(3, remaining))
+                phrase = rng.choice(ELECTIVE_PHRASES)
+                plural = "Courses" if count > 1 else "Course"
+                rows.append(("", f"{COUNT_WORDS[count - 1]} {phrase} {plural}", _credits_text(3 * count)))
+                semester_credits += 3 * count
+                remaining -= count
+                after_group = False
+            elif choice < 0.2 and remaining >= 2 and not after_group:
+                # OR group: a student takes one of the alternatives
+                alternatives = rng.randint(2, min(3, remaining))
+                group_credits = 0
+                for k in range(alternatives):
+                    code, title, credits = new_course()
+                    rows.append((f"or {code}" if k else code, title, _credits_text(credits)))
+                    describe(code, title, credits)
+                    added.append((code, title))
+                    group_credits = max(group_credits, credits)
+                semester_credits += group_credits
+                remaining -= alternatives
+                after_group = True
+            else:
+                code, title, credits = new_course()
+                rows.append((code, title, _credits_text(credits)))
+                describe(code, title, credits)
+                added.append((code, title))
+                semester_credits += credits
+                remaining -= 1
+                after_group = False
+        rows.append(("", "Total", _credits_text(semester_credits)))
+        plan.semesters.append((header, rows))
+        plan.total_credits += semester_credits
+        earlier.extend(added)
+    plan.course_count = courses
+    return plan
+
+
+def _program_lines(plan: SyntheticPlan) -> List[str]:
+    return [
+        "Bachelor of Science Program in Synthetic Studies",
+        "Code\t25330741100188",
+        f"Program \t{PROGRAM_TITLE}",
+        f"Total Credits\t{plan.total_credits} \tcredits",
+        "Curriculum",
+    ]
+
+
+def build_docx(plan: SyntheticPlan) -> bytes:
+    """The plan as a DOCX: program paragraphs, the study plan table, then course descriptions"""
+    document = docx.Document()
+    for line in _program_lines(plan):
+        document.add_paragraph(line)
+    # Table XML written directly: filling python-docx cell objects is quadratic in the row count
+    table_rows = []
+    for header, rows in plan.semesters:
+        for cells in [(header, header, header), ("Course Code", "Course Title", "Credits")] + rows:
+            table_rows.append("<w:tr>" + "".join(
+                f"<w:tc><w:p><w:r><w:t xml:space=\"preserve\">{escape(text)}</w:t></w:r></w:p></w:tc>"
+                for text in cells
+            ) + "</w:tr>")
+    table = parse_xml(
+        f"<w:tbl {nsdecls('w')}><w:tblPr/><w:tblGrid><w:gridCol/><w:gridCol/><w:gridCol/></w:tblGrid>"
+        + "".join(table_rows) + "</w:tbl>"
+    )
+    # Before the section properties, which stay the last child of the body
+    document.element.body.sectPr.addprevious(table)
+    document.add_paragraph("Course Descriptions")
+    for line in plan.descriptions:
+        document.add_paragraph(line)
+    buffer = BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def _pdf_literal(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def build_pdf(plan: SyntheticPlan, lines_per_page: int = 50) -> bytes:
+    """The plan as a PDF with one text line per table row (Helvetica, uncompressed layout)"""
+    lines = list(_program_lines(plan))
+    for header, rows in plan.semesters:
+        lines.append(header)
+        lines.append("Course Code Course Title Credits")
+        lines.extend(" ".join(cell for cell in row if cell) for row in rows)
+    lines.append("Course Descriptions")
+    lines.extend(line.replace("\t", " ") for line in plan.descriptions)
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)]
+
+    # Objects: 1 catalog, 2 page tree, 3 font, then a page and its content stream per page
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        ("<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            " ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages))), len(pages)
+        )).encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    for i, page_lines in enumerate(pages):
+        operations = ["BT", "/F1 9 Tf", "14 TL", "40 760 Td"]
+        operations.extend(f"({_pdf_literal(line)}) Tj T*" for line in page_lines)
+        operations.append("ET")
+        content = zlib.compress("\n".join(operations).encode("latin-1", "replace"))
+        objects.append((
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+        ).encode())
+        objects.append(b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(content) + content + b"\nendstream")
+
+    pdf = bytearray(b"%PDF-1.7\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        pdf += b"%010d 00000 n \n" % offset
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(pdf)
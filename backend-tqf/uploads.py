@@ -0,0 +1,195 @@
+"""
+Upload spooling
+Uploads are copied out of the request in chunks instead of being read into
+memory whole. Small ones stay in memory, larger ones go to a temp file, and the
+extraction workers get the temp file's path rather than a pickled copy of
+the bytes. The copy stops as soon as an upload goes over its size limit, and
+the first bytes are checked against the file type the name claims, so
+oversized or mislabeled files never reach python-docx or PyPDF2.
+"""
+import hashlib
+import os
+import tempfile
+import weakref
+from io import BytesIO
+from typing import BinaryIO, Optional, Union
+
+# Largest document accepted by the single-file parse endpoints
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(50 * 1024 * 1024)))
+# Uploads up to this size stay in memory, larger ones are spooled to UPLOAD_TMP_DIR
+UPLOAD_SPOOL_BYTES = int(os.getenv("UPLOAD_SPOOL_BYTES", str(1024 * 1024)))
+UPLOAD_TMP_DIR = os.getenv("UPLOAD_TMP_DIR") or None
+
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+# Bytes inspected to recognise the file type (PDF allows junk before its header)
+SNIFF_BYTES = 1024
+ZIP_SIGNATURE = b"PK\x03\x04"
+PDF_SIGNATURE = b"%PDF-"
+
+# An upload as the pipeline sees it: its bytes, or the path of its temp file
+UploadSource = Union[bytes, str]
+
+
+class UploadTooLargeError(ValueError):
+    """Upload went over its size limit while being read"""
+
+
+class UnsupportedUploadError(ValueError):
+    """Upload content does not match a supported file type"""
+
+
+def upload_kind(filename: str) -> Optional[str]:
+    """File type claimed by an upload's name: "docx", "pdf", "zip" or None"""
+    extension = os.path.splitext(filename.lower())[1]
+    return {".docx": "docx", ".pdf": "pdf", ".zip": "zip"}.get(extension)
+
+
+def sniff_kind(head: bytes) -> Optional[str]:
+    """Container type from an upload's first bytes: "zip" (DOCX is a ZIP too), "pdf" or None"""
+    if head.startswith(ZIP_SIGNATURE):
+        return "zip"
+    if PDF_SIGNATURE in head[:SNIFF_BYTES]:
+        return "pdf"
+    return None
+
+
+def open_source(source: UploadSource) -> BinaryIO:
+    """Readable binary stream over an upload, without copying in-memory bytes"""
+    if isinstance(source, (bytes, bytearray)):
+        return BytesIO(source)
+    return open(source, "rb")
+
+
+def source_digest(source: UploadSource) -> str:
+    """sha256 of an upload's bytes, reading spooled files in chunks"""
+    if isinstance(source, (bytes, bytearray)):
+        return hashlib.sha256(source).hexdigest()
+    digest = hashlib.sha256()
+    with open(source, "rb") as upload:
+        for chunk in iter(lambda: upload.read(UPLOAD_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _remove_file(path: str) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+class SpooledUpload:
+    """
+    A received upload: in memory when small, otherwise in a temp file that is
+    removed by close() (or when the object is garbage collected)
+    """
+
+    def __init__(self, filename: str, kind: str, max_bytes: int):
+        self.filename = filename
+        self.kind = kind
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._head = b""
+        self._buffer: Optional[bytearray] = bytearray()
+        self._file = None
+        self._content: Optional[bytes] = None
+        self.path: Optional[str] = None
+        self._finalizer = None
+
+    def write(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            self.close()
+            raise UploadTooLargeError(f"File is larger than {self.max_bytes} bytes")
+        if len(self._head) < SNIFF_BYTES:
+            self._head += chunk[:SNIFF_BYTES - len(self._head)]
+            if len(self._head) >= SNIFF_BYTES:
+                self._check_kind()
+        self._hash.update(chunk)
+
+        if self._file is None and self.size > UPLOAD_SPOOL_BYTES:
+            # Too big to keep in memory: move what we have to a temp file
+            self._file = tempfile.NamedTemporaryFile(
+                prefix="tqf-upload-", suffix=f".{self.kind}", dir=UPLOAD_TMP_DIR, delete=False
+            )
+            self.path = self._file.name
+            self._finalizer = weakref.finalize(self, _remove_file, self.path)
+            self._file.write(self._buffer)
+            self._buffer = None
+        if self._file is not None:
+            self._file.write(chunk)
+        else:
+            self._buffer += chunk
+
+    def finish(self) -> "SpooledUpload":
+        """Check the complete upload and make its source available"""
+        if len(self._head) < SNIFF_BYTES:
+            self._check_kind()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        else:
+            self._content = bytes(self._buffer)
+            self._buffer = None
+        return self
+
+    def _check_kind(self) -> None:
+        expected = "zip" if self.kind in ("docx", "zip") else self.kind
+        if sniff_kind(self._head) != expected:
+            self.close()
+            raise UnsupportedUploadError(f"File content is not a valid {self.kind.upper()} file")
+
+    @property
+    def digest(self) -> str:
+        """sha256 of the upload, computed while it was read"""
+        return self._hash.hexdigest()
+
+    @property
+    def source(self) -> UploadSource:
+        """What the pipeline stages take: the bytes, or the temp file path"""
+        return self.path if self.path is not None else self._content
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._finalizer is not None:
+            self._finalizer()
+        self._buffer = None
+        self._content = None
+
+
+def spool_stream(stream: BinaryIO, filename: str, kind: str, max_bytes: int) -> SpooledUpload:
+    """Copy a blocking stream (e.g. a ZIP member) into a SpooledUpload"""
+    upload = SpooledUpload(filename, kind, max_bytes)
+    try:
+        while True:
+            chunk = stream.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                return upload.finish()
+            upload.write(chunk)
+    except BaseException:
+        upload.close()
+        raise
+
+
+async def receive_upload(file, kind: Optional[str] = None, max_bytes: int = UPLOAD_MAX_BYTES) -> SpooledUpload:
+    """
+    Read an UploadFile chunk by chunk into a SpooledUpload. kind defaults to the
+    type its filename claims. Raises UploadTooLargeError / UnsupportedUploadError
+    """
+    kind = kind or upload_kind(file.filename or "")
+    if kind is None:
+        raise UnsupportedUploadError("Only DOCX and PDF files are supported")
+    upload = SpooledUpload(file.filename, kind, max_bytes)
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                return upload.finish()
+            upload.write(chunk)
+    except BaseException:
+        upload.close()
+        raise